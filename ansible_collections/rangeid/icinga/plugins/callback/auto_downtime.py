@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+
+from __future__ import absolute_import, division, print_function
+from ansible.plugins.callback import CallbackBase
+from ansible_collections.rangeid.icinga.plugins.module_utils.time_utils import time_utils
+from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, \
+    IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaConnectionException
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+name: auto_downtime
+author:
+- "Angelo Conforti (@angeloxx)"
+type: aggregate
+short_description: Downtime for every serial batch of a play
+description:
+- When a batch of an opted-in play starts, all its hosts and their services are put in
+  downtime with one filtered request. When the next batch starts or the play ends, the
+  downtimes of the hosts that did not fail are removed with one request, the failed or
+  unreachable hosts keep their downtime.
+- Plays opt in with the icinga_auto_downtime play variable set to true, or all the plays
+  are involved if all_plays is set.
+- The Icinga host name is the icinga_host_name host variable, wherever it is defined
+  (inventory, host_vars or group_vars), or the inventory hostname.
+requirements:
+- enable in configuration, e.g. callbacks_enabled = rangeid.icinga.auto_downtime
+options:
+    icinga_server:
+        description:
+        - The Icinga URL in the format https://<server> or
+          https://<server>:<port>/<context>, or a list of URLs of the HA endpoints
+        type: list
+        elements: str
+        required: true
+        env:
+        - name: ICINGA_SERVER
+        ini:
+        - section: callback_auto_downtime
+          key: icinga_server
+    icinga_username:
+        description:
+        - The Icinga username
+        type: str
+        required: true
+        env:
+        - name: ICINGA_USERNAME
+        ini:
+        - section: callback_auto_downtime
+          key: icinga_username
+    icinga_password:
+        description:
+        - The Icinga user's password
+        type: str
+        required: true
+        env:
+        - name: ICINGA_PASSWORD
+        ini:
+        - section: callback_auto_downtime
+          key: icinga_password
+    validate_certs:
+        description:
+        - If set to False, SSL certificates will not be validated
+        type: bool
+        default: true
+        ini:
+        - section: callback_auto_downtime
+          key: validate_certs
+    duration:
+        description:
+        - maximum duration of the batch downtime, in dhms format, eg. 1d, 30m 40s, 1h 30m
+        type: str
+        default: 1h
+        ini:
+        - section: callback_auto_downtime
+          key: duration
+    author:
+        description:
+        - the downtime author
+        type: str
+        default: Ansible
+        ini:
+        - section: callback_auto_downtime
+          key: author
+    comment:
+        description:
+        - the downtime comment, only the downtimes with this comment are removed
+        type: str
+        default: Ansible play batch
+        ini:
+        - section: callback_auto_downtime
+          key: comment
+    all_plays:
+        description:
+        - involve all the plays, not only the ones with icinga_auto_downtime set
+        type: bool
+        default: false
+        ini:
+        - section: callback_auto_downtime
+          key: all_plays
+"""
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'rangeid.icinga.auto_downtime'
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self.icinga_client = None
+        self.play = None
+        self.variable_manager = None
+        self.batch = None
+        self.failed = set()
+        self.duration_seconds = 3600
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super(CallbackModule, self).set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        self.duration_seconds = time_utils.convert_duration(self.get_option("duration")) or 3600
+
+    def _client(self):
+        if self.icinga_client is None:
+            self.icinga_client = IcingaMiniClass(module=None,
+                                                 url=self.get_option("icinga_server"),
+                                                 username=self.get_option("icinga_username"),
+                                                 password=self.get_option("icinga_password"),
+                                                 validate_certs=self.get_option("validate_certs"))
+        return self.icinga_client
+
+    def _current_batch(self):
+        # ansible_play_batch is the running serial batch, hostvars resolves every
+        # variable source of a host as its tasks see them
+        _vars = self.variable_manager.get_vars(play=self.play)
+        return {_name: _vars["hostvars"][_name].get("icinga_host_name", _name)
+                for _name in _vars["ansible_play_batch"]}
+
+    def _call(self, action: str, method, **kwargs):
+        # The play goes on even if Icinga is not reachable
+        try:
+            return method(**kwargs)
+        except IcingaConnectionException as e:
+            self._display.warning(f"Icinga auto downtime, unable to {action}: {e.message}")
+        except IcingaAuthenticationException:
+            self._display.warning(f"Icinga auto downtime, unable to {action}: authentication error")
+        except IcingaNoSuchObjectException as e:
+            self._display.warning(f"Icinga auto downtime, unable to {action}: {e.message}")
+        return None
+
+    def _start_batch(self, batch: dict):
+        self.batch = batch
+        self.failed = set()
+        _status = self._call("schedule the downtimes", self._client().schedule_hosts_downtime,
+                             host=sorted(set(batch.values())),
+                             duration_seconds=self.duration_seconds,
+                             author=self.get_option("author"),
+                             comment=self.get_option("comment"))
+        if _status is not None:
+            self._display.display(
+                f"Icinga auto downtime: {_status['changes']} downtimes scheduled for {len(batch)} hosts")
+
+    def _end_batch(self):
+        if not self.batch:
+            return
+        _hosts = sorted(set([_icinga for _name, _icinga in self.batch.items() if _name not in self.failed]))
+        self.batch = None
+        if len(_hosts) == 0:
+            return
+
+        _status = self._call("remove the downtimes", self._client().remove_hosts_downtime,
+                             host=_hosts,
+                             author=self.get_option("author"),
+                             comment=self.get_option("comment"))
+        if _status is not None:
+            self._display.display(
+                f"Icinga auto downtime: {_status['changes']} downtimes removed, "
+                f"{len(self.failed)} failed hosts kept in downtime")
+
+    def v2_playbook_on_play_start(self, play):
+        self._end_batch()
+        self.play = None
+        if self.get_option("all_plays") or play.vars.get("icinga_auto_downtime", False):
+            self.play = play
+            self.variable_manager = play.get_variable_manager()
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        if self.play is None:
+            return
+        _batch = self._current_batch()
+        # Failed hosts leave the batch, only hosts never seen start a new one
+        if len(_batch) > 0 and not set(_batch) <= set(self.batch or {}):
+            self._end_batch()
+            self._start_batch(_batch)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        if not ignore_errors:
+            self.failed.add(result._host.get_name())
+
+    def v2_runner_on_unreachable(self, result):
+        self.failed.add(result._host.get_name())
+
+    def v2_playbook_on_stats(self, stats):
+        self._end_batch()
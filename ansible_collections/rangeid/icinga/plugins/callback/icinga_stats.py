@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+
+from __future__ import absolute_import, division, print_function
+import json
+import time
+from ansible.plugins.callback import CallbackBase
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+name: icinga_stats
+author:
+- "Angelo Conforti (@angeloxx)"
+type: aggregate
+short_description: Aggregate the Icinga API cost of a whole play
+description:
+- Collects the icinga_stats returned by the rangeid.icinga modules (calls, latency,
+  bytes, retries, errors and JSON encode/decode time) and prints, at the end of the
+  playbook, a summary by task, role, host and Icinga endpoint.
+- Optionally writes one JSON line per task result to a trace file for offline analysis.
+requirements:
+- enable in configuration, e.g. callbacks_enabled = rangeid.icinga.icinga_stats
+options:
+    trace_file:
+        description:
+        - path of the JSON lines trace file, no trace is written if not set
+        type: path
+        env:
+        - name: ICINGA_STATS_TRACE
+        ini:
+        - section: callback_icinga_stats
+          key: trace_file
+    top:
+        description:
+        - number of rows printed for each summary table
+        type: int
+        default: 20
+        env:
+        - name: ICINGA_STATS_TOP
+        ini:
+        - section: callback_icinga_stats
+          key: top
+"""
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'rangeid.icinga.icinga_stats'
+    CALLBACK_NEEDS_ENABLED = True
+
+    COUNTERS = ["calls", "retries", "errors", "bytes_sent", "bytes_received", "latency",
+                "encode_seconds", "decode_seconds"]
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self.totals = {
+            "task": {},
+            "role": {},
+            "host": {},
+            "endpoint": {}
+        }
+        self.trace_file = None
+        self.top = 20
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super(CallbackModule, self).set_options(task_keys=task_keys, var_options=var_options, direct=direct)
+        self.trace_file = self.get_option("trace_file")
+        self.top = self.get_option("top")
+
+    def _add(self, dimension: str, key: str, stats: dict):
+        _totals = self.totals[dimension].setdefault(key, dict.fromkeys(self.COUNTERS, 0))
+        for _counter in self.COUNTERS:
+            _totals[_counter] = _totals[_counter] + stats.get(_counter, 0)
+
+    def _collect(self, result, failed: bool = False):
+        _result = result._result
+        # Loops report the stats of every item in results
+        _stats_list = [_item.get("icinga_stats") for _item in _result.get("results", []) if isinstance(_item, dict)]
+        _stats_list.append(_result.get("icinga_stats"))
+
+        _task = result._task.get_name()
+        _role = result._task._role.get_name() if result._task._role else "-"
+        _host = result._host.get_name()
+
+        for _stats in _stats_list:
+            if not _stats:
+                continue
+            self._add("task", _task, _stats)
+            self._add("role", _role, _stats)
+            self._add("host", _host, _stats)
+            for _endpoint, _endpoint_stats in _stats.get("endpoints", {}).items():
+                self._add("endpoint", _endpoint, _endpoint_stats)
+
+            if self.trace_file:
+                with open(self.trace_file, "a") as _fd:
+                    _fd.write(json.dumps({
+                        "time": time.time(),
+                        "task": _task,
+                        "role": _role,
+                        "host": _host,
+                        "failed": failed,
+                        "stats": _stats
+                    }) + "\n")
+
+    def v2_runner_on_ok(self, result):
+        self._collect(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._collect(result, failed=True)
+
+    def _table(self, dimension: str):
+        _rows = sorted(self.totals[dimension].items(), key=lambda _item: _item[1]["calls"], reverse=True)
+        if len(_rows) == 0:
+            return
+
+        _width = max(len(dimension), max(len(_key) for _key, _totals in _rows[:self.top]))
+        self._display.display(
+            f"{dimension.upper():<{_width}}  {'calls':>7}  {'retries':>7}  {'errors':>6}  "
+            f"{'KB sent':>9}  {'KB recv':>9}  {'latency s':>9}  {'avg ms':>7}  {'json us':>7}")
+        for _key, _totals in _rows[:self.top]:
+            _average = 1000 * _totals["latency"] / _totals["calls"] if _totals["calls"] else 0
+            # Encode and decode cost per call, not reported per endpoint
+            _json = 1000000 * (_totals["encode_seconds"] + _totals["decode_seconds"]) / _totals["calls"] \
+                if _totals["calls"] else 0
+            self._display.display(
+                f"{_key:<{_width}}  {_totals['calls']:>7}  {_totals['retries']:>7}  {_totals['errors']:>6}  "
+                f"{_totals['bytes_sent'] / 1024:>9.1f}  {_totals['bytes_received'] / 1024:>9.1f}  "
+                f"{_totals['latency']:>9.2f}  {_average:>7.1f}  {_json:>7.1f}")
+        if len(_rows) > self.top:
+            self._display.display(f"... {len(_rows) - self.top} more")
+        self._display.display("")
+
+    def v2_playbook_on_stats(self, stats):
+        if len(self.totals["task"]) == 0:
+            return
+
+        self._display.banner("ICINGA API STATS")
+        for _dimension in ["task", "role", "host", "endpoint"]:
+            self._table(_dimension)
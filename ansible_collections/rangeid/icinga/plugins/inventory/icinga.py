@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+
+from __future__ import absolute_import, division, print_function
+from ansible.errors import AnsibleParserError
+from ansible.plugins.inventory import BaseInventoryPlugin
+from ansible_collections.rangeid.icinga.plugins.module_utils.topology_cache import IcingaTopologyCache
+from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, \
+    IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaConnectionException
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+name: icinga
+author:
+- "Angelo Conforti (@angeloxx)"
+short_description: Icinga hosts and hostgroups as inventory
+description:
+- Builds the inventory from the Icinga hosts, their hostgroups become groups.
+- The topology is kept in a local cache refreshed incrementally, only the objects
+  changed since the last run are read again.
+- The inventory file name must end with icinga.yml or icinga.yaml.
+options:
+    plugin:
+        description:
+        - the name of this plugin
+        required: true
+        choices:
+        - rangeid.icinga.icinga
+    icinga_server:
+        description:
+        - The Icinga URL in the format https://<server> or
+          https://<server>:<port>/<context>, or a list of URLs of the HA endpoints
+        type: list
+        elements: str
+        required: true
+    icinga_username:
+        description:
+        - The Icinga username
+        type: str
+        required: true
+    icinga_password:
+        description:
+        - The Icinga user's password
+        type: str
+        required: true
+    validate_certs:
+        description:
+        - If set to False, SSL certificates will not be validated
+        type: bool
+        default: true
+    cache_file:
+        description:
+        - path of the topology cache, defaults to a file in the private temporary directory
+          of the user. A cache file owned by another user is ignored
+        type: path
+        required: false
+    cache_max_age:
+        description:
+        - seconds after which the whole topology is loaded again
+        type: int
+        default: 86400
+    full_sync:
+        description:
+        - ignore the cache and load the whole topology
+        type: bool
+        default: false
+    services:
+        description:
+        - add the icinga_services host variable with the state of every service
+        type: bool
+        default: false
+"""
+
+
+class InventoryModule(BaseInventoryPlugin):
+    NAME = 'rangeid.icinga.icinga'
+
+    def verify_file(self, path):
+        return super(InventoryModule, self).verify_file(path) and \
+            path.endswith(("icinga.yml", "icinga.yaml"))
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path, cache)
+        self._read_config_data(path)
+
+        icinga_client = IcingaMiniClass(module=None,
+                                        url=self.get_option("icinga_server"),
+                                        username=self.get_option("icinga_username"),
+                                        password=self.get_option("icinga_password"),
+                                        validate_certs=self.get_option("validate_certs"))
+        try:
+            topology = IcingaTopologyCache(client=icinga_client,
+                                           path=self.get_option("cache_file"),
+                                           max_age=self.get_option("cache_max_age"))
+        except OSError as e:
+            raise AnsibleParserError(f"Unable to use the topology cache: {e}")
+        try:
+            status = topology.sync(force_full=self.get_option("full_sync"))
+        except IcingaConnectionException as e:
+            raise AnsibleParserError(f"Unable to connect to the Icinga API: {e.message}")
+        except IcingaAuthenticationException:
+            raise AnsibleParserError(
+                f"Authentication error, please double check the '{self.get_option('icinga_username')}' user")
+        except IcingaNoSuchObjectException as e:
+            raise AnsibleParserError(f"Unable to read the Icinga topology: {e.message}")
+        self.display.vvv(f"Icinga topology {status['mode']} sync in {status['elapsed_seconds']}s")
+
+        _services = {}
+        if self.get_option("services"):
+            for _service in topology.services.values():
+                _services.setdefault(_service["host_name"], {})[_service["name"]] = _service["state"]
+
+        for _name, _host in topology.hosts.items():
+            self.inventory.add_host(_name)
+            if _host.get("address"):
+                self.inventory.set_variable(_name, "ansible_host", _host["address"])
+            self.inventory.set_variable(_name, "icinga_state", _host["state"])
+            self.inventory.set_variable(_name, "icinga_in_downtime", _host["downtime_depth"] > 0)
+            if self.get_option("services"):
+                self.inventory.set_variable(_name, "icinga_services", _services.get(_name, {}))
+            for _group in _host.get("groups", []):
+                _group = self.inventory.add_group(_group)
+                self.inventory.add_child(_group, _name)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+
+from __future__ import absolute_import, division, print_function
+import hashlib
+import json
+import os
+import tempfile
+import time
+from ansible.errors import AnsibleLookupError
+from ansible.plugins.lookup import LookupBase
+from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, \
+    IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaConnectionException
+from ansible_collections.rangeid.icinga.plugins.module_utils.state_files import private_path, open_private
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+name: state
+author:
+- "Angelo Conforti (@angeloxx)"
+short_description: Icinga state of hosts and services
+description:
+- Returns the state of every term, resolving all the terms of a lookup with at most
+  two projected queries, one for the hosts and one for the services.
+- Results are kept for ttl seconds in a memo file on the controller, shared by the
+  worker processes of the play, repeated lookups do not query Icinga again.
+options:
+    _terms:
+        description:
+        - host names, host!service pairs or patterns of them (glob, or regexp prefixed
+          with "~"), e.g. web01, web01!ping, web*!disk*. Pattern terms return a dictionary
+          of matching object to its state, unknown objects return None
+        required: true
+    icinga_server:
+        description:
+        - The Icinga URL in the format https://<server> or
+          https://<server>:<port>/<context>, or a list of URLs of the HA endpoints
+        type: list
+        elements: str
+        required: true
+        env:
+        - name: ICINGA_SERVER
+    icinga_username:
+        description:
+        - The Icinga username
+        type: str
+        required: true
+        env:
+        - name: ICINGA_USERNAME
+    icinga_password:
+        description:
+        - The Icinga user's password
+        type: str
+        required: true
+        env:
+        - name: ICINGA_PASSWORD
+    validate_certs:
+        description:
+        - If set to False, SSL certificates will not be validated
+        type: bool
+        default: true
+    details:
+        description:
+        - return dictionaries with state, in_downtime and acknowledged instead of the state
+        type: bool
+        default: false
+    ttl:
+        description:
+        - seconds a resolved term is reused by the following lookups, 0 disables the memo
+        type: int
+        default: 10
+    memo_file:
+        description:
+        - path of the memo file, defaults to a file in the private temporary directory
+          of the user derived from the server and the username. A memo file owned by
+          another user is ignored
+        type: path
+"""
+
+
+def _memo_path(icinga_server: list, icinga_username: str):
+    _digest = hashlib.sha1(f"{'|'.join(icinga_server)}|{icinga_username}".encode("utf-8")).hexdigest()[:12]
+    return private_path(f"lookup-{_digest}.json")
+
+
+def _memo_load(path: str):
+    # Every task runs the lookup in its own forked worker, the memo lives in a
+    # file: term key -> [time, value]
+    try:
+        with open_private(path, "r") as _fd:
+            return json.load(_fd)
+    except (OSError, ValueError):
+        return {}
+
+
+def _memo_save(path: str, entries: dict, ttl: int):
+    # Merged with what the other workers saved meanwhile, expired entries are dropped,
+    # written aside (mkstemp creates it 0600) and renamed so a concurrent reader never
+    # sees a partial file
+    _now = time.time()
+    _memo = _memo_load(path)
+    _memo.update(entries)
+    _memo = {_key: _entry for _key, _entry in _memo.items() if _now - _entry[0] < ttl}
+    try:
+        _fd, _tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        with os.fdopen(_fd, "w") as _file:
+            json.dump(_memo, _file)
+        os.replace(_tmp, path)
+    except OSError:
+        # The memo only saves queries
+        pass
+
+
+class LookupModule(LookupBase):
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+
+        icinga_server = self.get_option("icinga_server")
+        icinga_username = self.get_option("icinga_username")
+        details = self.get_option("details")
+        ttl = self.get_option("ttl")
+
+        _now = time.time()
+        try:
+            _path = self.get_option("memo_file") or _memo_path(icinga_server, icinga_username)
+        except OSError as e:
+            raise AnsibleLookupError(f"Unable to use the memo file: {e}")
+        _memo = _memo_load(_path) if ttl > 0 else {}
+        _keys = {_term: f"{int(details)}|{_term}" for _term in terms}
+        _values = {}
+        for _term in dict.fromkeys(terms):
+            _entry = _memo.get(_keys[_term])
+            if _entry is not None and _now - _entry[0] < ttl:
+                _values[_term] = _entry[1]
+        _missing = [_term for _term in dict.fromkeys(terms) if _term not in _values]
+
+        if len(_missing) > 0:
+            icinga_client = IcingaMiniClass(module=None,
+                                            url=icinga_server,
+                                            username=icinga_username,
+                                            password=self.get_option("icinga_password"),
+                                            validate_certs=self.get_option("validate_certs"))
+            try:
+                _states = icinga_client.get_states(terms=_missing, details=details)
+            except IcingaConnectionException as e:
+                raise AnsibleLookupError(f"Unable to connect to the Icinga API: {e.message}")
+            except IcingaAuthenticationException:
+                raise AnsibleLookupError(f"Authentication error, please double check the '{icinga_username}' user")
+            except IcingaNoSuchObjectException as e:
+                raise AnsibleLookupError(f"Unable to read the Icinga states: {e.message}")
+
+            _values.update(_states)
+            if ttl > 0:
+                _memo_save(_path, {_keys[_term]: [_now, _value] for _term, _value in _states.items()}, ttl)
+
+        return [_values[_term] for _term in terms]
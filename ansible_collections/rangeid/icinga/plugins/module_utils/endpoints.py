@@ -0,0 +1,124 @@
+import threading
+import time
+
+
+class IcingaEndpoint():
+    """Health and latency of one Icinga API endpoint."""
+
+    def __init__(self, url: str):
+        if url.endswith("/"):
+            url = url[:-1]
+        self.url = url
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+        self.latency = None
+        self.last_error = None
+        self.down_since = None
+
+    def record_success(self, latency: float, smoothing: float = 0.3):
+        """
+        Record a successful request, the latency is an exponentially weighted average.
+
+        Args:
+            latency (float): Seconds spent waiting for the response.
+            smoothing (float, optional): Weight of the new sample. Default 0.3.
+        """
+        self.requests = self.requests + 1
+        self.healthy = True
+        self.down_since = None
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = (1 - smoothing) * self.latency + smoothing * latency
+
+    def record_failure(self, error):
+        self.requests = self.requests + 1
+        self.failures = self.failures + 1
+        self.healthy = False
+        self.last_error = f"{error}"
+        if self.down_since is None:
+            self.down_since = time.time()
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "failures": self.failures,
+            "latency": round(self.latency, 4) if self.latency is not None else None,
+            "last_error": self.last_error
+        }
+
+
+class IcingaEndpointPool():
+    """Set of HA endpoints exposing the same Icinga objects.
+
+    Writes go to the first healthy endpoint in the configured order, reads are
+    spread across the healthy endpoints, either round robin or to the one with
+    the lowest observed latency. Unhealthy endpoints are only tried after the
+    healthy ones, and get a new chance every retry_interval seconds.
+    """
+
+    READ_STRATEGIES = ["round_robin", "latency"]
+
+    def __init__(self, urls: list, read_strategy: str = "round_robin", retry_interval: int = 30):
+        """
+        Args:
+            urls (list): Endpoint URLs, the first one is the preferred write endpoint.
+            read_strategy (str, optional): "round_robin" or "latency". Default "round_robin".
+            retry_interval (int, optional): Seconds after which an unhealthy endpoint is tried again. Default 30.
+        """
+        if read_strategy not in self.READ_STRATEGIES:
+            raise ValueError(f"Unknown read strategy {read_strategy}")
+
+        self.endpoints = [IcingaEndpoint(_url) for _url in urls]
+        self.read_strategy = read_strategy
+        self.retry_interval = retry_interval
+        self._next_read = 0
+        self._lock = threading.Lock()
+
+    def _is_available(self, endpoint: IcingaEndpoint, now: float):
+        return endpoint.healthy or now - endpoint.down_since >= self.retry_interval
+
+    def candidates(self, write: bool = False):
+        """
+        Return the endpoints to try for a request, in order.
+
+        Args:
+            write (bool, optional): True for requests changing the Icinga state. Default False.
+
+        Returns:
+            list: The endpoints, available ones first.
+        """
+        with self._lock:
+            _now = time.time()
+            _available = [_endpoint for _endpoint in self.endpoints if self._is_available(_endpoint, _now)]
+            _others = [_endpoint for _endpoint in self.endpoints if _endpoint not in _available]
+
+            if not write and len(_available) > 1:
+                if self.read_strategy == "latency":
+                    # Endpoints never measured go first, so every endpoint gets a sample
+                    _available = sorted(_available,
+                                        key=lambda _endpoint: -1 if _endpoint.latency is None else _endpoint.latency)
+                else:
+                    _start = self._next_read % len(_available)
+                    _available = _available[_start:] + _available[:_start]
+                    self._next_read = self._next_read + 1
+
+            return _available + _others
+
+    def preferred(self):
+        return self.candidates(write=True)[0]
+
+    def record_success(self, endpoint: IcingaEndpoint, latency: float):
+        with self._lock:
+            endpoint.record_success(latency)
+
+    def record_failure(self, endpoint: IcingaEndpoint, error):
+        with self._lock:
+            endpoint.record_failure(error)
+
+    def health(self):
+        with self._lock:
+            return [_endpoint.to_dict() for _endpoint in self.endpoints]
@@ -0,0 +1,248 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+import time
+
+from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaNoSuchObjectException, \
+    IcingaRequestFailedException
+
+
+class IcingaExporter():
+    """Stream hosts, services or downtimes to a JSONL or CSV file, page by page.
+
+    The Icinga API has no paging, so the full names of the objects in scope are
+    fetched first with a projected query, then the objects are read by name,
+    page_size at a time, with the requested attributes only and written out
+    before the next page is read. Objects deleted in the meantime are left out
+    of the page instead of failing the export. Memory is bounded by one page
+    plus the name list, whatever the size of the export.
+
+    With a checkpoint file the export can be resumed: the last written name is
+    saved after every page, a later run with the same parameters appends the
+    remaining objects (in name order) instead of starting over. The checkpoint
+    is removed once the export is complete.
+    """
+
+    OBJECTS = {
+        "hosts": {
+            "type": "Host",
+            "attrs": ["name", "display_name", "address", "groups", "state", "last_check",
+                      "last_state_change", "downtime_depth", "acknowledgement"]
+        },
+        "services": {
+            "type": "Service",
+            "attrs": ["name", "host_name", "display_name", "state", "last_check",
+                      "last_state_change", "downtime_depth", "acknowledgement"]
+        },
+        "downtimes": {
+            "type": "Downtime",
+            "attrs": ["host_name", "service_name", "author", "comment", "entry_time", "start_time",
+                      "end_time", "duration", "fixed", "was_cancelled"]
+        }
+    }
+    FORMATS = ["jsonl", "csv"]
+
+    def __init__(self, client, path: str, object_kind: str = "services", attrs: list = None,
+                 output_format: str = "jsonl", compress: bool = False, checkpoint: str = None,
+                 page_size: int = 500):
+        """
+        Args:
+            client (IcingaMiniClass): The client used to reach the Icinga API.
+            path (str): Path of the export file.
+            object_kind (str, optional): "hosts", "services" or "downtimes". Default "services".
+            attrs (list, optional): Exported attributes, defaults to the OBJECTS ones.
+            output_format (str, optional): "jsonl" or "csv". Default "jsonl".
+            compress (bool, optional): Write a gzip file. Default False.
+            checkpoint (str, optional): Path of the checkpoint file, the export is not resumable if omitted.
+            page_size (int, optional): Objects read by a request. Default 500.
+        """
+        if object_kind not in self.OBJECTS:
+            raise ValueError(f"Unknown object kind {object_kind}")
+        if output_format not in self.FORMATS:
+            raise ValueError(f"Unknown export format {output_format}")
+
+        self.client = client
+        self.path = path
+        self.object_kind = object_kind
+        self.object_type = self.OBJECTS[object_kind]["type"]
+        self.attrs = list(attrs or self.OBJECTS[object_kind]["attrs"])
+        self.output_format = output_format
+        self.compress = compress
+        self.checkpoint = checkpoint
+        self.page_size = page_size
+
+    def _scope(self, host=None, hostgroup: str = None, service: str = None):
+        _filters = []
+        _vars = {}
+        if isinstance(host, list):
+            _filters.append("host.name in x_hosts")
+            _vars["x_hosts"] = host
+        elif host:
+            _filters.append("host.name==x_host")
+            _vars["x_host"] = host
+        if hostgroup:
+            _filters.append("x_hostgroup in host.groups")
+            _vars["x_hostgroup"] = hostgroup
+        if service and service not in ["all", "*"] and self.object_type != "Host":
+            _field = "service.name" if self.object_type == "Service" else "downtime.service_name"
+            _filters.append(f"match(x_service, {_field})")
+            _vars["x_service"] = service
+
+        _data = {"type": self.object_type}
+        if len(_filters) > 0:
+            _data["filter"] = " && ".join(_filters)
+            _data["filter_vars"] = _vars
+        return _data
+
+    def _names(self, scope: dict):
+        _data = dict(scope)
+        _data["attrs"] = ["__name"]
+        try:
+            _response = self.client._send_request(
+                url=f"/v1/objects/{self.object_type.lower()}s",
+                method="GET",
+                data=_data,
+            )
+        except IcingaRequestFailedException:
+            raise
+        except IcingaNoSuchObjectException:
+            # Nothing in scope
+            return []
+        return sorted(_object["name"] for _object in _response["results"])
+
+    def _fetch(self, names: list):
+        # The plural name key is a lookup by name, but fails the whole request if one of
+        # the names has been deleted since _names: split the page until the missing names
+        # are isolated and left out
+        try:
+            _response = self.client._send_request(
+                url=f"/v1/objects/{self.object_type.lower()}s",
+                method="GET",
+                data={
+                    "type": self.object_type,
+                    f"{self.object_type.lower()}s": names,
+                    "attrs": self.attrs
+                },
+            )
+        except IcingaRequestFailedException:
+            raise
+        except IcingaNoSuchObjectException:
+            if len(names) == 1:
+                return []
+            _half = len(names) // 2
+            return self._fetch(names[:_half]) + self._fetch(names[_half:])
+        return _response["results"]
+
+    def _page(self, names: list):
+        for _object in sorted(self._fetch(names), key=lambda _object: _object["name"]):
+            _row = {"object": _object["name"]}
+            _row.update({_attr: _object["attrs"].get(_attr) for _attr in self.attrs})
+            yield _row
+
+    def _open(self, append: bool):
+        _mode = "a" if append else "w"
+        if self.compress:
+            # Every append adds a gzip member, gzip readers concatenate them
+            return gzip.open(self.path, f"{_mode}t", encoding="utf-8", newline="")
+        return open(self.path, _mode, encoding="utf-8", newline="")
+
+    def _state(self, scope: dict):
+        # What makes a checkpoint reusable, besides the last name written
+        return {
+            "path": os.path.abspath(self.path),
+            "scope": scope,
+            "attrs": self.attrs,
+            "format": self.output_format,
+            "compress": self.compress
+        }
+
+    def _load_checkpoint(self, state: dict):
+        if not self.checkpoint or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.checkpoint, "r") as _fd:
+                _checkpoint = json.load(_fd)
+        except (OSError, ValueError):
+            return None
+        if _checkpoint.get("state") != state:
+            return None
+        return _checkpoint
+
+    def _save_checkpoint(self, state: dict, last: str, rows: int):
+        _fd, _tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.checkpoint)), suffix=".tmp")
+        with os.fdopen(_fd, "w") as _file:
+            json.dump({"state": state, "last": last, "rows": rows, "saved": time.time()}, _file)
+        os.replace(_tmp, self.checkpoint)
+
+    def _encode(self, value):
+        # CSV cells are scalars, lists and dictionaries are written as JSON
+        if isinstance(value, (list, dict)):
+            return self.client.codec.dumps(value)
+        return value
+
+    def count(self, host=None, hostgroup: str = None, service: str = None):
+        """
+        Return the number of objects in scope with a single projected query, nothing is written.
+        """
+        return len(self._names(self._scope(host=host, hostgroup=hostgroup, service=service)))
+
+    def export(self, host=None, hostgroup: str = None, service: str = None):
+        """
+        Export the objects in scope, all of them if no scope is given.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            service (str, optional): Glob pattern of the service names, for services and downtimes.
+
+        Returns:
+            dict: The "rows" in the file, the rows written by this run ("written"), the "pages" read,
+                whether the export has been "resumed" and the "elapsed_seconds".
+        """
+        _start = time.time()
+        _scope = self._scope(host=host, hostgroup=hostgroup, service=service)
+        _state = self._state(_scope)
+        _checkpoint = self._load_checkpoint(_state)
+
+        _names = self._names(_scope)
+        _rows = 0
+        if _checkpoint is not None:
+            _names = [_name for _name in _names if _name > _checkpoint["last"]]
+            _rows = _checkpoint["rows"]
+
+        _ret = dict(
+            rows=_rows,
+            written=0,
+            pages=0,
+            resumed=_checkpoint is not None
+        )
+        _columns = ["object"] + self.attrs
+        if _checkpoint is None:
+            with self._open(append=False) as _fd:
+                if self.output_format == "csv":
+                    csv.DictWriter(_fd, fieldnames=_columns).writeheader()
+
+        for _index in range(0, len(_names), self.page_size):
+            _page = _names[_index:_index + self.page_size]
+            _rows_page = list(self._page(_page))
+            # Every page is written at once and closed (a complete gzip member) before
+            # the checkpoint moves past it
+            with self._open(append=True) as _fd:
+                if self.output_format == "csv":
+                    csv.DictWriter(_fd, fieldnames=_columns).writerows(
+                        [{_column: self._encode(_value) for _column, _value in _row.items()} for _row in _rows_page])
+                else:
+                    _fd.write("".join([self.client.codec.dumps(_row) + "\n" for _row in _rows_page]))
+            _ret["written"] = _ret["written"] + len(_rows_page)
+            _ret["pages"] = _ret["pages"] + 1
+            if self.checkpoint:
+                self._save_checkpoint(_state, last=_page[-1], rows=_rows + _ret["written"])
+
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+
+        _ret["rows"] = _rows + _ret["written"]
+        _ret["elapsed_seconds"] = round(time.time() - _start, 3)
+        return _ret
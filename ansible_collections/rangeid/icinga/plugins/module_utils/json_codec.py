@@ -0,0 +1,77 @@
+import json
+import os
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+try:
+    import ujson
+    HAS_UJSON = True
+except ImportError:
+    HAS_UJSON = False
+
+
+class IcingaJsonCodec():
+    """Encode the request bodies and decode the responses of the Icinga API.
+
+    The fastest installed library is used: orjson, then ujson, then the
+    standard json module. Bodies are always returned as str, so the transports
+    and the cassettes do not depend on the library in use.
+    """
+
+    BACKENDS = ["auto", "orjson", "ujson", "json"]
+
+    def __init__(self, backend: str = "auto"):
+        """
+        Args:
+            backend (str, optional): One of BACKENDS, "auto" picks the fastest installed one. A
+                library that is not installed falls back to json. Default "auto".
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown JSON codec {backend}")
+
+        if backend in ["auto", "orjson"] and HAS_ORJSON:
+            self.name = "orjson"
+        elif backend in ["auto", "ujson"] and HAS_UJSON:
+            self.name = "ujson"
+        else:
+            self.name = "json"
+
+    def dumps(self, data) -> str:
+        if self.name == "orjson":
+            return orjson.dumps(data).decode("utf-8")
+        if self.name == "ujson":
+            return ujson.dumps(data, ensure_ascii=False)
+        return json.dumps(data)
+
+    def loads(self, content):
+        """
+        Decode a response body.
+
+        Args:
+            content (bytes|str): The response body.
+
+        Raises:
+            ValueError: If the body is not valid JSON.
+        """
+        if self.name == "orjson":
+            return orjson.loads(content)
+        if self.name == "ujson":
+            return ujson.loads(content)
+        return json.loads(content)
+
+
+def codec_from_environment(backend: str = None):
+    """
+    Build the codec, ICINGA_JSON_CODEC overrides the backend, e.g. to compare them.
+
+    Args:
+        backend (str, optional): The backend, defaults to "auto".
+
+    Returns:
+        IcingaJsonCodec: The codec.
+    """
+    return IcingaJsonCodec(backend=os.environ.get("ICINGA_JSON_CODEC") or backend or "auto")
@@ -1,36 +1,211 @@
 from ansible.module_utils.urls import fetch_url, basic_auth_header
+import asyncio
 import datetime
 import time
 import requests
 import os
+import re
 import json
-
-
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ansible_collections.rangeid.icinga.plugins.module_utils.endpoints import IcingaEndpointPool
+from ansible_collections.rangeid.icinga.plugins.module_utils.json_codec import codec_from_environment
+from ansible_collections.rangeid.icinga.plugins.module_utils.planner import IcingaPlanner, IcingaCoalescer
+from ansible_collections.rangeid.icinga.plugins.module_utils.profiling import phase, profile_methods
+from ansible_collections.rangeid.icinga.plugins.module_utils.rate_limiter import IcingaRateLimiter
+from ansible_collections.rangeid.icinga.plugins.module_utils.service_selector import IcingaServiceSelector
+from ansible_collections.rangeid.icinga.plugins.module_utils.state_table import IcingaStateTable, SERVICE_SEVERITY
+from ansible_collections.rangeid.icinga.plugins.module_utils.transport import transport_from_environment
+
+
+@profile_methods
 class IcingaMiniClass():
-    def __init__(self, module, url, username, password, validate_certs=True):
-        self.url = url
+    # Host attributes joined to the service queries, see get_host_service_states
+    HOST_JOINS = ["host.name", "host.state", "host.downtime_depth", "host.last_check", "host.acknowledgement"]
+
+    def __init__(self, module, url, username, password, validate_certs=True,
+                 rate_limit: float = 0, rate_burst: int = 1, rate_limit_file: str = None,
+                 pool_size: int = 10, read_strategy: str = "round_robin", transport=None,
+                 chunk_size: int = 500, chunk_concurrency: int = 4, chunk_retries: int = 1,
+                 json_codec: str = None):
+        # url can be a list of HA endpoints, the first one is preferred for writes
+        self.endpoints = IcingaEndpointPool(urls=url if isinstance(url, list) else [url],
+                                            read_strategy=read_strategy)
+        self.url = self.endpoints.endpoints[0].url
         self.username = username
         self.password = password
         self.module = module
         self.last_service_status = 3
         self.validate_certs = validate_certs
+        self.throttled_seconds = 0.0
+        self.last_throttled_seconds = 0.0
 
         self.headers = {
             'Authorization': basic_auth_header(self.username, self.password),
             'Accept': 'application/json'
         }
 
-        if self.url.endswith("/"):
-            self.url = self.url[:-1]
+        self.rate_limiter = None
+        if rate_limit:
+            self.rate_limiter = IcingaRateLimiter(rate=rate_limit,
+                                                  burst=rate_burst,
+                                                  state_file=rate_limit_file,
+                                                  key=self.url)
+
+        # One pooled session for all the requests, worker threads share it
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "retries": 0,
+            "errors": 0,
+            "bytes_sent": 0,
+            "bytes_received": 0,
+            "latency": 0.0,
+            "encode_seconds": 0.0,
+            "decode_seconds": 0.0,
+            "merged": 0,
+            "endpoints": {}
+        }
+        # Bodies and responses go through the fastest installed JSON library
+        self.codec = codec_from_environment(json_codec)
+        self.stats["json_codec"] = self.codec.name
+        self.pool_size = pool_size
+        # Large target lists are split in chunks sent in parallel, see _dispatch_chunked
+        self.chunk_size = chunk_size
+        self.chunk_concurrency = chunk_concurrency
+        self.chunk_retries = chunk_retries
+        self.session = requests.Session()
+        _adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", _adapter)
+        self.session.mount("http://", _adapter)
+
+        # Set by start_plan, then actions are planned instead of sent
+        self.planner = None
+        # Concurrent compatible requests are merged before they are sent
+        self.coalescer = IcingaCoalescer(self)
+
+        # The transport can record the traffic to a cassette or replay it offline
+        self.transport = transport
+        if self.transport is None:
+            self.transport = transport_from_environment(session=self.session,
+                                                        validate_certs=self.validate_certs)
+
+    def start_plan(self):
+        """
+        Plan the following operations instead of running them, e.g. in check mode.
+
+        Reads are still sent to resolve the targets, actions are only recorded, see IcingaPlanner.
+        """
+        self.planner = IcingaPlanner(self)
+
+    def get_plan(self):
+        """
+        Return the merged API call plan and its estimated cost, None if not planning.
+        """
+        if self.planner is None:
+            return None
+        return self.planner.plan()
+
+    def report_stats_on_failure(self):
+        """
+        Return throttled_seconds and icinga_stats with every later fail_json of the module.
+
+        Modules call it once the client exists, so failed tasks are accounted by the
+        icinga_stats callback as the successful ones. Values passed explicitly are kept.
+        """
+        _fail_json = self.module.fail_json
+
+        def _fail_json_with_stats(*args, **kwargs):
+            kwargs.setdefault("throttled_seconds", self.get_throttled_seconds())
+            kwargs.setdefault("icinga_stats", self.get_stats())
+            return _fail_json(*args, **kwargs)
+
+        self.module.fail_json = _fail_json_with_stats
 
     def get_last_service_status(self):
         return self.last_service_status
 
+    def get_throttled_seconds(self):
+        return round(self.throttled_seconds, 3)
+
+    def get_endpoints_health(self):
+        return self.endpoints.health()
+
+    def get_stats(self):
+        """
+        Return the API usage of this client, as emitted by the modules for the icinga_stats callback.
+
+        Returns:
+            dict: Calls, retries, errors, bytes, latency and throttled seconds, globally and per endpoint.
+        """
+        with self._lock:
+            _ret = dict(self.stats)
+            _ret["latency"] = round(_ret["latency"], 4)
+            _ret["encode_seconds"] = round(_ret["encode_seconds"], 6)
+            _ret["decode_seconds"] = round(_ret["decode_seconds"], 6)
+            _ret["throttled"] = round(self.throttled_seconds, 4)
+            _ret["endpoints"] = {}
+            for _url, _stats in self.stats["endpoints"].items():
+                _ret["endpoints"][_url] = dict(_stats)
+                _ret["endpoints"][_url]["latency"] = round(_stats["latency"], 4)
+        return _ret
+
+    def _record_stats(self, endpoint: str, sent: int = 0, received: int = 0, latency: float = 0.0,
+                      error: bool = False, retry: bool = False):
+        with self._lock:
+            _endpoint = self.stats["endpoints"].setdefault(endpoint, {
+                "calls": 0,
+                "errors": 0,
+                "bytes_sent": 0,
+                "bytes_received": 0,
+                "latency": 0.0
+            })
+            for _stats in [self.stats, _endpoint]:
+                _stats["calls"] = _stats["calls"] + 1
+                _stats["errors"] = _stats["errors"] + (1 if error else 0)
+                _stats["bytes_sent"] = _stats["bytes_sent"] + sent
+                _stats["bytes_received"] = _stats["bytes_received"] + received
+                _stats["latency"] = _stats["latency"] + latency
+            self.stats["retries"] = self.stats["retries"] + (1 if retry else 0)
+
+    def _record_merge(self):
+        with self._lock:
+            self.stats["merged"] = self.stats["merged"] + 1
+
+    def _record_codec(self, encode: float = 0.0, decode: float = 0.0):
+        with self._lock:
+            self.stats["encode_seconds"] = self.stats["encode_seconds"] + encode
+            self.stats["decode_seconds"] = self.stats["decode_seconds"] + decode
+
+    def _decode(self, content):
+        _start = time.time()
+        try:
+            return self.codec.loads(content)
+        finally:
+            self._record_codec(decode=time.time() - _start)
+
+    def _poll_interval(self, interval: float = 1):
+        """
+        Return the sleep time between two polls.
+
+        When the last request has been delayed by the rate limiter the interval is
+        stretched by the same amount, so polling loops slow down instead of piling
+        up requests on a busy master.
+
+        Args:
+            interval (float, optional): The nominal polling interval in seconds. Default 1.
+
+        Returns:
+            float: The interval to wait before the next poll.
+        """
+        return interval + self.last_throttled_seconds
+
     # def get_services(self, host):
     #   response, info = fetch_url(module, f"{icinga_server}/v1/actions/schedule-downtime", headers=headers, method='POST',
     #                     data=json.dumps(data), timeout=30)
 
-    def _check_all_services(self, host, timeout: int = 10, retries: int = 0, except_on_failure: bool = False):
+    def _check_all_services(self, host, timeout: int = 10, retries: int = 0, except_on_failure: bool = False,
+                            services=None):
         """Check status of all services for a host.
 
         Checks the status of all active services associated with the given host. 
@@ -43,6 +218,7 @@ class IcingaMiniClass():
             retries (int, optional): Number of retries for failed service checks. Default 0.
             except_on_failure (bool, optional): Whether to raise an exception if any
                 service check fails. Default False.
+            services (str|list, optional): Name, pattern or list of the services to check. Default all.
 
         Returns:
             dict: Dictionary containing lists of failed and successful service checks.
@@ -56,29 +232,86 @@ class IcingaMiniClass():
             success=[]
         )
 
+        _selector = self._get_service_index(host=host, attrs=["active", "last_state"])
+        for _name in _selector.select(include=services):
+            _service = _selector.services[_name]
+            if _service["active"] is True:
+                if _service["last_state"] == 0:
+                    pass
+                else:
+                    result = self.check_service(host=host,
+                                                service=_name,
+                                                timeout=timeout, retries=retries, except_on_failure=except_on_failure)
+                    if result == False:
+                        _ret["failed"].append(_name)
+                    else:
+                        _ret["success"].append(_name)
+        return _ret
+
+    def _get_service_index(self, host: str, attrs: list = None, joins: list = None):
+        """
+        Fetch the services of a host once and index them by name.
+
+        Only the name and the requested attributes are transferred, so the index stays
+        cheap even for hosts with thousands of services.
+
+        Args:
+            host (str): The Icinga host name.
+            attrs (list, optional): Additional service attributes to keep in the index.
+            joins (list, optional): Joined attributes, e.g. ["host.state"], kept in the "joins"
+                key of every service.
+
+        Returns:
+            IcingaServiceSelector: The service index of the host.
+        """
+        _attrs = ["name"] + (attrs or [])
         _data = {
-            "type": "Host",
-            "filter": f"host.name==\"{host}\"",
+            "type": "Service",
+            "filter": "host.name==t_host",
+            "filter_vars": {"t_host": host},
+            "attrs": _attrs
         }
+        if joins:
+            _data["joins"] = joins
         _response = self._send_request(
             url="/v1/objects/services",
             method="GET",
             data=_data,
         )
+
+        _services = {}
         for _service in _response['results']:
-            if _service["attrs"]["active"] is True:
-                if _service["attrs"]["last_state"] == 0:
-                    pass
-                else:
-                    result = self.check_service(host=host,
-                                                service=_service["attrs"]["name"],
-                                                timeout=timeout, retries=retries, except_on_failure=except_on_failure)
-                    if result == False:
-                        _ret["failed"].append(_service["attrs"]["name"])
-                    else:
-                        _ret["success"].append(_service["attrs"]["name"])
-        return _ret
+            _services[_service["attrs"]["name"]] = _service["attrs"]
+            if joins:
+                _services[_service["attrs"]["name"]]["joins"] = _service.get("joins", {})
+        return IcingaServiceSelector(_services)
+
+    def _select_services(self, host: str, services, exclude_services: list = None):
+        """
+        Resolve a service selection of a host and validate the explicit names.
+
+        Args:
+            host (str): The Icinga host name.
+            services (str|list): Name, glob, "~" regexp or list of them.
+            exclude_services (list, optional): Names or patterns to remove from the selection.
 
+        Raises:
+            IcingaNoSuchObjectException: If one or more explicit service names do not exist.
+
+        Returns:
+            list: The selected service names.
+        """
+        _selector = self._get_service_index(host=host)
+        _include = services if isinstance(services, list) else [services]
+
+        _invalid_services = _selector.missing(_include + (exclude_services or []))
+        if len(_invalid_services) > 0:
+            _message = f"Unable to find one or more services: {_selector.describe_missing(_invalid_services)}"
+            if len(_selector.services) <= 50:
+                _message = f"{_message}, valid services are {', '.join(_selector.names())}"
+            raise IcingaNoSuchObjectException(message=_message)
+
+        return _selector.select(include=_include, exclude=exclude_services)
 
     def _get_service_status(self, host: str, service: str):  
         """
@@ -96,15 +329,17 @@ class IcingaMiniClass():
                  1 indicates a WARNING state, 2 indicates a CRITICAL state, and 3 indicates an UNKNOWN state.
         """
         self.last_service_status = 3
-        _data = {
-            "type": "Service",
-            "filter": f"host.name==\"{host}\" && service.name==\"{service}\"",
-        }
+        _data = self._build_target_filter(host=[host], services=[service])
         _response = self._send_request(
             url="/v1/objects/services",
             method="GET",
             data=_data,
         )
+        if len(_response['results']) == 0:
+            _selector = self._get_service_index(host=host)
+            raise IcingaNoSuchObjectException(
+                message=f"Unable to find the service {_selector.describe_missing([service])} on host {host}")
+
         self.last_service_status = _response['results'][0]["attrs"]["last_state"]
         return _response['results'][0]["attrs"]["last_state"]
 
@@ -112,9 +347,9 @@ class IcingaMiniClass():
         """
         Get list of services for a host matching a pattern.
         
-        Fetches all services for the given host that match the provided glob pattern.
-        Sends a request to the Icinga API to retrieve services filtered by the host 
-        name and pattern. Returns a list of matching service names.
+        Fetches the service names of the given host with one projected request and
+        matches the provided glob (or "~" regexp) pattern locally. Returns a list of
+        matching service names.
         
         Args:
             host (str): The Icinga host name
@@ -124,21 +359,7 @@ class IcingaMiniClass():
             list: List of service names matching the pattern for the given host.
         """
 
-        _data = {
-            "type": "Service",
-            "filter": f"\"{host}\"==host.name && match (pattern,service.name)",
-            "filter_vars": {"pattern": service_pattern}
-        }
-        _response = self._send_request(
-            url="/v1/objects/services",
-            method="GET",
-            data=_data,
-        )
-        _ret = []
-
-        for _service in _response['results']:
-            _ret.append(_service["attrs"]["name"])
-        return _ret
+        return self._get_service_index(host=host).select(include=service_pattern)
 
     def get_host_status(self, host: str = "", service: str = None):
         """
@@ -167,6 +388,25 @@ class IcingaMiniClass():
             "changes_details": ""
         }
 
+        if service:
+            # Host and services from one service query with the host joined
+            try:
+                _states = self.get_host_service_states(host=host, service=service)
+            except IcingaNoSuchObjectException:
+                _states = {"hosts": {}, "services": {}}
+            if host not in _states["hosts"]:
+                raise IcingaNoSuchObjectException(
+                    message=f"Unable to find the services {service} on host {host}")
+
+            _host = _states["hosts"][host]
+            _ret["host_status"] = _host["state"]
+            _ret["host_maintenance"] = _host["in_downtime"]
+            _ret["changes_details"] = json.dumps(_host)
+            _ret["services"] = {_key.split("!", 1)[1]: _service["state"]
+                                for _key, _service in _states["services"].items()}
+            _ret["status"] = max(_ret["services"].values(), key=lambda _state: SERVICE_SEVERITY.get(_state, 3))
+            return _ret
+
         _results = self._send_request(
             url=f"/v1/objects/hosts/{host}?attrs=acknowledgement&attrs=downtime_depth&attrs=state",
             method="GET",
@@ -181,12 +421,422 @@ class IcingaMiniClass():
         _ret["host_maintenance"] = _results["results"][0]['attrs']['downtime_depth'] > 0
         _ret["changes_details"] = json.dumps(_results["results"][0]['attrs'])
 
-        if service:
-            if isinstance(service, str):
-                pass
-            elif isinstance(service, list):
-                pass
+        return _ret
+
+    def get_host_service_states(self, host=None, hostgroup: str = None, service="*", joins: list = None):
+        """
+        Get the state of services together with the state of their hosts with one request.
+
+        See get_host_service_table, the table is returned as dictionaries.
+
+        Args:
+            host (str|list, optional): Host name, glob or "~" regexp pattern, or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            service (str|list, optional): Service name, glob or "~" regexp pattern, or list of names.
+                Default all the services.
+            joins (list, optional): Joined host attributes. Default HOST_JOINS.
 
+        Raises:
+            IcingaNoSuchObjectException: If no selection is given or no service matches.
+
+        Returns:
+            dict: Dictionary with "hosts" (host name: state, in_downtime, last_check, acknowledged)
+                and "services" (host!service: the same keys).
+        """
+        return self.get_host_service_table(host=host, hostgroup=hostgroup, service=service, joins=joins).as_dicts()
+
+    def get_host_service_table(self, host=None, hostgroup: str = None, service="*", joins: list = None):
+        """
+        Get the state of services together with the state of their hosts with one request.
+
+        The services are read from /v1/objects/services with the host attributes joined,
+        so deciding whether a service failure matters never needs a second query.
+        Hosts without any selected service are not returned.
+
+        Args:
+            host (str|list, optional): Host name, glob or "~" regexp pattern, or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            service (str|list, optional): Service name, glob or "~" regexp pattern, or list of names.
+                Default all the services.
+            joins (list, optional): Joined host attributes. Default HOST_JOINS.
+
+        Raises:
+            IcingaNoSuchObjectException: If no selection is given or no service matches.
+
+        Returns:
+            IcingaStateTable: The states, one row per host and service.
+        """
+        _joins = list(joins or self.HOST_JOINS)
+        if "host.name" not in _joins:
+            _joins.append("host.name")
+
+        _filters = []
+        _vars = {}
+        if isinstance(host, list):
+            _filters.append("host.name in t_hosts")
+            _vars["t_hosts"] = host
+        elif host:
+            _filters.append(self._name_condition("host.name", host, "t_host", _vars))
+        if hostgroup:
+            _filters.append("t_hostgroup in host.groups")
+            _vars["t_hostgroup"] = hostgroup
+        if isinstance(service, list):
+            _filters.append("service.name in t_services")
+            _vars["t_services"] = service
+        elif service and service not in ["all", "*"]:
+            _filters.append(self._name_condition("service.name", service, "t_service", _vars))
+
+        if len(_filters) == 0:
+            raise IcingaNoSuchObjectException(message="A host, hostgroup or service selection is required")
+
+        _response = self._send_request(
+            url="/v1/objects/services",
+            method="GET",
+            data={
+                "type": "Service",
+                "filter": " && ".join(_filters),
+                "filter_vars": _vars,
+                "attrs": ["name", "host_name", "state", "downtime_depth", "last_check", "acknowledgement"],
+                "joins": _joins
+            },
+        )
+
+        def _append(host_name, service_name, attrs):
+            return _table.append(host=host_name,
+                                 service=service_name,
+                                 state=int(attrs.get("state", 3)),
+                                 in_downtime=attrs.get("downtime_depth", 0) > 0,
+                                 last_check=attrs.get("last_check") or 0.0,
+                                 acknowledged=attrs.get("acknowledgement", 0) != 0)
+
+        _table = IcingaStateTable()
+        for _object in _response["results"]:
+            _attrs = _object["attrs"]
+            if _table.find(_attrs["host_name"]) is None:
+                _append(_attrs["host_name"], None, _object.get("joins", {}).get("host", {}))
+            _append(_attrs["host_name"], _attrs["name"], _attrs)
+        return _table
+
+    def _get_last_checks(self, object_type: str, data: dict):
+        """
+        Get the state and last check time of every object selected by a filter with one projected query.
+
+        Args:
+            object_type (str): "Host" or "Service".
+            data (dict): The "type", "filter" and "filter_vars" keys of the request body.
+
+        Returns:
+            dict: Dictionary keyed by host name (or host!service) with the "state" and "last_check" attributes,
+                and "active" False for the objects whose active checks are disabled.
+        """
+        _attrs = ["name", "state", "last_check", "enable_active_checks"]
+        if object_type == "Service":
+            _attrs.append("host_name")
+
+        _response = self._dispatch_chunked(
+            url=f"/v1/objects/{object_type.lower()}s",
+            method="GET",
+            data={
+                "type": object_type,
+                "filter": data["filter"],
+                "filter_vars": data.get("filter_vars", {}),
+                "attrs": _attrs
+            },
+            empty_ok=True
+        )
+
+        _ret = {}
+        for _object in _response["results"]:
+            _key = _object["attrs"]["name"]
+            if object_type == "Service":
+                _key = f"{_object['attrs']['host_name']}!{_object['attrs']['name']}"
+            _ret[_key] = {
+                "state": _object["attrs"]["state"],
+                "last_check": _object["attrs"]["last_check"],
+                "active": _object["attrs"].get("enable_active_checks", True) is not False
+            }
+        return _ret
+
+    def _wait_for_fresh_ok(self, object_type: str, data: dict, baseline: dict,
+                           start: float, timeout: int = 60):
+        """
+        Poll a set of objects until all of them have a fresh OK/UP result or the timeout expires.
+
+        A result is fresh when its last_check is newer than the one in the baseline, so
+        the clock skew between the controller and the master does not matter. Every poll
+        tick is a single projected query covering all the objects. Objects whose active
+        checks are disabled are never refreshed by a reschedule, they are not waited for.
+
+        Args:
+            object_type (str): "Host" or "Service".
+            data (dict): The "type", "filter" and "filter_vars" keys of the request body.
+            baseline (dict): The result of _get_last_checks before the checks were rescheduled.
+            start (float): Time of the reschedule, used to compute the time to recover.
+            timeout (int, optional): Timeout in seconds. Default 60.
+
+        Returns:
+            dict: Dictionary with "recovered" (object: seconds to recover), "pending" (object: last state)
+                and "passive" (object: state, for the objects not actively checked).
+        """
+        _recovered = {}
+        _pending = {}
+        _passive = {_key: _attrs["state"] for _key, _attrs in baseline.items() if not _attrs.get("active", True)}
+        if self.planner is not None:
+            self.planner.wait(kind="fresh_ok", targets=len(baseline) - len(_passive), timeout=timeout)
+            return dict(
+                recovered=_recovered,
+                pending=_pending,
+                passive=_passive
+            )
+
+        _deadline = start + timeout
+        while True:
+            _current = self._get_last_checks(object_type=object_type, data=data)
+            _now = time.time()
+            _pending = {}
+            for _key, _attrs in _current.items():
+                if _key in _recovered:
+                    continue
+                if not _attrs.get("active", True):
+                    _passive[_key] = _attrs["state"]
+                    continue
+                _fresh = _attrs["last_check"] > baseline.get(_key, {}).get("last_check", 0)
+                if _fresh and _attrs["state"] == 0:
+                    _recovered[_key] = round(_now - start, 3)
+                else:
+                    _pending[_key] = _attrs["state"]
+
+            if len(_pending) == 0:
+                break
+            _deadline = _deadline + self.last_throttled_seconds
+            _interval = self._poll_interval()
+            if time.time() + _interval >= _deadline:
+                break
+            time.sleep(_interval)
+
+        return dict(
+            recovered=_recovered,
+            pending=_pending,
+            passive=_passive
+        )
+
+    def wait_downtime_active(self, host=None, hostgroup: str = None, services: list = None,
+                             timeout: int = 30, start: float = None):
+        """
+        Wait until the hosts and services are actually in downtime.
+
+        With config sync across zones a scheduled downtime can take a while to be
+        active where the checks run. Every poll tick is one projected query: on the
+        services, with their host downtime joined, or on the hosts when services is
+        empty. The interval starts short and doubles up to 2 seconds while objects
+        are still pending. Selected hosts that do not exist stay pending, selected
+        hosts without any of the services are read with a host query on their own.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            services (list, optional): Service names, all the services of the hosts if omitted,
+                only the hosts if empty.
+            timeout (int, optional): Seconds to wait. Default 30.
+            start (float, optional): Time the downtimes were scheduled, defaults to now.
+
+        Returns:
+            dict: Dictionary with "active" (True when everything is covered, None when planning),
+                the activation "latency" in seconds and the "pending" objects.
+        """
+        _hosts_only = services is not None and len(services) == 0
+        if _hosts_only:
+            _data = self._build_target_filter(host=host, hostgroup=hostgroup)
+            _data["attrs"] = ["name", "downtime_depth"]
+        else:
+            _data = self._build_target_filter(host=host, hostgroup=hostgroup, service="*", services=services)
+            _data["attrs"] = ["downtime_depth"]
+            _data["joins"] = ["host.name", "host.downtime_depth"]
+        _expected = set(host if isinstance(host, list) else [host] if host else [])
+        _start = start or time.time()
+        _deadline = _start + timeout
+        _interval = 0.25
+        if self.planner is not None:
+            self.planner.wait(kind="downtime_active", targets=len(services or []) + 1, timeout=timeout, interval=2)
+            return dict(
+                active=None,
+                latency=None,
+                pending=[]
+            )
+
+        while True:
+            _throttled = self.throttled_seconds
+            _pending = set()
+            _found = set()
+            for _object in self._query_objects(_data):
+                if _hosts_only:
+                    _found.add(_object["name"])
+                else:
+                    _host = _object["joins"]["host"]
+                    _found.add(_host["name"])
+                    if _host["downtime_depth"] == 0:
+                        _pending.add(_host["name"])
+                if _object["attrs"]["downtime_depth"] == 0:
+                    _pending.add(_object["name"])
+            _missing = _expected - _found
+            if len(_missing) > 0 and not _hosts_only:
+                # Hosts without any of the services, still covered by a host downtime
+                for _object in self._query_objects({"type": "Host",
+                                                    "filter": "host.name in t_hosts",
+                                                    "filter_vars": {"t_hosts": sorted(_missing)},
+                                                    "attrs": ["name", "downtime_depth"]}):
+                    _found.add(_object["name"])
+                    if _object["attrs"]["downtime_depth"] == 0:
+                        _pending.add(_object["name"])
+            if len(_found) == 0 and not _expected:
+                # Empty hostgroup, nothing can ever be covered
+                _pending.add(hostgroup)
+            _pending.update(_expected - _found)
+
+            if len(_pending) == 0:
+                return dict(
+                    active=True,
+                    latency=round(time.time() - _start, 3),
+                    pending=[]
+                )
+
+            # Only the time throttled during this tick moves the deadline
+            _deadline = _deadline + self.throttled_seconds - _throttled
+            _sleep = self._poll_interval(_interval)
+            if time.time() + _sleep >= _deadline:
+                return dict(
+                    active=False,
+                    latency=None,
+                    pending=sorted(_pending)
+                )
+            time.sleep(_sleep)
+            _interval = min(_interval * 2, 2)
+
+    def _query_objects(self, data: dict):
+        try:
+            _response = self._send_request(
+                url=f"/v1/objects/{data['type'].lower()}s",
+                method="GET",
+                data=data,
+            )
+        except IcingaRequestFailedException:
+            raise
+        except IcingaNoSuchObjectException:
+            return []
+        return _response["results"]
+
+    def verify_recovery(self, host=None, hostgroup: str = None, timeout: int = 60):
+        """
+        Force a fresh check of every service of the hosts and wait for them to be OK.
+
+        All the service checks are rescheduled with a single action, then the services
+        are polled with one projected query per tick until all of them report a fresh
+        OK state or the timeout expires. Passive services (active checks disabled) are
+        neither rescheduled nor waited for, a reschedule never refreshes them.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            timeout (int, optional): Seconds to wait for the services. Default 60.
+
+        Returns:
+            dict: Dictionary with the per-service "services" results (state, recovered, time_to_recover)
+                and the "failed" service list.
+        """
+        _data = self._build_target_filter(host=host, hostgroup=hostgroup, service="*")
+        _data["filter"] = f"{_data['filter']} && service.enable_active_checks"
+        _ret = dict(
+            services={},
+            failed=[]
+        )
+
+        _baseline = self._get_last_checks(object_type="Service", data=_data)
+        if len(_baseline) == 0:
+            return _ret
+
+        _start = time.time()
+        _request = dict(_data)
+        _request["force"] = True
+        self._dispatch_chunked(
+            url="/v1/actions/reschedule-check",
+            method="POST",
+            data=_request,
+        )
+
+        _results = self._wait_for_fresh_ok(object_type="Service", data=_data, baseline=_baseline,
+                                           start=_start, timeout=timeout)
+        for _service, _seconds in _results["recovered"].items():
+            _ret["services"][_service] = {"state": 0, "recovered": True, "time_to_recover": _seconds}
+        for _service, _state in _results["pending"].items():
+            _ret["services"][_service] = {"state": _state, "recovered": False, "time_to_recover": None}
+            _ret["failed"].append(_service)
+        _ret["failed"].sort()
+        return _ret
+
+    def check_host(self, host=None, hostgroup: str = None, timeout: int = 60):
+        """
+        Force a fresh check of one or many hosts and wait for them to be UP.
+
+        All the host checks are rescheduled with a single action, then the hosts are
+        polled with one query per tick until all of them report a fresh UP state or
+        the timeout expires. Hosts whose active checks are disabled are not rescheduled,
+        they are returned with their current state and up None.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            timeout (int, optional): Seconds to wait for the hosts, 0 only reschedules the checks. Default 60.
+
+        Raises:
+            IcingaNoSuchObjectException: If one or more hosts do not exist.
+
+        Returns:
+            dict: Dictionary with the per-host "hosts" results (state, up, time_to_up) and the "failed" host list.
+        """
+        _data = self._build_target_filter(host=host, hostgroup=hostgroup)
+
+        _baseline = self._get_last_checks(object_type="Host", data=_data)
+        if isinstance(host, list):
+            _missing = sorted(set(host) - set(_baseline))
+        elif host:
+            _missing = [] if host in _baseline else [host]
+        else:
+            _missing = []
+        if len(_missing) > 0 or len(_baseline) == 0:
+            raise IcingaNoSuchObjectException(
+                message=f"Unable to find one or more hosts: {', '.join(_missing) or hostgroup}")
+
+        _ret = dict(
+            hosts={},
+            failed=[]
+        )
+        _start = time.time()
+        if any([_attrs["active"] for _attrs in _baseline.values()]):
+            _request = dict(_data)
+            _request["filter"] = f"{_data['filter']} && host.enable_active_checks"
+            _request["force"] = True
+            self._dispatch_chunked(
+                url="/v1/actions/reschedule-check",
+                method="POST",
+                data=_request,
+            )
+
+        if timeout == 0:
+            # Set and forget it
+            for _host, _attrs in _baseline.items():
+                _ret["hosts"][_host] = {"state": _attrs["state"], "up": None, "time_to_up": None}
+            return _ret
+
+        _results = self._wait_for_fresh_ok(object_type="Host", data=_data, baseline=_baseline,
+                                           start=_start, timeout=timeout)
+        for _host, _seconds in _results["recovered"].items():
+            _ret["hosts"][_host] = {"state": 0, "up": True, "time_to_up": _seconds}
+        for _host, _state in _results["pending"].items():
+            _ret["hosts"][_host] = {"state": _state, "up": False, "time_to_up": None}
+            _ret["failed"].append(_host)
+        for _host, _state in _results["passive"].items():
+            _ret["hosts"][_host] = {"state": _state, "up": None, "time_to_up": None}
+        _ret["failed"].sort()
         return _ret
 
     def check_service(self, host: str, service: str, timeout: int = 10, retries: int = 0, except_on_failure: bool = True):
@@ -211,10 +861,7 @@ class IcingaMiniClass():
         """
         _retries = 0
         while (True):
-            _data = {
-                "type": "Service",
-                "filter": f"host.name==\"{host}\" && service.name==\"{service}\"",
-            }
+            _data = self._build_target_filter(host=[host], services=[service])
             _response = self._send_request(
                 url="/v1/actions/reschedule-check",
                 method="POST",
@@ -225,13 +872,23 @@ class IcingaMiniClass():
                 # Set and forget it
                 return _response["status"]
 
-            # Start to poll service status until timeout
-            for _second in range(timeout):
+            if self.planner is not None:
+                self.planner.wait(kind="service_ok", targets=1, timeout=timeout)
+                return "Service check planned"
+
+            # Start to poll service status until timeout, the deadline is
+            # moved forward by the time spent throttled
+            _deadline = time.time() + timeout
+            while True:
                 _service_status = self._get_service_status(host=host,
                                                            service=service)
                 if _service_status == 0:
                     return "Service is up"
-                time.sleep(1)
+                _deadline = _deadline + self.last_throttled_seconds
+                _interval = self._poll_interval()
+                if time.time() + _interval >= _deadline:
+                    break
+                time.sleep(_interval)
 
             if _retries < retries:
                 # One more time
@@ -255,7 +912,8 @@ class IcingaMiniClass():
         """
         _data = {
             "type": "Host",
-            "filter": f"host.name==\"{host}\"",
+            "filter": "host.name in t_hosts",
+            "filter_vars": {"t_hosts": [host]},
             "attrs": ["end_time"],
             "pretty": True
         }
@@ -279,13 +937,8 @@ class IcingaMiniClass():
             list: A list of services that are not present in the given list of services.
         """
 
-        _ret = []
-
-        for _in_service in check_against:
-            if not _in_service in services:
-                _ret.append(_in_service)
-
-        return _ret
+        _known = set(services)
+        return [_in_service for _in_service in check_against if _in_service not in _known]
     
     def get_hosts_by_group(self, 
                            hostgroup: str = ""
@@ -323,18 +976,21 @@ class IcingaMiniClass():
                                check_before: bool = False,
                                stop_on_failed_service: bool = False,
                                check_retries: int = 1,
-                               check_timeout: int = 10
+                               check_timeout: int = 10,
+                               verify_after: bool = False,
+                               verify_timeout: int = 60
                                ) -> bool:
         _ret = {
             "status": "",
             "changes": 0,
             "changes_details": [],
-            "services": []
+            "services": [],
+            "verify": None
         }
 
         if check_before:
             _results = self._check_all_services(
-                host=host, retries=check_retries, timeout=check_timeout)
+                host=host, retries=check_retries, timeout=check_timeout, services=services)
             if len(_results["failed"]) > 0 and stop_on_failed_service:
                 failed_services = ", ".join(_results["failed"])
                 raise IcingaFailedService(
@@ -359,6 +1015,50 @@ class IcingaMiniClass():
                 _ret['status'] = " ".join(
                     [_ret['status'], _results["results"][0]['status']]).strip()
 
+        if verify_after:
+            _ret["verify"] = self.verify_recovery(host=host, timeout=verify_timeout)
+
+        return _ret
+
+    def clear_hostgroup_maintenance_mode(self, hostgroup: str,
+                                         author: str = None,
+                                         verify_after: bool = False,
+                                         verify_timeout: int = 60):
+        """
+        Remove the downtimes of all the hosts of a hostgroup and of their services with one request.
+
+        Args:
+            hostgroup (str): The hostgroup name.
+            author (str, optional): Only remove the downtimes of this author.
+            verify_after (bool, optional): Check all the services and wait for them to be OK. Default False.
+            verify_timeout (int, optional): Seconds to wait for the services to recover. Default 60.
+
+        Returns:
+            dict: Dictionary with the number of changes, the per-object success and failed lists and
+                the "verify" results.
+        """
+        _ret = self.remove_hosts_downtime(hostgroup=hostgroup, author=author)
+        _ret["verify"] = None
+        if verify_after:
+            _ret["verify"] = self.verify_recovery(hostgroup=hostgroup, timeout=verify_timeout)
+        return _ret
+
+    def _parse_child_downtimes(self, result: dict):
+        """
+        Group the child downtimes of a schedule-downtime result by host.
+
+        Args:
+            result (dict): One entry of the schedule-downtime "results" list.
+
+        Returns:
+            dict: Dictionary of host name to the list of downtime names created for it.
+        """
+        _ret = {}
+        for _downtime in result.get("child_downtimes", []):
+            # Depending on the Icinga version the entries are names or objects
+            _name = _downtime["name"] if isinstance(_downtime, dict) else _downtime
+            _host = _name.split("!")[0]
+            _ret.setdefault(_host, []).append(_name)
         return _ret
 
     def set_service_maintenance_mode(self, host: str,
@@ -368,30 +1068,34 @@ class IcingaMiniClass():
                                      comment="Downtime",
                                      check_before: bool = False,
                                      check_retries: int = 1,
-                                     check_timeout: int = 10
+                                     check_timeout: int = 10,
+                                     child_hosts: str = "none"
                                      ):
 
         if check_before:
-            self.check_service(host=host,
-                               service=service,
-                               timeout=check_timeout, retries=check_retries, except_on_failure=True)
+            for _service in (service if isinstance(service, list) else [service]):
+                self.check_service(host=host,
+                                   service=_service,
+                                   timeout=check_timeout, retries=check_retries, except_on_failure=True)
 
         _ret = {
             "status": "",
             "changes": 0,
-            "changes_details": []
+            "changes_details": [],
+            "statuses": []
         }
         _data = {
             "type": "Service",
-            "filter": f"host.name==\"{host}\" && service.name==\"{service}\"",
+            "filter": "host.name in t_hosts && service.name in t_services",
+            "filter_vars": {"t_hosts": [host], "t_services": service if isinstance(service, list) else [service]},
             "start_time": datetime.datetime.now().timestamp(),
             "end_time": (datetime.datetime.now() + datetime.timedelta(
                 seconds=duration_seconds)).timestamp(),
             "comment": f"{comment}", "author": f"{author}",
-            "duration": duration_seconds, "child_hosts": 0
+            "duration": duration_seconds,
+            "child_hosts": IcingaStatus.childHostsToInt(child_hosts)
         }
-
-        _results = self._send_request(
+        _results = self._dispatch_chunked(
             url="/v1/actions/schedule-downtime",
             method='POST',
             data=_data
@@ -401,7 +1105,11 @@ class IcingaMiniClass():
         if len(_results["results"]) == 0:
             raise IcingaNoSuchObjectException()
 
+        _ret["chunks"] = _results["chunks"]
         _ret["status"] = _results["results"][0]["status"]
+        _ret["statuses"] = [_result["status"] for _result in _results["results"]]
+        _ret["changes"] = len(_results["results"])
+        _ret["child_hosts"] = self._parse_child_downtimes(_results["results"][0])
         return _ret
 
     def set_maintenance_mode(self, host: str,
@@ -412,20 +1120,30 @@ class IcingaMiniClass():
                              check_before: bool = False,
                              stop_on_failed_service: bool = False,
                              check_retries: int = 1,
-                             check_timeout: int = 10):
+                             check_timeout: int = 10,
+                             child_hosts: str = "none",
+                             exclude_services: list = None,
+                             wait_active: bool = False,
+                             wait_timeout: int = 30):
         """
         Sets a host or service into maintenance mode in Icinga2.
 
         Args:
             host (str): The name of the host to set into maintenance mode.
             duration_seconds (int, optional): The duration of the maintenance window in seconds. Defaults to 0 (indefinite).
-            services (str, optional): The name of the service(s) to set into maintenance mode. Defaults to "all".
+            services (str|list, optional): The name, glob or "~" regexp of the service(s) to set into maintenance mode,
+                or a list of them. Defaults to "all".
             author (str, optional): The name of the user who initiated the maintenance window. Defaults to "Ansible".
             comment (str, optional): A comment to describe the reason for the maintenance window. Defaults to "Downtime".
             check_before (bool, optional): Whether to check the status of all services before setting them into maintenance mode. Defaults to False.
             stop_on_failed_service (bool, optional): Whether to stop setting services into maintenance mode if any of them fail the check. Defaults to False.
             check_retries (int, optional): The number of times to retry the service check before giving up. Defaults to 1.
             check_timeout (int, optional): The timeout for the service check in seconds. Defaults to 10.
+            child_hosts (str, optional): Schedule downtimes for the child hosts too, "none", "triggered" or
+                "non_triggered". Defaults to "none".
+            exclude_services (list, optional): Names or patterns of services to leave out of the selection.
+            wait_active (bool, optional): Return only when the downtimes are active. Defaults to False.
+            wait_timeout (int, optional): Seconds to wait for the downtimes to be active. Defaults to 30.
 
         Raises:
             IcingaNoSuchObjectException: If the specified host or service does not exist in Icinga2.
@@ -437,7 +1155,7 @@ class IcingaMiniClass():
 
         if check_before:
             _results = self._check_all_services(
-                host=host, retries=check_retries, timeout=check_timeout)
+                host=host, retries=check_retries, timeout=check_timeout, services=services)
             if len(_results["failed"]) > 0 and stop_on_failed_service:
                 failed_services = ", ".join(_results["failed"])
                 raise IcingaFailedService(
@@ -448,35 +1166,29 @@ class IcingaMiniClass():
             "changes": 0,
             "changes_details": [],
             "statuses": [],
-            "services": []
+            "services": [],
+            "child_hosts": {},
+            "activation": None
         }
+        _scheduled = time.time()
         _data = {
             "type": "Host",
-            "filter": f"host.name==\"{host}\"",
-            "all_services": "1" if (services == "all" or services == "*") else "0",
+            "filter": "host.name in t_hosts",
+            "filter_vars": {"t_hosts": [host]},
+            "all_services": "1" if (services in ["all", "*"] and not exclude_services) else "0",
             "start_time": datetime.datetime.now().timestamp(),
             "end_time": (datetime.datetime.now() + datetime.timedelta(
                 seconds=duration_seconds)).timestamp(),
             "comment": f"{comment}", "author": f"{author}",
-            "duration": duration_seconds, "child_hosts": 0
+            "duration": duration_seconds,
+            "child_hosts": IcingaStatus.childHostsToInt(child_hosts)
         }
 
-        # If service list were specified, check if all services exists
-        if _data["all_services"] != "1":
-            if isinstance(services, list):
-                _services = self._get_service_list(host=host)
-            else:
-                _services = self._get_service_list(
-                    host=host, service_pattern=services)
-
-            if isinstance(services, list):
-                _invalid_services = self._get_invalid_services(
-                    services=_services, check_against=services)
-                if len(_invalid_services) > 0:
-                    _invalid_services_list = ", ".join(_invalid_services)
-                    _valid_services_list = ", ".join(_services)
-                    raise IcingaNoSuchObjectException(
-                        message=f"Unable to find one or more services: {_invalid_services_list}, valid services are {_valid_services_list}")
+        # Resolve and validate the selected services locally from a single fetch
+        _services = []
+        if services is not None and _data["all_services"] != "1":
+            _services = self._select_services(host=host, services=services,
+                                              exclude_services=exclude_services)
 
         _results = self._send_request(
             url="/v1/actions/schedule-downtime",
@@ -487,80 +1199,1073 @@ class IcingaMiniClass():
         if len(_results["results"]) == 0:
             raise IcingaNoSuchObjectException()
 
-        _services = self._get_service_list(host=host, service_pattern=services)
-        if "service_downtimes" in _results["results"][0]:
-            _ret["changes"] = len(_results["results"][0]["service_downtimes"])
-            _ret["statuses"].append(
-                _results["results"][0]["service_downtimes"])
-
-        _ret["statuses"] = []
         _ret["statuses"].append(_results["results"][0]["status"])
+        # The host downtime, counted as set_maintenance_mode_many does
+        _ret["changes"] = 1
 
-        if _data["all_services"] == "1":
+        if "service_downtimes" in _results["results"][0]:
+            _service_downtimes = _results["results"][0]["service_downtimes"]
+            _ret["changes"] = _ret["changes"] + len(_service_downtimes)
+            # Downtime names are <host>!<service>!<id>
+            for _downtime in _service_downtimes:
+                _name = _downtime["name"] if isinstance(_downtime, dict) else _downtime
+                _ret["services"].append(_name.split("!")[1])
+
+        # Downtimes created by Icinga for the dependency subtree
+        _ret["child_hosts"] = self._parse_child_downtimes(_results["results"][0])
+        _ret["changes"] = _ret["changes"] + sum(
+            [len(_downtimes) for _downtimes in _ret["child_hosts"].values()])
+
+        if len(_services) > 0:
+            # Set service maintenance mode for all the selected services at once
+            _result = self.set_service_maintenance_mode(host=host, service=_services, author=author,
+                                                        comment=comment,
+                                                        duration_seconds=duration_seconds,
+                                                        check_before=False)
+            _ret["changes"] = _ret["changes"] + _result["changes"]
+            _ret["statuses"].extend(_result["statuses"])
             _ret["services"] = _services
-        else:
-            # Select services
-            if isinstance(services, str):
-
-                for _service in _services:
-                    # Set service maintenance mode
-                    _result = self.set_service_maintenance_mode(host=host, service=_service, author=author,
-                                                                comment=comment,
-                                                                duration_seconds=duration_seconds,
-                                                                check_before=False)
-
-                    _ret["changes"] = _ret["changes"] + 1
-                    _ret["statuses"].append(_result["status"])
-                    _ret["services"].append(_service)
-
-            elif isinstance(services, list):
-                for _service in services:
-                    # Set service maintenance mode
-                    _result = self.set_service_maintenance_mode(host=host, service=_service, author=author,
-                                                                comment=comment,
-                                                                duration_seconds=duration_seconds,
-                                                                check_before=False)
-                    _ret["changes"] = _ret["changes"] + 1
-                    _ret["statuses"].append(_result["status"])
-                    _ret["services"].append(_service)
+
+        if wait_active:
+            # All the services, the selected ones, or only the host
+            _ret["activation"] = self.wait_downtime_active(host=host,
+                                                           services=(None if _data["all_services"] == "1"
+                                                                     else _services),
+                                                           timeout=wait_timeout,
+                                                           start=_scheduled)
 
         _ret["changes_details"] = ", ".join(_ret["statuses"])
         return _ret
 
-    def _send_request(self, url: str, method: str, data: str = ""):
-        _headers = self.headers
-        _headers.update({'X-HTTP-Method-Override': method})
-        
+    def schedule_hosts_downtime(self, host=None, hostgroup: str = None,
+                                duration_seconds: int = 3600,
+                                author: str = "Ansible",
+                                comment: str = "Downtime",
+                                child_hosts: str = "none",
+                                all_services: bool = True):
+        """
+        Put many hosts and all their services in downtime with a single filtered request.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            duration_seconds (int, optional): The downtime duration. Defaults to 3600.
+            author (str, optional): The downtime author. Defaults to "Ansible".
+            comment (str, optional): The downtime comment. Defaults to "Downtime".
+            child_hosts (str, optional): "none", "triggered" or "non_triggered". Defaults to "none".
+            all_services (bool, optional): Put the services in downtime too. Defaults to True.
+
+        Returns:
+            dict: Dictionary with the number of changes, the per-object success and failed lists,
+                the "services" in downtime of every host and the "child_hosts" downtimes of every host.
+        """
+        _data = self._build_target_filter(host=host, hostgroup=hostgroup)
+        _now = datetime.datetime.now()
+        _data.update({
+            "all_services": "1" if all_services else "0",
+            "start_time": _now.timestamp(),
+            "end_time": (_now + datetime.timedelta(seconds=duration_seconds)).timestamp(),
+            "comment": f"{comment}",
+            "author": f"{author}",
+            "duration": duration_seconds,
+            "child_hosts": IcingaStatus.childHostsToInt(child_hosts)
+        })
+
+        _results = self._dispatch_chunked(
+            url="/v1/actions/schedule-downtime",
+            method="POST",
+            data=_data,
+            partial_results=True
+        )
+        _ret = self._parse_action_results(_results["results"])
+        _ret["changes"] = len(_ret["success"])
+        _ret["services"] = {}
+        _ret["child_hosts"] = {}
+        for _result in _results["results"]:
+            # Downtime names are <host>!<service>!<id>
+            for _downtime in _result.get("service_downtimes", []):
+                _name = _downtime["name"] if isinstance(_downtime, dict) else _downtime
+                _host, _service = _name.split("!")[:2]
+                _ret["services"].setdefault(_host, []).append(_service)
+            _child_hosts = self._parse_child_downtimes(_result)
+            if len(_child_hosts) > 0:
+                _ret["child_hosts"][_result.get("name", "").split("!")[0]] = _child_hosts
+        return _ret
+
+    def remove_hosts_downtime(self, host=None, hostgroup: str = None,
+                              author: str = None,
+                              comment: str = None):
+        """
+        Remove the downtimes of many hosts and of their services with a single filtered request.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            author (str, optional): Only remove the downtimes of this author.
+            comment (str, optional): Only remove the downtimes with this comment.
+
+        Returns:
+            dict: Dictionary with the number of changes and the per-object success and failed lists.
+        """
+        _data = self._build_target_filter(host=host, hostgroup=hostgroup)
+        _data["type"] = "Downtime"
+        if author:
+            _data["filter"] = f"{_data['filter']} && downtime.author==t_author"
+            _data["filter_vars"]["t_author"] = author
+        if comment:
+            _data["filter"] = f"{_data['filter']} && downtime.comment==t_comment"
+            _data["filter_vars"]["t_comment"] = comment
+
+        # Nothing to remove is not an error
+        _results = self._dispatch_chunked(
+            url="/v1/actions/remove-downtime",
+            method="POST",
+            data=_data,
+            partial_results=True,
+            empty_ok=True
+        )
+        _ret = self._parse_action_results(_results["results"])
+        _ret["changes"] = len(_ret["success"])
+        return _ret
+
+    def set_maintenance_mode_many(self, specs: list, concurrency: int = 4):
+        """
+        Set many hosts into maintenance mode, each with its own parameters.
+
+        Specs selecting only the host or all its services are grouped by identical
+        duration, author, comment and child_hosts, every group is scheduled with one
+        filtered request. The specs with a services selection (or all of them when
+        check_before is set) are run with set_maintenance_mode in a thread pool of
+        concurrency workers sharing the pooled session. Both count the changes
+        the same way: the host downtime, the service downtimes and the child
+        host downtimes.
+
+        Args:
+            specs (list): List of dictionaries with the set_maintenance_mode arguments, "host" is required.
+            concurrency (int, optional): Maximum number of hosts handled at the same time. Default 4.
+
+        Raises:
+            IcingaNoSuchObjectException: If a host is in more than one spec.
+            IcingaAuthenticationException: If the credentials are refused.
+
+        Returns:
+            dict: Dictionary with the number of changes, the per-host "hosts" results (with "changes",
+                "services", "status" and "error" keys), the "failed" host names, the number of
+                grouped requests ("groups") and of hosts run in the pool ("pooled").
+        """
+        _seen = set()
+        _duplicates = set()
+        for _spec in specs:
+            (_duplicates if _spec["host"] in _seen else _seen).add(_spec["host"])
+        if len(_duplicates) > 0:
+            # One result per host, a second spec would overwrite the first one
+            raise IcingaNoSuchObjectException(
+                message=f"Hosts in more than one spec: {', '.join(sorted(_duplicates))}")
+
+        _groups = {}
+        _single = []
+        for _spec in specs:
+            # Same default as set_maintenance_mode
+            _services = _spec.get("services", "all")
+            if _spec.get("check_before") or _spec.get("wait_active") or _spec.get("exclude_services") or \
+                    _services not in [None, "all", "*"]:
+                _single.append(_spec)
+                continue
+            _key = (
+                int(_spec.get("duration_seconds", 0)),
+                _spec.get("author") or "Ansible",
+                _spec.get("comment") or "Downtime",
+                _spec.get("child_hosts") or "none",
+                _services is not None
+            )
+            _groups.setdefault(_key, []).append(_spec["host"])
+
+        _hosts = {}
+
+        def _group(key):
+            _duration_seconds, _author, _comment, _child_hosts, _all_services = key
+            _names = sorted(set(_groups[key]))
+            try:
+                _status = self.schedule_hosts_downtime(host=_names, duration_seconds=_duration_seconds,
+                                                       author=_author, comment=_comment,
+                                                       child_hosts=_child_hosts, all_services=_all_services)
+            except (IcingaNoSuchObjectException, IcingaConnectionException) as e:
+                return {_name: {"changes": 0, "services": [], "status": "", "error": e.message}
+                        for _name in _names}
+
+            _ret = {_name: {"changes": 0, "services": [], "status": "", "error": "Host not found"}
+                    for _name in _names}
+            for _entry in _status["success"] + _status["failed"]:
+                if _entry["object"] not in _ret:
+                    continue
+                _result = _ret[_entry["object"]]
+                _result["status"] = _entry["status"]
+                if 200 <= _entry["code"] < 300:
+                    _result["error"] = None
+                    _result["services"] = _status["services"].get(_entry["object"], [])
+                    _child_hosts = _status["child_hosts"].get(_entry["object"], {})
+                    _result["changes"] = 1 + len(_result["services"]) + sum(
+                        [len(_downtimes) for _downtimes in _child_hosts.values()])
+                else:
+                    _result["error"] = _entry["status"]
+            return _ret
+
+        def _pooled(spec):
+            try:
+                _status = self.set_maintenance_mode(**spec)
+            except (IcingaNoSuchObjectException, IcingaFailedService, IcingaConnectionException) as e:
+                return {spec["host"]: {"changes": 0, "services": [], "status": "",
+                                       "error": e.message or f"Host {spec['host']} not found"}}
+            return {spec["host"]: {"changes": _status["changes"], "services": _status["services"],
+                                   "status": _status["changes_details"], "error": None,
+                                   "activation": _status["activation"]}}
+
+        _jobs = [(_group, _key) for _key in _groups] + [(_pooled, _spec) for _spec in _single]
+        with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(_jobs) or 1))) as _executor:
+            for _result in _executor.map(lambda _job: _job[0](_job[1]), _jobs):
+                _hosts.update(_result)
+
+        return {
+            "changes": sum([_result["changes"] for _result in _hosts.values()]),
+            "hosts": _hosts,
+            "failed": sorted([_name for _name, _result in _hosts.items() if _result["error"]]),
+            "groups": len(_groups),
+            "pooled": len(_single)
+        }
+
+    def get_state_records(self, host=None, hostgroup: str = None, service: str = "*"):
+        """
+        Get the state of the hosts and services of a scope with one projected query.
+
+        See get_state_table.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            service (str, optional): Glob pattern matching the service names. Defaults to all.
+
+        Returns:
+            iterator: [key, kind, state, in_downtime] records, kind is "h" for hosts and "s" for services.
+        """
+        return self.get_state_table(host=host, hostgroup=hostgroup, service=service).records()
+
+    def get_state_table(self, host=None, hostgroup: str = None, service: str = "*"):
+        """
+        Get the state of the hosts and services of a scope as a compact IcingaStateTable.
+
+        Services are fetched with their host joined, then the hosts of the scope are
+        read with a second projected query, so the hosts without any selected service
+        are in the table too.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            service (str, optional): Glob pattern matching the service names. Defaults to all.
+
+        Returns:
+            IcingaStateTable: The states, one row per host and service, with last check and acknowledgement.
+        """
         try:
-            if not self.validate_certs:
-                _response = requests.post(
-                    url=f"{self.url}{url}",
-                    data=self.module.jsonify(data),
-                    headers=_headers,
-                    verify=self.validate_certs
+            _table = self.get_host_service_table(host=host, hostgroup=hostgroup, service=service or "*")
+        except IcingaRequestFailedException:
+            raise
+        except IcingaNoSuchObjectException:
+            if not host and not hostgroup:
+                raise
+            _table = IcingaStateTable()
+        if not host and not hostgroup:
+            return _table
+
+        _filters = []
+        _vars = {}
+        if isinstance(host, list):
+            _filters.append("host.name in t_hosts")
+            _vars["t_hosts"] = host
+        elif host:
+            _filters.append(self._name_condition("host.name", host, "t_host", _vars))
+        if hostgroup:
+            _filters.append("t_hostgroup in host.groups")
+            _vars["t_hostgroup"] = hostgroup
+        _response = self._send_request(
+            url="/v1/objects/hosts",
+            method="GET",
+            data={
+                "type": "Host",
+                "filter": " && ".join(_filters),
+                "filter_vars": _vars,
+                "attrs": ["name", "state", "downtime_depth", "last_check", "acknowledgement"]
+            },
+        )
+        for _object in _response["results"]:
+            _attrs = _object["attrs"]
+            if _table.find(_attrs["name"]) is None:
+                _table.append(host=_attrs["name"],
+                              state=int(_attrs.get("state", 3)),
+                              in_downtime=_attrs.get("downtime_depth", 0) > 0,
+                              last_check=_attrs.get("last_check") or 0.0,
+                              acknowledged=_attrs.get("acknowledgement", 0) != 0)
+        return _table
+
+    def _name_condition(self, field: str, pattern: str, var: str, filter_vars: dict):
+        # Exact names compare, "~" patterns are regexps, the others globs
+        if pattern.startswith("~"):
+            filter_vars[var] = pattern[1:]
+            return f"regex({var}, {field})"
+        filter_vars[var] = pattern
+        if IcingaServiceSelector.is_pattern(pattern):
+            return f"match({var}, {field})"
+        return f"{field}=={var}"
+
+    def get_states(self, terms: list, details: bool = False):
+        """
+        Resolve many host and service state terms with at most two projected queries.
+
+        Terms are host names, host!service pairs, or patterns of them (glob, or
+        regexp prefixed with "~"), e.g. "web01", "web01!ping", "web*!disk*". All the
+        host terms are resolved by one Host query and all the service terms by one
+        Service query, then every term is matched locally against the results.
+
+        Args:
+            terms (list): The terms to resolve.
+            details (bool, optional): Return dictionaries with "state", "in_downtime" and
+                "acknowledged" instead of the plain state. Default False.
+
+        Returns:
+            dict: Dictionary of term to its state, None for unknown objects; pattern terms
+                map to a dictionary of matching object name to its state.
+        """
+        _host_terms = [_term for _term in terms if "!" not in _term]
+        _service_terms = [_term for _term in terms if "!" in _term]
+        _attrs = ["name", "state", "downtime_depth", "acknowledgement"]
+        # States are kept in a table, the indexes below only map names to rows
+        _table = IcingaStateTable()
+
+        def _append(host_name, service_name, attrs):
+            return _table.append(host=host_name,
+                                 service=service_name,
+                                 state=int(attrs["state"]),
+                                 in_downtime=attrs["downtime_depth"] > 0,
+                                 acknowledged=attrs["acknowledgement"] != 0)
+
+        def _value(row):
+            if not details:
+                return _table.states[row]
+            _state = _table.state(row)
+            del _state["last_check"]
+            return _state
+
+        _hosts = {}
+        if len(_host_terms) > 0:
+            _vars = {}
+            _filters = []
+            _exact = [_term for _term in _host_terms if not IcingaServiceSelector.is_pattern(_term)]
+            if len(_exact) > 0:
+                _filters.append("host.name in t_hosts")
+                _vars["t_hosts"] = _exact
+            for _index, _term in enumerate(set(_host_terms) - set(_exact)):
+                _filters.append(self._name_condition("host.name", _term, f"t_h{_index}", _vars))
+
+            _response = self._send_request(
+                url="/v1/objects/hosts",
+                method="GET",
+                data={"type": "Host", "filter": " || ".join(_filters), "filter_vars": _vars, "attrs": _attrs},
+            )
+            _hosts = {_host["attrs"]["name"]: _append(_host["attrs"]["name"], None, _host["attrs"])
+                      for _host in _response["results"]}
+
+        _services = {}
+        if len(_service_terms) > 0:
+            _vars = {}
+            _filters = []
+            for _index, _term in enumerate(set(_service_terms)):
+                _host, _service = _term.split("!", 1)
+                _filters.append(
+                    f"({self._name_condition('host.name', _host, f't_sh{_index}', _vars)} && "
+                    f"{self._name_condition('service.name', _service, f't_ss{_index}', _vars)})")
+
+            _response = self._send_request(
+                url="/v1/objects/services",
+                method="GET",
+                data={"type": "Service", "filter": " || ".join(_filters), "filter_vars": _vars,
+                      "attrs": _attrs + ["host_name"]},
+            )
+            for _object in _response["results"]:
+                _services.setdefault(_object["attrs"]["host_name"], {})[_object["attrs"]["name"]] = \
+                    _append(_object["attrs"]["host_name"], _object["attrs"]["name"], _object["attrs"])
+
+        _ret = {}
+        _host_index = IcingaServiceSelector(_hosts)
+        for _term in _host_terms:
+            if IcingaServiceSelector.is_pattern(_term):
+                _ret[_term] = {_name: _value(_hosts[_name]) for _name in _host_index.select(include=_term)}
+            else:
+                _ret[_term] = _value(_hosts[_term]) if _term in _hosts else None
+
+        _service_hosts = IcingaServiceSelector(_services)
+        for _term in _service_terms:
+            _host, _service = _term.split("!", 1)
+            if IcingaServiceSelector.is_pattern(_host) or IcingaServiceSelector.is_pattern(_service):
+                _ret[_term] = {}
+                for _name in _service_hosts.select(include=_host):
+                    _selector = IcingaServiceSelector(_services[_name])
+                    for _service_name in _selector.select(include=_service):
+                        _ret[_term][f"{_name}!{_service_name}"] = _value(_services[_name][_service_name])
+            else:
+                _found = _services.get(_host, {}).get(_service)
+                _ret[_term] = _value(_found) if _found is not None else None
+
+        return _ret
+
+    def get_downtimes(self, author: str = None,
+                      comment: str = None,
+                      host=None,
+                      hostgroup: str = None,
+                      end_before: float = None,
+                      end_after: float = None,
+                      older_than_seconds: int = 0):
+        """
+        Get the downtimes matching the given criteria with one projected query.
+
+        Args:
+            author (str, optional): Downtime author.
+            comment (str, optional): Regular expression matching the downtime comment.
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name of the downtime host.
+            end_before (float, optional): Only downtimes ending before this timestamp.
+            end_after (float, optional): Only downtimes ending after this timestamp.
+            older_than_seconds (int, optional): Only downtimes created more than this many seconds ago.
+
+        Raises:
+            IcingaNoSuchObjectException: If no criteria is given.
+
+        Returns:
+            list: List of dictionaries with the "name", "id", "host", "service", "author", "comment",
+                "entry_time" and "end_time" of the downtimes.
+        """
+        _filters = []
+        _vars = {}
+        if author:
+            _filters.append("downtime.author==p_author")
+            _vars["p_author"] = author
+        if comment:
+            _filters.append("regex(p_comment, downtime.comment)")
+            _vars["p_comment"] = comment
+        if isinstance(host, list):
+            _filters.append("host.name in p_hosts")
+            _vars["p_hosts"] = host
+        elif host:
+            _filters.append("host.name==p_host")
+            _vars["p_host"] = host
+        if hostgroup:
+            _filters.append("p_hostgroup in host.groups")
+            _vars["p_hostgroup"] = hostgroup
+        if end_before:
+            _filters.append("downtime.end_time<p_end_before")
+            _vars["p_end_before"] = end_before
+        if end_after:
+            _filters.append("downtime.end_time>p_end_after")
+            _vars["p_end_after"] = end_after
+        if older_than_seconds:
+            _filters.append("downtime.entry_time<p_entry_before")
+            _vars["p_entry_before"] = time.time() - older_than_seconds
+
+        # Never select all the downtimes of the master by mistake
+        if len(_filters) == 0:
+            raise IcingaNoSuchObjectException(message="At least one downtime criteria is required")
+
+        _response = self._send_request(
+            url="/v1/objects/downtimes",
+            method="GET",
+            data={
+                "type": "Downtime",
+                "filter": " && ".join(_filters),
+                "filter_vars": _vars,
+                "attrs": ["name", "host_name", "service_name", "author", "comment", "entry_time", "end_time"]
+            },
+        )
+
+        _ret = []
+        for _downtime in _response["results"]:
+            _ret.append({
+                "name": _downtime["name"],
+                "id": _downtime["attrs"]["name"],
+                "host": _downtime["attrs"]["host_name"],
+                "service": _downtime["attrs"]["service_name"],
+                "author": _downtime["attrs"]["author"],
+                "comment": _downtime["attrs"]["comment"],
+                "entry_time": _downtime["attrs"]["entry_time"],
+                "end_time": _downtime["attrs"]["end_time"]
+            })
+        return _ret
+
+    def purge_downtimes(self, dry_run: bool = False, chunk_size: int = None, **criteria):
+        """
+        Remove all the downtimes matching the given criteria.
+
+        The matching downtimes are selected with one projected query, then removed
+        by name with remove-downtime requests of at most chunk_size downtimes each,
+        so very large matches never produce a single huge request.
+
+        Args:
+            dry_run (bool, optional): Only return the matching downtimes. Default False.
+            chunk_size (int, optional): Maximum number of downtimes removed by a request. Defaults to
+                the client chunk size.
+            **criteria: The get_downtimes criteria.
+
+        Returns:
+            dict: Dictionary with the matching "downtimes", the number of "changes", the
+                "failed" removals and the timing of the "chunks" sent.
+        """
+        _ret = dict(
+            downtimes=self.get_downtimes(**criteria),
+            changes=0,
+            failed=[],
+            chunks=[]
+        )
+        if dry_run or len(_ret["downtimes"]) == 0:
+            return _ret
+
+        _results = self._dispatch_chunked(
+            url="/v1/actions/remove-downtime",
+            method="POST",
+            data={
+                "type": "Downtime",
+                "filter": "downtime.name in p_names",
+                "filter_vars": {"p_names": [_downtime["id"] for _downtime in _ret["downtimes"]]}
+            },
+            partial_results=True,
+            empty_ok=True,
+            chunk_size=chunk_size
+        )
+        _parsed = self._parse_action_results(_results["results"])
+        _ret["changes"] = len(_parsed["success"])
+        _ret["failed"] = _parsed["failed"]
+        _ret["chunks"] = _results["chunks"]
+        return _ret
+
+    def _build_target_filter(self, host=None, hostgroup: str = None,
+                             service: str = None, services: list = None,
+                             only_problems: bool = False):
+        """
+        Build an Icinga filter addressing many objects at once.
+
+        Services are selected when service or services are given, hosts otherwise. All the
+        values are passed as filter_vars, so names are never quoted into the filter string.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            service (str, optional): Glob pattern matching the service names.
+            services (list, optional): Explicit list of service names.
+            only_problems (bool, optional): Select only objects that are not in an OK/UP state. Default False.
+
+        Returns:
+            dict: The "type", "filter" and "filter_vars" keys of the request body.
+        """
+        _type = "Service" if (service or services) else "Host"
+        _filters = []
+        _vars = {}
+
+        if isinstance(host, list):
+            _filters.append("host.name in t_hosts")
+            _vars["t_hosts"] = host
+        elif host:
+            _filters.append("host.name==t_host")
+            _vars["t_host"] = host
+
+        if hostgroup:
+            _filters.append("t_hostgroup in host.groups")
+            _vars["t_hostgroup"] = hostgroup
+
+        if services:
+            _filters.append("service.name in t_services")
+            _vars["t_services"] = services
+        elif service and service not in ["all", "*"]:
+            _filters.append("match(t_service, service.name)")
+            _vars["t_service"] = service
+
+        if only_problems:
+            _filters.append(f"{_type.lower()}.state!=0")
+
+        if len(_filters) == 0:
+            raise IcingaNoSuchObjectException(message="A host, hostgroup or service selection is required")
+
+        return {
+            "type": _type,
+            "filter": " && ".join(_filters),
+            "filter_vars": _vars
+        }
+
+    def _parse_action_results(self, results: list):
+        """
+        Split the results of a bulk action into succeeded and failed objects.
+
+        Icinga returns one entry per object, the object name is only reported inside
+        the status message so it is extracted from the first quoted token.
+
+        Args:
+            results (list): The "results" list of an action reply.
+
+        Returns:
+            dict: Dictionary with "success" and "failed" lists of {"object", "code", "status"} entries.
+        """
+        _ret = dict(
+            success=[],
+            failed=[]
+        )
+        for _result in results:
+            _status = _result.get("status", "")
+            _match = re.findall(r"'([^']+)'", _status)
+            _entry = {
+                "object": _match[-1] if _match else _result.get("name", ""),
+                "code": int(_result.get("code", 0)),
+                "status": _status
+            }
+            if 200 <= _entry["code"] < 300:
+                _ret["success"].append(_entry)
+            else:
+                _ret["failed"].append(_entry)
+        return _ret
+
+    def acknowledge_problems(self, host=None,
+                             hostgroup: str = None,
+                             service: str = None,
+                             services: list = None,
+                             only_problems: bool = True,
+                             author: str = "Ansible",
+                             comment: str = "Acknowledged",
+                             sticky: bool = False,
+                             notify: bool = False,
+                             persistent: bool = False,
+                             expiry_seconds: int = 0):
+        """
+        Acknowledge the problems of many hosts or services with a single request.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            service (str, optional): Glob pattern matching the service names.
+            services (list, optional): Explicit list of service names.
+            only_problems (bool, optional): Target only objects not in an OK/UP state. Defaults to True.
+            author (str, optional): Acknowledgement author. Defaults to "Ansible".
+            comment (str, optional): Acknowledgement comment. Defaults to "Acknowledged".
+            sticky (bool, optional): Keep the acknowledgement until the object recovers. Defaults to False.
+            notify (bool, optional): Send an acknowledgement notification. Defaults to False.
+            persistent (bool, optional): Keep the comment after the acknowledgement is removed. Defaults to False.
+            expiry_seconds (int, optional): Remove the acknowledgement after this many seconds, 0 never expires.
+
+        Raises:
+            IcingaNoSuchObjectException: If no object matches the selection and only_problems is False.
+
+        Returns:
+            dict: Dictionary with the number of changes and the per-object success and failed lists.
+        """
+        _data = self._build_target_filter(host=host, hostgroup=hostgroup,
+                                          service=service, services=services,
+                                          only_problems=only_problems)
+        _data.update({
+            "author": f"{author}",
+            "comment": f"{comment}",
+            "sticky": sticky,
+            "notify": notify,
+            "persistent": persistent
+        })
+        if expiry_seconds:
+            _data["expiry"] = (datetime.datetime.now() + datetime.timedelta(
+                seconds=expiry_seconds)).timestamp()
+
+        # With only_problems an empty selection means nothing to acknowledge
+        _results = self._dispatch_chunked(
+            url="/v1/actions/acknowledge-problem",
+            method="POST",
+            data=_data,
+            partial_results=True,
+            empty_ok=only_problems
+        )
+
+        _ret = self._parse_action_results(_results["results"])
+        _ret["changes"] = len(_ret["success"])
+        _ret["chunks"] = _results["chunks"]
+        return _ret
+
+    def remove_acknowledgements(self, host=None,
+                                hostgroup: str = None,
+                                service: str = None,
+                                services: list = None):
+        """
+        Remove the acknowledgements of many hosts or services with a single request.
+
+        Args:
+            host (str|list, optional): Host name or list of host names.
+            hostgroup (str, optional): Hostgroup name.
+            service (str, optional): Glob pattern matching the service names.
+            services (list, optional): Explicit list of service names.
+
+        Returns:
+            dict: Dictionary with the number of changes and the per-object success and failed lists.
+        """
+        _data = self._build_target_filter(host=host, hostgroup=hostgroup,
+                                          service=service, services=services)
+        # Only acknowledged objects, so the number of changes is meaningful
+        _data["filter"] = f"{_data['filter']} && {_data['type'].lower()}.acknowledgement!=0"
+
+        # An empty selection means nothing is acknowledged
+        _results = self._dispatch_chunked(
+            url="/v1/actions/remove-acknowledgement",
+            method="POST",
+            data=_data,
+            partial_results=True,
+            empty_ok=True
+        )
+
+        _ret = self._parse_action_results(_results["results"])
+        _ret["changes"] = len(_ret["success"])
+        _ret["chunks"] = _results["chunks"]
+        return _ret
+
+    def submit_check_results(self, results: list, concurrency: int = 4):
+        """
+        Submit many passive check results.
+
+        Identical submissions are collapsed, then every result is sent with its own
+        process-check-result action through the pooled session, with at most
+        concurrency requests in flight.
+
+        Args:
+            results (list): List of dictionaries with "host", "service" (empty or None for a host
+                result), "exit_status", "output" and "perfdata" (list of strings) keys.
+            concurrency (int, optional): Maximum number of concurrent requests. Default 4.
+
+        Raises:
+            IcingaConnectionException: If the Icinga server is unreachable.
+            IcingaAuthenticationException: If the credentials are refused.
+
+        Returns:
+            dict: Dictionary with the per-object success and failed lists, the number of
+                submitted and collapsed entries and the achieved throughput.
+        """
+        _unique = {}
+        for _result in results:
+            _key = (
+                _result["host"],
+                _result.get("service") or "",
+                int(_result.get("exit_status", 0)),
+                _result.get("output") or "",
+                tuple(_result.get("perfdata") or [])
+            )
+            _unique.setdefault(_key, _result)
+
+        def _submit(key):
+            _host, _service, _exit_status, _output, _perfdata = key
+            _data = {
+                "exit_status": _exit_status,
+                "plugin_output": _output,
+                "performance_data": list(_perfdata)
+            }
+            if _service:
+                _data.update({
+                    "type": "Service",
+                    "filter": "host.name==t_host && service.name==t_service",
+                    "filter_vars": {"t_host": _host, "t_service": _service}
+                })
+            else:
+                _data.update({
+                    "type": "Host",
+                    "filter": "host.name==t_host",
+                    "filter_vars": {"t_host": _host}
+                })
+
+            _entry = {"host": _host, "service": _service}
+            try:
+                _response = self._send_request(
+                    url="/v1/actions/process-check-result",
+                    method="POST",
+                    data=_data,
                 )
+                _entry["code"] = int(_response["results"][0]["code"])
+                _entry["status"] = _response["results"][0]["status"]
+            except IcingaNoSuchObjectException as e:
+                _entry["code"] = 404
+                _entry["status"] = e.message
+            return _entry
+
+        _start = time.time()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as _executor:
+            _entries = list(_executor.map(_submit, _unique.keys()))
+        _elapsed = time.time() - _start
+
+        _ret = dict(
+            success=[_entry for _entry in _entries if 200 <= _entry["code"] < 300],
+            failed=[_entry for _entry in _entries if not 200 <= _entry["code"] < 300],
+            submitted=len(_entries),
+            collapsed=len(results) - len(_entries),
+            elapsed_seconds=round(_elapsed, 3),
+            throughput=round(len(_entries) / _elapsed, 2) if _elapsed > 0 else 0
+        )
+        return _ret
+
+    def _dispatch_chunked(self, url: str, method: str, data: dict, partial_results: bool = False,
+                          empty_ok: bool = False, chunk_size: int = None):
+        """
+        Send a request whose target list may be too large for a single request.
+
+        The longest list in filter_vars is split in chunks of at most chunk_size
+        values, the chunks are sent with at most chunk_concurrency requests in flight
+        and their results are merged in chunk order. A read chunk failing because of
+        the connection is retried up to chunk_retries times without resending the
+        others. Write chunks are never resent (_perform_request already tried every
+        endpoint it could not connect to), nor chunks failed by the API (HTTP 500). Only a chunk matching no
+        object (HTTP 404) counts as empty. Requests without a list larger than
+        chunk_size are sent as they are.
+
+        Args:
+            url (str): The API path.
+            method (str): The HTTP method.
+            data (dict): The request body, with the target lists in filter_vars.
+            partial_results (bool, optional): Accept the 500 replies of partially failed actions. Default False.
+            empty_ok (bool, optional): Return empty results instead of raising when nothing matches. Default False.
+            chunk_size (int, optional): Maximum number of values per chunk. Defaults to the client chunk size.
+
+        Raises:
+            IcingaConnectionException: If one or more chunks still fail after the retries.
+            IcingaRequestFailedException: If the API failed one or more chunks.
+            IcingaNoSuchObjectException: If no chunk matches any object and empty_ok is False.
+
+        Returns:
+            dict: The merged "results" and the "chunks" list with index, size, attempts and elapsed seconds.
+        """
+        chunk_size = max(1, chunk_size or self.chunk_size)
+        _vars = data.get("filter_vars", {})
+        _lists = [_name for _name, _value in _vars.items() if isinstance(_value, list)]
+        _chunk_var = max(_lists, key=lambda _name: len(_vars[_name])) if _lists else None
+
+        if _chunk_var is None or len(_vars[_chunk_var]) <= chunk_size:
+            _bodies = [data]
+        else:
+            _values = _vars[_chunk_var]
+            _bodies = []
+            for _index in range(0, len(_values), chunk_size):
+                _body = dict(data)
+                _body["filter_vars"] = dict(_vars)
+                _body["filter_vars"][_chunk_var] = _values[_index:_index + chunk_size]
+                _bodies.append(_body)
+
+        def _send(index):
+            _chunk = {
+                "index": index,
+                "size": len(_bodies[index]["filter_vars"][_chunk_var]) if _chunk_var else 0,
+                "attempts": 0,
+                "elapsed": 0.0,
+                "empty": False
+            }
+            _start = time.time()
+            while True:
+                _chunk["attempts"] = _chunk["attempts"] + 1
+                try:
+                    _results = self._send_request(url=url, method=method, data=_bodies[index],
+                                                  partial_results=partial_results,
+                                                  chunk_of=id(data) if len(_bodies) > 1 else None)["results"]
+                    break
+                except IcingaRequestFailedException as e:
+                    # The action may have been applied to part of the chunk, never resent
+                    _chunk["error"] = e
+                    _results = None
+                    break
+                except IcingaNoSuchObjectException as e:
+                    _chunk["empty"] = True
+                    _chunk["error"] = e
+                    _results = []
+                    break
+                except IcingaConnectionException as e:
+                    _chunk["error"] = e
+                    if method != "GET" or _chunk["attempts"] > self.chunk_retries:
+                        _results = None
+                        break
+            _chunk["elapsed"] = round(time.time() - _start, 3)
+            return _chunk, _results
+
+        if len(_bodies) == 1:
+            _outcomes = [_send(0)]
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, min(self.chunk_concurrency, len(_bodies)))) as _executor:
+                _outcomes = list(_executor.map(_send, range(len(_bodies))))
+
+        _ret = {"results": [], "chunks": []}
+        _failed = []
+        _empty = []
+        for _chunk, _results in _outcomes:
+            _error = _chunk.pop("error", None)
+            if _results is None:
+                _failed.append(_error)
             else:
-                _response = requests.post(
-                    url=f"{self.url}{url}",
-                    data=self.module.jsonify(data),
-                    headers=_headers)
+                _ret["results"].extend(_results)
+            if _chunk["empty"]:
+                _empty.append(_error)
+            _ret["chunks"].append(_chunk)
+
+        if len(_failed) > 0:
+            if len(_bodies) == 1:
+                raise _failed[0]
+            raise type(_failed[0])(
+                message=f"{len(_failed)} of {len(_bodies)} chunks failed: {_failed[0].message}")
+
+        if not empty_ok and len(_empty) == len(_bodies):
+            raise _empty[0]
+
+        return _ret
+
+    def fan_out(self, calls: list, limit: int = None):
+        """
+        Run many independent calls concurrently through the asyncio client.
 
-        except requests.exceptions.ConnectionError as e:
-            raise IcingaConnectionException(f"Could not connect to Icinga server: {e}")
-        except OSError as e:
-            raise IcingaConnectionException(f"Could not connect to Icinga server: {e}")
+        With aiohttp installed the requests share one aiohttp session on the preferred
+        endpoint, with at most limit connections open, the rate limiter and the stats
+        of this client. While planning, or without aiohttp, the requests go through
+        _send_request in a pool of limit threads instead, so the planner, the transport
+        and the endpoint failover apply to them as to any other request of this client.
+        When called from a running event loop the calls run in a loop of their own, in
+        another thread.
+
+        Args:
+            calls (list): List of (operation, kwargs) tuples, where operation is an
+                IcingaMiniAsyncClass method name, e.g. ("get_service_status", {"host": "h1", "service": "ping"}).
+            limit (int, optional): Maximum number of concurrent requests. Defaults to the pool size.
+
+        Returns:
+            list: The results in the same order as the calls, failed calls are returned as their exception.
+        """
+        # Imported here, the async client imports the exceptions of this module
+        from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2_async import IcingaMiniAsyncClass, \
+            HAS_AIOHTTP
+
+        _options = dict(
+            limit=limit or self.pool_size,
+            codec=self.codec
+        )
+        if HAS_AIOHTTP and self.planner is None:
+            _options.update(stats_callback=self._record_stats, throttle=self._throttle)
+        else:
+            _options.update(sender=self._send_request)
+
+        async def _run():
+            async with IcingaMiniAsyncClass(url=self.endpoints.preferred().url,
+                                            username=self.username,
+                                            password=self.password,
+                                            validate_certs=self.validate_certs,
+                                            **_options) as _client:
+                return await _client.gather(
+                    [getattr(_client, _operation)(**_kwargs) for _operation, _kwargs in calls])
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(_run())
+        # asyncio.run cannot be nested in a running loop
+        with ThreadPoolExecutor(max_workers=1) as _executor:
+            return _executor.submit(asyncio.run, _run()).result()
+
+    def _send_request(self, url: str, method: str, data: str = "", partial_results: bool = False,
+                      chunk_of: int = None):
+        if self.planner is not None:
+            return self.planner.send(url=url, method=method, data=data, partial_results=partial_results,
+                                     chunk_of=chunk_of)
+        if chunk_of is not None:
+            # Chunks are split on purpose, never merged back
+            return self._perform_request(url=url, method=method, data=data, partial_results=partial_results)
+        return self.coalescer.send(url=url, method=method, data=data, partial_results=partial_results)
+
+    def _throttle(self):
+        # Wait for the rate limiter, if any, and account the time spent waiting
+        _throttled = 0.0
+        if self.rate_limiter is not None:
+            _throttled = self.rate_limiter.acquire()
+        with self._lock:
+            self.last_throttled_seconds = _throttled
+            self.throttled_seconds = self.throttled_seconds + _throttled
+        return _throttled
+
+    def _connect_failed(self, error):
+        # True if the request never reached the endpoint: connect timeout, refused
+        # connection or name resolution failure, but not a timeout or reset while waiting
+        if isinstance(error, (requests.exceptions.ConnectTimeout, ConnectionRefusedError)):
+            return True
+        if isinstance(error, requests.exceptions.ConnectionError) and len(error.args) > 0:
+            _reason = getattr(error.args[0], "reason", error.args[0])
+            # urllib3 connect errors, NewConnectionError and NameResolutionError derive from it
+            return "ConnectTimeoutError" in [_class.__name__ for _class in type(_reason).__mro__]
+        return False
+
+    def _perform_request(self, url: str, method: str, data: str = "", partial_results: bool = False):
+        _headers = dict(self.headers)
+        _headers.update({'X-HTTP-Method-Override': method})
+
+        self._throttle()
+
+        # Reads are spread across the endpoints, writes go to the preferred one.
+        # Reads fail over to the next endpoint when one is unreachable or reloading,
+        # writes only when the connection could not be opened: once the body was
+        # sent the action may have been applied, resending it would duplicate it
+        _write = method != "GET"
+        with phase("request_build"):
+            _start = time.time()
+            _body = self.codec.dumps(data)
+            self._record_codec(encode=time.time() - _start)
+        _attempt = 0
+        for _endpoint in self.endpoints.candidates(write=_write):
+            _attempt = _attempt + 1
+            try:
+                with phase("network_wait"):
+                    _response = self.transport.send(
+                        endpoint=_endpoint.url,
+                        path=url,
+                        method=method,
+                        body=_body,
+                        headers=_headers
+                    )
+            except (requests.exceptions.RequestException, OSError) as e:
+                _error = e
+                self.endpoints.record_failure(_endpoint, e)
+                self._record_stats(_endpoint.url, sent=len(_body), error=True, retry=_attempt > 1)
+                if _write and not self._connect_failed(e):
+                    raise IcingaConnectionException(f"Request to Icinga server failed after sending: {e}")
+                continue
+
+            _failed = _response.status_code in [502, 503, 504]
+            self._record_stats(_endpoint.url, sent=len(_body), received=len(_response.content),
+                               latency=_response.elapsed, error=_failed, retry=_attempt > 1)
+            if _failed:
+                _error = f"HTTP {_response.status_code}"
+                self.endpoints.record_failure(_endpoint, _error)
+                if _write:
+                    raise IcingaConnectionException(f"Icinga server failed the request: {_error}")
+                continue
+
+            self.endpoints.record_success(_endpoint, _response.elapsed)
+            break
+        else:
+            raise IcingaConnectionException(f"Could not connect to Icinga server: {_error}")
 
         if _response.status_code in [401, 403]:
             raise IcingaAuthenticationException
 
         if _response.status_code in [404]:
-            _details = _response.json()
+            _details = self._decode(_response.content)
             raise IcingaNoSuchObjectException(_details['status'])
 
         if _response.status_code in [500]:
-            raise IcingaNoSuchObjectException()
-
-        return _response.json()
+            # Bulk actions report a 500 when only some of the objects failed,
+            # the per-object outcome is in the results list
+            if partial_results:
+                try:
+                    _details = self._decode(_response.content)
+                except ValueError:
+                    _details = {}
+                if len(_details.get("results", [])) > 0:
+                    return _details
+            raise IcingaRequestFailedException()
+
+        with phase("decode"):
+            return self._decode(_response.content)
 
 class IcingaConnectionException(Exception):
     customMessage = False
@@ -614,7 +2319,21 @@ class IcingaNoSuchObjectException(Exception):
         super().__init__(self.message)
 
 
+class IcingaRequestFailedException(IcingaNoSuchObjectException):
+    # An IcingaNoSuchObjectException for the callers that always treated a 500 as one,
+    # _dispatch_chunked tells it apart from a filter matching nothing
+    customMessage = False
+    defaultMessage = "The Icinga API failed the request"
+
+
 class IcingaStatus():
+    def childHostsToInt(child_hosts: str = "none"):
+        if child_hosts == "triggered":
+            return 1
+        if child_hosts == "non_triggered":
+            return 2
+        return 0
+
     def serviceStateToString(status: int = 0):
         if status == 0:
             return "OK"
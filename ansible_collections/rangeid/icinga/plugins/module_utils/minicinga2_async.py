@@ -0,0 +1,328 @@
+import asyncio
+import base64
+import datetime
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from ansible_collections.rangeid.icinga.plugins.module_utils.json_codec import codec_from_environment
+from ansible_collections.rangeid.icinga.plugins.module_utils.service_selector import IcingaServiceSelector
+from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaStatus, \
+    IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaConnectionException, \
+    IcingaRequestFailedException
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+
+class IcingaMiniAsyncClass():
+    """asyncio counterpart of IcingaMiniClass for callers issuing many independent calls.
+
+    All the requests share one aiohttp session whose connector caps the open
+    connections to the Icinga API, so hundreds of coroutines can be gathered
+    without flooding the master. The client is an async context manager:
+
+        async with IcingaMiniAsyncClass(url, username, password) as client:
+            states = await client.gather([client.get_service_status(h, "ping") for h in hosts])
+
+    A session can be injected (e.g. bound to a local fake server), in that case
+    it is not closed by the client. With a sender the requests are not sent by
+    aiohttp at all: every request is handed to the sender, a blocking callable
+    like IcingaMiniClass._send_request, run in a pool of limit threads. This is
+    the fallback used when aiohttp is not installed.
+    """
+
+    def __init__(self, url: str, username: str, password: str, validate_certs: bool = True,
+                 limit: int = 20, session=None, stats_callback=None, codec=None, sender=None,
+                 throttle=None):
+        """
+        Args:
+            url (str): The Icinga URL, https://<server>:<port> (http:// is accepted for tests).
+            username (str): The Icinga username.
+            password (str): The Icinga user's password.
+            validate_certs (bool, optional): Whether to validate the SSL certificates. Default True.
+            limit (int, optional): Maximum number of open connections. Default 20.
+            session (aiohttp.ClientSession, optional): Session to use instead of creating one.
+            stats_callback (callable, optional): Called for every request with endpoint, sent, received,
+                latency and error keyword arguments, e.g. IcingaMiniClass._record_stats.
+            codec (IcingaJsonCodec, optional): The JSON codec, defaults to the fastest installed library.
+            sender (callable, optional): Called with url, method and data keyword arguments to send
+                every request, it must record its own stats.
+            throttle (callable, optional): Blocking callable run before every aiohttp request,
+                e.g. the rate limiter acquire of IcingaMiniClass._throttle.
+        """
+        if not HAS_AIOHTTP and session is None and sender is None:
+            raise IcingaConnectionException(message="The aiohttp library is required by the async client")
+
+        if url.endswith("/"):
+            url = url[:-1]
+        self.url = url
+        self.username = username
+        self.password = password
+        self.validate_certs = validate_certs
+        self.limit = limit
+        self.session = session
+        self.stats_callback = stats_callback
+        self.codec = codec or codec_from_environment()
+        self._own_session = session is None
+        self.sender = sender
+        self.throttle = throttle
+        self._executor = None
+
+    async def __aenter__(self):
+        if self.sender is not None:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=max(1, self.limit))
+            return self
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit, ssl=None if self.validate_certs else False),
+                auth=aiohttp.BasicAuth(self.username, self.password),
+                headers={"Accept": "application/json"}
+            )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if self._own_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def gather(self, coroutines):
+        """
+        Run the coroutines concurrently, the connector limit bounds the requests in flight.
+
+        Args:
+            coroutines (iterable): The coroutines to run.
+
+        Returns:
+            list: The results in the same order, failed calls are returned as their exception.
+        """
+        return await asyncio.gather(*coroutines, return_exceptions=True)
+
+    async def get_service_status(self, host: str, service: str):
+        """
+        Get the last state of a service.
+
+        Args:
+            host (str): The Icinga host name.
+            service (str): The service name.
+
+        Raises:
+            IcingaNoSuchObjectException: If the service does not exist.
+
+        Returns:
+            int: The service state.
+        """
+        _response = await self._send_request(
+            url="/v1/objects/services",
+            method="GET",
+            data={
+                "type": "Service",
+                "filter": "host.name==t_host && service.name==t_service",
+                "filter_vars": {"t_host": host, "t_service": service},
+                "attrs": ["last_state"]
+            }
+        )
+        if len(_response["results"]) == 0:
+            raise IcingaNoSuchObjectException(message=f"Unable to find the service {service} on host {host}")
+        return _response["results"][0]["attrs"]["last_state"]
+
+    async def get_service_list(self, host: str, service_pattern: str = "*"):
+        """
+        Get the services of a host matching a glob or "~" regexp pattern.
+
+        Args:
+            host (str): The Icinga host name.
+            service_pattern (str, optional): The pattern. Default "*".
+
+        Returns:
+            list: The matching service names.
+        """
+        _response = await self._send_request(
+            url="/v1/objects/services",
+            method="GET",
+            data={
+                "type": "Service",
+                "filter": "host.name==t_host",
+                "filter_vars": {"t_host": host},
+                "attrs": ["name"]
+            }
+        )
+        _services = {_service["attrs"]["name"]: _service["attrs"] for _service in _response["results"]}
+        return IcingaServiceSelector(_services).select(include=service_pattern)
+
+    async def get_hosts_by_group(self, hostgroup: str):
+        """
+        Get the hosts of a hostgroup.
+
+        Args:
+            hostgroup (str): The hostgroup name.
+
+        Returns:
+            list: The host names.
+        """
+        _response = await self._send_request(
+            url="/v1/objects/hosts",
+            method="GET",
+            data={
+                "type": "Host",
+                "filter": "t_hostgroup in host.groups",
+                "filter_vars": {"t_hostgroup": hostgroup},
+                "attrs": ["name"]
+            }
+        )
+        return [_host["attrs"]["name"] for _host in _response["results"]]
+
+    async def reschedule_check(self, host: str, service: str = None):
+        """
+        Force an immediate check of a host or of one of its services.
+
+        Args:
+            host (str): The Icinga host name.
+            service (str, optional): The service name, the host is rescheduled if omitted.
+
+        Returns:
+            list: The results of the action.
+        """
+        _data = {
+            "type": "Host",
+            "filter": "host.name==t_host",
+            "filter_vars": {"t_host": host},
+            "force": True
+        }
+        if service:
+            _data["type"] = "Service"
+            _data["filter"] = "host.name==t_host && service.name==t_service"
+            _data["filter_vars"]["t_service"] = service
+
+        _response = await self._send_request(url="/v1/actions/reschedule-check", method="POST", data=_data)
+        return _response["results"]
+
+    async def schedule_downtime(self, host: str, duration_seconds: int = 0,
+                                services: list = None,
+                                author: str = "Ansible",
+                                comment: str = "Downtime",
+                                child_hosts: str = "none"):
+        """
+        Schedule a downtime for a host and all its services, or for a list of its services.
+
+        Args:
+            host (str): The Icinga host name.
+            duration_seconds (int, optional): The downtime duration. Default 0.
+            services (list, optional): Service names, the host and all its services if omitted.
+            author (str, optional): The downtime author. Default "Ansible".
+            comment (str, optional): The downtime comment. Default "Downtime".
+            child_hosts (str, optional): "none", "triggered" or "non_triggered". Default "none".
+
+        Returns:
+            list: The results of the action.
+        """
+        _now = datetime.datetime.now()
+        _data = {
+            "type": "Host",
+            "filter": "host.name==t_host",
+            "filter_vars": {"t_host": host},
+            "all_services": "1",
+            "start_time": _now.timestamp(),
+            "end_time": (_now + datetime.timedelta(seconds=duration_seconds)).timestamp(),
+            "comment": comment,
+            "author": author,
+            "duration": duration_seconds,
+            "child_hosts": IcingaStatus.childHostsToInt(child_hosts)
+        }
+        if services:
+            _data["type"] = "Service"
+            _data["filter"] = "host.name==t_host && service.name in t_services"
+            _data["filter_vars"]["t_services"] = services
+            del _data["all_services"]
+            del _data["child_hosts"]
+
+        _response = await self._send_request(url="/v1/actions/schedule-downtime", method="POST", data=_data)
+        return _response["results"]
+
+    async def remove_downtime(self, host: str, author: str = None):
+        """
+        Remove the downtimes of a host and of its services.
+
+        Args:
+            host (str): The Icinga host name.
+            author (str, optional): Only remove the downtimes of this author.
+
+        Returns:
+            list: The results of the action.
+        """
+        _data = {
+            "type": "Downtime",
+            "filter": "host.name==t_host",
+            "filter_vars": {"t_host": host}
+        }
+        if author:
+            _data["filter"] = "host.name==t_host && downtime.author==t_author"
+            _data["filter_vars"]["t_author"] = author
+
+        try:
+            _response = await self._send_request(url="/v1/actions/remove-downtime", method="POST", data=_data)
+        except IcingaNoSuchObjectException:
+            # No downtime matched the filter
+            return []
+        return _response["results"]
+
+    async def _send_request(self, url: str, method: str, data: dict = None):
+        if self.sender is not None:
+            if self._executor is None:
+                await self.__aenter__()
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(self.sender, url=url, method=method, data=data or {}))
+
+        if self.session is None:
+            await self.__aenter__()
+
+        if self.throttle is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.throttle)
+
+        _body = self.codec.dumps(data or {})
+        _headers = {"X-HTTP-Method-Override": method, "Accept": "application/json"}
+        if not self._own_session:
+            # Injected sessions do not carry the credentials
+            _credentials = base64.b64encode(f"{self.username}:{self.password}".encode("utf-8")).decode("ascii")
+            _headers["Authorization"] = f"Basic {_credentials}"
+
+        _start = time.time()
+        try:
+            async with self.session.post(f"{self.url}{url}", data=_body, headers=_headers) as _response:
+                _content = await _response.read()
+                _status = _response.status
+        except (OSError, asyncio.TimeoutError) as e:
+            self._record(sent=len(_body), latency=time.time() - _start, error=True)
+            raise IcingaConnectionException(f"Could not connect to Icinga server: {e}")
+        except Exception as e:
+            if HAS_AIOHTTP and isinstance(e, aiohttp.ClientError):
+                self._record(sent=len(_body), latency=time.time() - _start, error=True)
+                raise IcingaConnectionException(f"Could not connect to Icinga server: {e}")
+            raise
+
+        self._record(sent=len(_body), received=len(_content), latency=time.time() - _start,
+                     error=_status >= 500)
+
+        if _status in [401, 403]:
+            raise IcingaAuthenticationException
+        if _status in [404]:
+            raise IcingaNoSuchObjectException(self.codec.loads(_content)["status"])
+        if _status in [500]:
+            raise IcingaRequestFailedException()
+        if _status in [502, 503, 504]:
+            raise IcingaConnectionException(f"Could not connect to Icinga server: HTTP {_status}")
+
+        return self.codec.loads(_content)
+
+    def _record(self, sent: int = 0, received: int = 0, latency: float = 0.0, error: bool = False):
+        if self.stats_callback is not None:
+            self.stats_callback(endpoint=self.url, sent=sent, received=received, latency=latency, error=error)
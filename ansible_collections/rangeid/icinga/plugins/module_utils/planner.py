@@ -0,0 +1,377 @@
+import copy
+import math
+import re
+import threading
+
+# Rough size of the per-object entry of an action reply, used by the estimates
+RESULT_BYTES = 160
+
+
+def merge_key(codec, url: str, data: dict):
+    """
+    Return what makes two actions compatible, and the name of their target list.
+
+    Timestamps change from call to call and are left out, the longest list of
+    filter_vars is taken as the target list and left out too: two actions with
+    the same key differ only in their targets and can be sent as one call over
+    the union of the targets.
+
+    Returns:
+        tuple: The merge key and the target list name, None if there is no list.
+    """
+    _data = {_key: _value for _key, _value in data.items() if _key not in ["start_time", "end_time"]}
+    _vars = dict(_data.get("filter_vars", {}))
+    _lists = [_name for _name, _value in _vars.items() if isinstance(_value, list)]
+    _list = max(_lists, key=lambda _name: len(_vars[_name])) if _lists else None
+    if _list is not None:
+        _vars[_list] = None
+    _data["filter_vars"] = _vars
+    return (url, codec.dumps(_data)), _list
+
+
+class IcingaPlanner():
+    """Turn the operations of a client into an API call plan, without any write.
+
+    Once installed on an IcingaMiniClass (see start_plan) every request goes
+    through the planner: reads are sent, once, and identical reads are answered
+    from memory; actions are not sent, their targets are taken from the names
+    they carry or resolved with a projected read of the same filter and a reply with one successful entry per
+    target is returned, so the operations run to the end as they would for real.
+
+    The recorded actions are then merged as IcingaCoalescer does on a real run:
+    identical requests are sent once and the chunks of the same request, or
+    requests differing only in their target list, become one call over the
+    union of the targets. Only requests merged into another one are counted as
+    merged, not the chunks of a request.
+    """
+
+    OBJECT_URLS = {
+        "Host": "/v1/objects/hosts",
+        "Service": "/v1/objects/services",
+        "Downtime": "/v1/objects/downtimes"
+    }
+
+    def __init__(self, client):
+        self.client = client
+        self.writes = []
+        self.waits = []
+        self.reads = 0
+        self.memo_hits = 0
+        self._requests = 0
+        self._memo = {}
+        self._lock = threading.Lock()
+
+    def send(self, url: str, method: str, data: dict, partial_results: bool = False, chunk_of: int = None):
+        """
+        Answer a request of the client, in place of IcingaMiniClass._perform_request.
+
+        Args:
+            chunk_of (int, optional): Identifier shared by the chunks of the same request.
+
+        Raises:
+            IcingaNoSuchObjectException: If an action would not match any object, as the API does.
+        """
+        if method == "GET":
+            return self._read(url=url, data=data, partial_results=partial_results)
+
+        # Imported here, minicinga2 imports this module
+        from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaNoSuchObjectException
+
+        _targets = self._targets(data)
+        _services = {}
+        if url == "/v1/actions/schedule-downtime" and data.get("type") == "Host" and data.get("all_services") == "1":
+            for _name in self._targets(dict(data, type="Service")):
+                _services.setdefault(_name.split("!")[0], []).append(_name)
+
+        with self._lock:
+            self._requests = self._requests + 1
+            self.writes.append({"url": url, "data": data, "targets": _targets,
+                                "request": ("chunk", chunk_of) if chunk_of is not None else self._requests,
+                                "services": [_name for _names in _services.values() for _name in _names]})
+
+        # Named actions are answered by Icinga even for unknown names, only filters can match nothing
+        if len(_targets) == 0 and self._named(data) is None:
+            raise IcingaNoSuchObjectException("No objects found.")
+
+        _action = url.rsplit("/", 1)[-1]
+        _results = []
+        for _name in _targets:
+            _result = {"code": 200, "name": _name, "status": f"Planned {_action} for object '{_name}'."}
+            if _action == "schedule-downtime":
+                _result["name"] = f"{_name}!planned"
+                _result["service_downtimes"] = [f"{_service}!planned" for _service in _services.get(_name, [])]
+            _results.append(_result)
+        return {"results": _results}
+
+    def wait(self, kind: str, targets: int, timeout: int, interval: float = 1):
+        """
+        Record a polling loop that is skipped while planning.
+
+        Args:
+            kind (str): What is waited for, e.g. "fresh_ok" or "downtime_active".
+            targets (int): Number of polled objects.
+            timeout (int): The timeout of the loop.
+            interval (float, optional): The nominal polling interval. Default 1.
+        """
+        with self._lock:
+            self.waits.append({
+                "wait": kind,
+                "targets": targets,
+                "timeout": timeout,
+                "max_requests": 1 + int(timeout / interval) if timeout else 0
+            })
+
+    def _read(self, url: str, data: dict, partial_results: bool = False):
+        _key = (url, self.client.codec.dumps(data))
+        with self._lock:
+            _response = self._memo.get(_key)
+            if _response is not None:
+                self.memo_hits = self.memo_hits + 1
+                return copy.deepcopy(_response)
+
+        _response = self.client._perform_request(url=url, method="GET", data=data, partial_results=partial_results)
+        with self._lock:
+            self.reads = self.reads + 1
+            self._memo[_key] = copy.deepcopy(_response)
+        return _response
+
+    def _named(self, data: dict):
+        # Objects addressed by name, e.g. {"type": "Downtime", "downtime": "<name>"} or {"hosts": [...]}
+        _type = (data.get("type") or "").lower()
+        _single = data.get(_type)
+        _names = data.get(f"{_type}s")
+        if _single:
+            return [_single]
+        if _names:
+            return list(_names)
+        return None
+
+    def _targets(self, data: dict):
+        # Full names of the objects an action would be applied to
+        from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaNoSuchObjectException
+
+        _named = self._named(data)
+        if _named is not None:
+            return _named
+
+        _url = self.OBJECT_URLS.get(data.get("type"))
+        if _url is None or not data.get("filter"):
+            return []
+        try:
+            _response = self._read(url=_url, data={
+                "type": data["type"],
+                "filter": data["filter"],
+                "filter_vars": data.get("filter_vars", {}),
+                "attrs": ["__name"]
+            })
+        except IcingaNoSuchObjectException:
+            return []
+        return [_object["name"] for _object in _response["results"]]
+
+    def plan(self):
+        """
+        Return the merged plan with its estimated cost.
+
+        Returns:
+            dict: The "writes" calls (url, type, filter, targets, objects, requests, merged, bytes_sent,
+                bytes_received), the skipped "waits", the "reads" already sent and the "totals".
+        """
+        _calls = {}
+        for _write in self.writes:
+            _key, _list = merge_key(self.client.codec, _write["url"], _write["data"])
+            _call = _calls.get(_key)
+            if _call is None:
+                _call = _calls[_key] = {
+                    "data": copy.deepcopy(_write["data"]),
+                    "list": _list,
+                    "objects": set(),
+                    "values": set(),
+                    "services": set(),
+                    "requests": set()
+                }
+                if _list is not None:
+                    _call["data"]["filter_vars"][_list] = []
+            _call["requests"].add(_write["request"])
+            _call["objects"].update(_write["targets"])
+            _call["services"].update(_write["services"])
+            if _list is not None:
+                for _value in _write["data"]["filter_vars"][_list]:
+                    if _value not in _call["values"]:
+                        _call["values"].add(_value)
+                        _call["data"]["filter_vars"][_list].append(_value)
+
+        _writes = []
+        for (_url, _body), _call in _calls.items():
+            _requests = 1
+            if _call["list"] is not None:
+                _requests = max(1, math.ceil(len(_call["data"]["filter_vars"][_call["list"]]) / self.client.chunk_size))
+            _targets = len(_call["objects"]) + len(_call["services"])
+            _writes.append({
+                "url": _url,
+                "type": _call["data"].get("type"),
+                "filter": _call["data"].get("filter"),
+                "targets": _targets,
+                "objects": sorted(_call["objects"]),
+                "requests": _requests,
+                "merged": len(_call["requests"]) - 1,
+                "bytes_sent": len(self.client.codec.dumps(_call["data"])),
+                "bytes_received": _targets * RESULT_BYTES
+            })
+
+        _stats = self.client.get_stats()
+        _reads = {
+            "requests": self.reads,
+            "memo_hits": self.memo_hits,
+            "bytes_sent": _stats["bytes_sent"],
+            "bytes_received": _stats["bytes_received"]
+        }
+        return {
+            "writes": _writes,
+            "waits": list(self.waits),
+            "reads": _reads,
+            "totals": {
+                "requests": _reads["requests"] + sum([_write["requests"] for _write in _writes]) +
+                sum([_wait["max_requests"] for _wait in self.waits]),
+                "write_requests": sum([_write["requests"] for _write in _writes]),
+                "targets": sum([_write["targets"] for _write in _writes]),
+                "merged": sum([_write["merged"] for _write in _writes]),
+                "bytes_sent": _reads["bytes_sent"] + sum([_write["bytes_sent"] for _write in _writes]),
+                "bytes_received": _reads["bytes_received"] + sum([_write["bytes_received"] for _write in _writes])
+            }
+        }
+
+
+class IcingaCoalescer():
+    """Merge the compatible requests of concurrent callers on a real run.
+
+    Nothing is delayed: a request is sent at once unless an identical read, or
+    a compatible action, is already in flight. An identical read then shares
+    the reply of the one in flight. Actions on a list of hosts (t_hosts) that
+    differ only in the hosts, see merge_key, queue up while the first one is in
+    flight and are sent as a single call over the union of the hosts as soon as
+    it completes; every caller gets back the entries of its own hosts only.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.Lock()
+        self._reads = {}
+        self._inflight = set()
+        self._queued = {}
+
+    def send(self, url: str, method: str, data: dict, partial_results: bool = False):
+        """
+        Send a request of the client through _perform_request, merged when possible.
+        """
+        if method == "GET":
+            return self._read(url=url, data=data, partial_results=partial_results)
+
+        _key, _list = merge_key(self.client.codec, url, data)
+        if _list != "t_hosts":
+            return self.client._perform_request(url=url, method=method, data=data, partial_results=partial_results)
+        _key = (_key, partial_results)
+        _hosts = data["filter_vars"]["t_hosts"]
+
+        with self._lock:
+            _batch = None
+            if _key not in self._inflight:
+                self._inflight.add(_key)
+            else:
+                _batch = self._queued.get(_key)
+                if _batch is None:
+                    _batch = self._queued[_key] = {
+                        "data": copy.deepcopy(data),
+                        "hosts": [],
+                        "members": 0,
+                        "ready": threading.Event(),
+                        "done": threading.Event()
+                    }
+                    _batch["data"]["filter_vars"]["t_hosts"] = _batch["hosts"]
+                elif len(_batch["hosts"]) + len(_hosts) > self.client.chunk_size:
+                    _batch = False
+                if _batch:
+                    _index = _batch["members"]
+                    _batch["members"] = _batch["members"] + 1
+                    _batch["hosts"].extend([_host for _host in _hosts if _host not in _batch["hosts"]])
+                    if _index > 0:
+                        self.client._record_merge()
+
+        if _batch is False:
+            # The queued call is full, not worth waiting for
+            return self.client._perform_request(url=url, method=method, data=data, partial_results=partial_results)
+
+        if _batch is None:
+            try:
+                return self.client._perform_request(url=url, method=method, data=data,
+                                                    partial_results=partial_results)
+            finally:
+                self._release(_key)
+
+        _batch["ready"].wait()
+        if _index == 0:
+            try:
+                _batch["response"] = self.client._perform_request(url=url, method=method, data=_batch["data"],
+                                                                  partial_results=partial_results)
+            except Exception as e:
+                _batch["error"] = e
+            finally:
+                _batch["done"].set()
+                self._release(_key)
+        _batch["done"].wait()
+        if "error" in _batch:
+            raise _batch["error"]
+        return self._split(_batch["response"], _hosts)
+
+    def _release(self, key):
+        # The next queued call, if any, is sent by its first caller and keeps the key in flight
+        with self._lock:
+            _batch = self._queued.pop(key, None)
+            if _batch is None:
+                self._inflight.discard(key)
+            else:
+                _batch["ready"].set()
+
+    def _read(self, url: str, data: dict, partial_results: bool = False):
+        _key = (url, self.client.codec.dumps(data), partial_results)
+        with self._lock:
+            _flight = self._reads.get(_key)
+            _leader = _flight is None
+            if _leader:
+                _flight = self._reads[_key] = {"done": threading.Event()}
+            else:
+                self.client._record_merge()
+
+        if _leader:
+            try:
+                _flight["response"] = self.client._perform_request(url=url, method="GET", data=data,
+                                                                   partial_results=partial_results)
+            except Exception as e:
+                _flight["error"] = e
+            finally:
+                with self._lock:
+                    del self._reads[_key]
+                _flight["done"].set()
+            if "error" in _flight:
+                raise _flight["error"]
+            return _flight["response"]
+
+        _flight["done"].wait()
+        if "error" in _flight:
+            raise _flight["error"]
+        return copy.deepcopy(_flight["response"])
+
+    def _split(self, response: dict, hosts: list):
+        # Imported here, minicinga2 imports this module
+        from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaNoSuchObjectException
+
+        _hosts = set(hosts)
+        _results = []
+        for _result in response.get("results", []):
+            # The object is the last quoted name of the status, e.g. "... for object 'host!service'."
+            _names = re.findall(r"'([^']+)'", _result.get("status", ""))
+            _object = _names[-1] if _names else _result.get("name", "")
+            if _object.split("!")[0] in _hosts:
+                _results.append(_result)
+        if len(_results) == 0:
+            raise IcingaNoSuchObjectException("No objects found.")
+        return dict(response, results=_results)
@@ -0,0 +1,216 @@
+import contextlib
+import cProfile
+import functools
+import inspect
+import io
+import json
+import os
+import pstats
+import threading
+import time
+
+# The profiler of the running module, None unless profiling has been requested
+_ACTIVE = None
+# Time main() of a decorated module was entered, None outside profiled modules
+_MAIN_START = None
+
+
+class IcingaProfiler():
+    """Wall-clock phase breakdown, per-method timings and cProfile of a module run.
+
+    Nothing is measured unless profiling is enabled, by the ICINGA_PROFILE
+    environment variable or by the profile module option. The phases are
+    startup (from the process start to main()), request_build (body encoding),
+    network_wait (waiting for the Icinga API), decode (response parsing) and
+    post_processing (the rest of main()). The public IcingaMiniClass methods
+    are timed by name (see profile_methods), a method calling another one is
+    counted in both. Times of concurrent requests and calls are summed, so with
+    chunked or fan-out requests they can exceed the wall-clock time.
+    """
+
+    PHASES = ["startup", "request_build", "network_wait", "decode", "post_processing"]
+
+    def __init__(self, start: float = None):
+        self.start = start or time.time()
+        self.phases = dict.fromkeys(self.PHASES, 0.0)
+        self.phases["startup"] = max(0.0, self.start - (_process_start() or self.start))
+        self.methods = {}
+        self.output = None
+        self._profile = None
+        self._lock = threading.Lock()
+
+    def enable(self, output: str):
+        """
+        Start cProfile.
+
+        Args:
+            output (str): Path of the report file, or "result" to return the report in the module result.
+        """
+        self.output = output
+        if self._profile is None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] = self.phases[phase] + seconds
+
+    def add_method(self, name: str, seconds: float):
+        with self._lock:
+            _method = self.methods.setdefault(name, {"calls": 0, "seconds": 0.0})
+            _method["calls"] = _method["calls"] + 1
+            _method["seconds"] = _method["seconds"] + seconds
+
+    def report(self, top: int = 20):
+        """
+        Return the phase breakdown and the most expensive functions.
+
+        Args:
+            top (int, optional): Number of functions reported, by cumulative time. Default 20.
+
+        Returns:
+            dict: The "total" seconds, the "phases" seconds, the "methods" calls and seconds
+                and the "functions" list.
+        """
+        _elapsed = time.time() - self.start
+        _phases = dict(self.phases)
+        _phases["post_processing"] = max(0.0, _elapsed - sum(
+            [_phases[_phase] for _phase in ["request_build", "network_wait", "decode"]]))
+
+        _ret = {
+            "total": round(_phases["startup"] + _elapsed, 4),
+            "phases": {_phase: round(_seconds, 4) for _phase, _seconds in _phases.items()},
+            "methods": {_name: {"calls": _method["calls"], "seconds": round(_method["seconds"], 4)}
+                        for _name, _method in sorted(self.methods.items(),
+                                                     key=lambda _item: _item[1]["seconds"], reverse=True)},
+            "functions": []
+        }
+        if self._profile is not None:
+            self._profile.disable()
+            _stats = pstats.Stats(self._profile, stream=io.StringIO())
+            _rows = sorted(_stats.stats.items(), key=lambda _item: _item[1][3], reverse=True)
+            for (_file, _line, _name), (_calls, _primitive, _own, _cumulative, _callers) in _rows[:top]:
+                _ret["functions"].append({
+                    "function": f"{_file}:{_line}({_name})",
+                    "calls": _calls,
+                    "own": round(_own, 4),
+                    "cumulative": round(_cumulative, 4)
+                })
+        return _ret
+
+    def write(self, path: str):
+        """
+        Write the JSON report to path and the raw cProfile stats, readable by pstats, to path.prof.
+
+        Args:
+            path (str): Path of the report file.
+        """
+        _report = self.report()
+        with open(path, "w") as _fd:
+            json.dump(_report, _fd, indent=2)
+        if self._profile is not None:
+            self._profile.dump_stats(f"{path}.prof")
+
+
+def _process_start():
+    # Linux only: start time of this process in clock ticks after boot
+    try:
+        with open("/proc/self/stat", "r") as _fd:
+            _ticks = int(_fd.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/stat", "r") as _fd:
+            _boot = [int(_line.split()[1]) for _line in _fd if _line.startswith("btime")][0]
+        return _boot + _ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+@contextlib.contextmanager
+def phase(name: str):
+    """
+    Measure a phase of the running module, does nothing outside profiled modules.
+
+    Args:
+        name (str): The phase name, one of IcingaProfiler.PHASES.
+    """
+    if _ACTIVE is None:
+        yield
+        return
+    _start = time.time()
+    try:
+        yield
+    finally:
+        _ACTIVE.add(name, time.time() - _start)
+
+
+def profile_methods(cls):
+    """
+    Decorate a class to time its public methods, by name, in the profile of the running module.
+
+    Outside profiled runs the wrappers only check that no profiler is active.
+    """
+    def _wrap(name, method):
+        @functools.wraps(method)
+        def _wrapper(*args, **kwargs):
+            if _ACTIVE is None:
+                return method(*args, **kwargs)
+            _start = time.time()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                _ACTIVE.add_method(name, time.time() - _start)
+        return _wrapper
+
+    for _name, _method in list(vars(cls).items()):
+        if not _name.startswith("_") and inspect.isfunction(_method):
+            setattr(cls, _name, _wrap(_name, _method))
+    return cls
+
+
+def enable_profiling(output: str):
+    """
+    Enable profiling for the running module, used by the profile module option.
+
+    Args:
+        output (str): Path of the report file, or "result" to return the report in the module result.
+    """
+    global _ACTIVE
+    if _MAIN_START is None or not output:
+        return
+    if _ACTIVE is None:
+        _ACTIVE = IcingaProfiler(start=_MAIN_START)
+    _ACTIVE.enable(output)
+
+
+def attach_profile(result: dict):
+    """
+    Add the report to the module result when it has been requested with output "result".
+
+    Args:
+        result (dict): The module result.
+    """
+    if _ACTIVE is not None and _ACTIVE.output == "result":
+        result["profile"] = _ACTIVE.report()
+
+
+def profiled(main):
+    """
+    Decorate the main() of a module so that it can be profiled.
+
+    When ICINGA_PROFILE is set, profiling is enabled from the start and the report
+    is written to the file it names (or returned in the result if it is "result").
+    Otherwise nothing is measured unless the module enables it with enable_profiling.
+    """
+    @functools.wraps(main)
+    def _wrapper(*args, **kwargs):
+        global _ACTIVE, _MAIN_START
+        _MAIN_START = time.time()
+        enable_profiling(os.environ.get("ICINGA_PROFILE"))
+        try:
+            return main(*args, **kwargs)
+        finally:
+            # exit_json and fail_json leave main() with SystemExit
+            if _ACTIVE is not None and _ACTIVE.output != "result":
+                _ACTIVE.write(_ACTIVE.output)
+            _ACTIVE = None
+            _MAIN_START = None
+    return _wrapper
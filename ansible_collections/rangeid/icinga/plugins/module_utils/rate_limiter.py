@@ -0,0 +1,83 @@
+import fcntl
+import hashlib
+import json
+import time
+from ansible_collections.rangeid.icinga.plugins.module_utils.state_files import private_path, open_private
+
+
+class IcingaRateLimiter():
+    """Token bucket shared by every process running on the same machine.
+
+    The bucket state (available tokens and last refill time) is kept in a
+    small JSON file protected by an exclusive flock, so all the Ansible
+    workers forked on the controller draw from the same budget. The file is
+    private to the user (see state_files), one owned by another user is refused.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, state_file: str = None, key: str = ""):
+        """
+        Args:
+            rate (float): Sustained number of requests per second.
+            burst (int, optional): Bucket size, the number of requests that can be sent back to back. Default 1.
+            state_file (str, optional): Path of the shared state file. Defaults to a file in the private
+                temp directory of the user derived from key.
+            key (str, optional): Value used to derive the default state file name, usually the Icinga URL.
+        """
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+
+        if state_file is None:
+            _digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+            state_file = private_path(f"ratelimit-{_digest}.json")
+        self.state_file = state_file
+
+    def _take(self):
+        """
+        Take one token from the shared bucket.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds to wait before the next token is available.
+        """
+        with open_private(self.state_file, "r+") as _fd:
+            fcntl.flock(_fd, fcntl.LOCK_EX)
+            try:
+                _fd.seek(0)
+                try:
+                    _state = json.loads(_fd.read())
+                except ValueError:
+                    _state = {}
+
+                _now = time.time()
+                _tokens = float(_state.get("tokens", self.burst))
+                _last = float(_state.get("timestamp", _now))
+                _tokens = min(self.burst, _tokens + max(0.0, _now - _last) * self.rate)
+
+                if _tokens >= 1:
+                    _tokens = _tokens - 1
+                    _wait = 0.0
+                else:
+                    _wait = (1 - _tokens) / self.rate
+
+                _fd.seek(0)
+                _fd.truncate()
+                _fd.write(json.dumps({"tokens": _tokens, "timestamp": _now}))
+                _fd.flush()
+            finally:
+                fcntl.flock(_fd, fcntl.LOCK_UN)
+
+        return _wait
+
+    def acquire(self):
+        """
+        Block until a token is available.
+
+        Returns:
+            float: The number of seconds spent waiting for a token.
+        """
+        _throttled = 0.0
+        while True:
+            _wait = self._take()
+            if _wait == 0:
+                return _throttled
+            time.sleep(_wait)
+            _throttled = _throttled + _wait
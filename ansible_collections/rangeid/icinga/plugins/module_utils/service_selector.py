@@ -0,0 +1,134 @@
+import difflib
+import fnmatch
+import re
+
+
+class IcingaServiceSelector():
+    """Local index of the services of a host.
+
+    The index is built from a single projected fetch, then every selection,
+    validation and suggestion is computed locally with set and dict lookups
+    instead of sending match() filters to the server.
+
+    Selection entries can be exact names, glob patterns (*, ?, [...]) or
+    regular expressions prefixed with "~", as in the Ansible host patterns.
+    """
+
+    def __init__(self, services: dict):
+        """
+        Args:
+            services (dict): Dictionary of service name to its attributes.
+        """
+        self.services = services
+
+    @staticmethod
+    def is_pattern(name: str):
+        """
+        Tell if a selection entry is a glob or a regular expression instead of a name.
+
+        Args:
+            name (str): The selection entry.
+
+        Returns:
+            bool: True if the entry is a pattern.
+        """
+        return name.startswith("~") or any(_char in name for _char in "*?[")
+
+    @staticmethod
+    def _compile(pattern: str):
+        if pattern.startswith("~"):
+            return re.compile(pattern[1:])
+        return re.compile(fnmatch.translate(pattern))
+
+    def _match(self, entries: list):
+        _ret = set()
+        _patterns = []
+        for _entry in entries:
+            if _entry in ["all", "*"]:
+                return set(self.services)
+            if self.is_pattern(_entry):
+                _patterns.append(self._compile(_entry))
+            elif _entry in self.services:
+                _ret.add(_entry)
+
+        if len(_patterns) > 0:
+            for _name in self.services:
+                if any(_pattern.match(_name) for _pattern in _patterns):
+                    _ret.add(_name)
+        return _ret
+
+    def names(self):
+        return list(self.services)
+
+    def select(self, include=None, exclude=None):
+        """
+        Select the services matching the include entries and none of the exclude entries.
+
+        Args:
+            include (str|list, optional): Name, pattern or list of them. Defaults to all the services.
+            exclude (str|list, optional): Name, pattern or list of them to remove from the selection.
+
+        Returns:
+            list: The selected service names, in index order.
+        """
+        if include is None:
+            include = ["*"]
+        if isinstance(include, str):
+            include = [include]
+        if isinstance(exclude, str):
+            exclude = [exclude]
+
+        _selected = self._match(include)
+        if exclude:
+            _selected = _selected - self._match(exclude)
+
+        return [_name for _name in self.services if _name in _selected]
+
+    def missing(self, names: list):
+        """
+        Return the exact names (patterns are ignored) that are not in the index.
+
+        Args:
+            names (list): Service names to validate.
+
+        Returns:
+            list: The unknown service names, in the given order.
+        """
+        return [_name for _name in names
+                if not self.is_pattern(_name) and _name not in ["all", "*"] and _name not in self.services]
+
+    def suggest(self, name: str, count: int = 3):
+        """
+        Return the closest known service names, for "did you mean" messages.
+
+        Args:
+            name (str): The unknown service name.
+            count (int, optional): Maximum number of suggestions. Default 3.
+
+        Returns:
+            list: The closest service names, best match first.
+        """
+        _ret = difflib.get_close_matches(name, self.services.keys(), n=count, cutoff=0.6)
+        if len(_ret) == 0:
+            # Case mistakes are the most common ones
+            _ret = [_known for _known in self.services if _known.lower() == name.lower()][:count]
+        return _ret
+
+    def describe_missing(self, names: list):
+        """
+        Build a message listing the unknown names with their suggestions.
+
+        Args:
+            names (list): The unknown service names.
+
+        Returns:
+            str: A message like "LAOD (did you mean LOAD?), FOO".
+        """
+        _ret = []
+        for _name in names:
+            _suggestions = self.suggest(_name)
+            if len(_suggestions) > 0:
+                _ret.append(f"{_name} (did you mean {' or '.join(_suggestions)}?)")
+            else:
+                _ret.append(_name)
+        return ", ".join(_ret)
@@ -0,0 +1,125 @@
+import json
+import time
+from ansible_collections.rangeid.icinga.plugins.module_utils.state_table import IcingaStateTable, SERVICE_SEVERITY
+
+SNAPSHOT_VERSION = 1
+
+
+class IcingaSnapshot():
+    """Compact on-disk snapshot of host and service states.
+
+    A snapshot is a JSON lines file: a header line followed by one
+    [key, kind, state, in_downtime] array per object, where key is the host
+    name or host!service and kind is "h" or "s". Records are written and read
+    one line at a time, so a snapshot is never fully held in memory.
+    """
+
+    SERVICE_SEVERITY = SERVICE_SEVERITY
+
+    @staticmethod
+    def severity(kind: str, state: int):
+        """
+        Return the severity of a state, higher is worse.
+
+        Args:
+            kind (str): "h" for hosts, "s" for services.
+            state (int): The Icinga state.
+
+        Returns:
+            int: The severity of the state.
+        """
+        if kind == "s":
+            return IcingaSnapshot.SERVICE_SEVERITY.get(int(state), 3)
+        return int(state)
+
+    @staticmethod
+    def write(path: str, records, scope: dict = None):
+        """
+        Write a snapshot file.
+
+        Args:
+            path (str): Path of the snapshot file.
+            records (iterable): Iterable of [key, kind, state, in_downtime] records.
+            scope (dict, optional): Description of the snapshot scope, stored in the header.
+
+        Returns:
+            dict: The number of "hosts" and "services" written.
+        """
+        _ret = {"hosts": 0, "services": 0}
+        with open(path, "w") as _fd:
+            _fd.write(json.dumps({"version": SNAPSHOT_VERSION, "created": time.time(), "scope": scope or {}}) + "\n")
+            for _record in records:
+                _fd.write(json.dumps(list(_record), separators=(",", ":")) + "\n")
+                _ret["hosts" if _record[1] == "h" else "services"] += 1
+        return _ret
+
+    @staticmethod
+    def iter_records(path: str):
+        """
+        Read the records of a snapshot file one at a time.
+
+        Args:
+            path (str): Path of the snapshot file.
+
+        Raises:
+            ValueError: If the file is not a snapshot or has an unsupported version.
+
+        Yields:
+            list: [key, kind, state, in_downtime] records.
+        """
+        with open(path, "r") as _fd:
+            _header = json.loads(_fd.readline() or "{}")
+            if _header.get("version") != SNAPSHOT_VERSION:
+                raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} snapshot")
+            for _line in _fd:
+                if _line.strip():
+                    yield json.loads(_line)
+
+    @staticmethod
+    def diff(baseline_path: str, records):
+        """
+        Compare a baseline snapshot with the current records in a single pass.
+
+        The baseline is loaded in a compact IcingaStateTable, then the current
+        records are streamed against it, so the cost is O(n) and only the baseline
+        table is kept in memory.
+
+        Args:
+            baseline_path (str): Path of the baseline snapshot file.
+            records (iterable): Iterable of current [key, kind, state, in_downtime] records.
+
+        Returns:
+            dict: Dictionary with "regressions", "recoveries", "new" and "removed" lists and
+                the number of "unchanged" objects.
+        """
+        _baseline = IcingaStateTable.from_records(IcingaSnapshot.iter_records(baseline_path))
+        _seen = bytearray(len(_baseline))
+
+        _ret = dict(
+            regressions=[],
+            recoveries=[],
+            new=[],
+            removed=[],
+            unchanged=0
+        )
+        for _key, _kind, _state, _downtime in records:
+            _row = _baseline.find(_key)
+            if _row is None:
+                _ret["new"].append({"object": _key, "state": _state})
+                continue
+            _seen[_row] = 1
+
+            _before = _baseline.states[_row]
+            _old = IcingaSnapshot.severity(_kind, _before)
+            _new = IcingaSnapshot.severity(_kind, _state)
+            if _new > _old:
+                _ret["regressions"].append({"object": _key, "before": _before, "after": _state})
+            elif _new < _old:
+                _ret["recoveries"].append({"object": _key, "before": _before, "after": _state})
+            else:
+                _ret["unchanged"] += 1
+
+        # Whatever has not been seen in the current records is gone
+        _ret["removed"] = [{"object": _baseline.key(_row), "state": _baseline.states[_row]}
+                           for _row in range(len(_baseline)) if not _seen[_row]]
+        return _ret
@@ -0,0 +1,55 @@
+import os
+import stat
+import tempfile
+
+
+def private_path(name: str):
+    """
+    Return the path of a state file in the private directory of the current user.
+
+    The directory is created in the temporary directory with mode 0700 and its
+    name includes the uid, so another local user can neither pre-create nor read
+    the files in it.
+
+    Args:
+        name (str): The file name.
+
+    Raises:
+        PermissionError: If the directory exists but is not a private directory of the current user.
+
+    Returns:
+        str: The path of the file, the file itself is not created.
+    """
+    _dir = os.path.join(tempfile.gettempdir(), f"ansible-icinga-{os.getuid()}")
+    try:
+        os.mkdir(_dir, 0o700)
+    except FileExistsError:
+        pass
+    _stat = os.lstat(_dir)
+    if not stat.S_ISDIR(_stat.st_mode) or _stat.st_uid != os.getuid() or _stat.st_mode & 0o077:
+        raise PermissionError(f"{_dir} is not a private directory of the current user")
+    return os.path.join(_dir, name)
+
+
+def open_private(path: str, mode: str = "r"):
+    """
+    Open a state file, created with mode 0600, refusing the files owned by another user.
+
+    Args:
+        path (str): The file path.
+        mode (str, optional): "r" to read an existing file, "r+" to read and write it,
+            creating it if missing. Default "r".
+
+    Raises:
+        PermissionError: If the file is owned by another user.
+        OSError: If the file cannot be opened.
+
+    Returns:
+        file: The open file object.
+    """
+    _flags = os.O_RDONLY if mode == "r" else os.O_RDWR | os.O_CREAT
+    _fd = os.open(path, _flags | getattr(os, "O_NOFOLLOW", 0), 0o600)
+    if os.fstat(_fd).st_uid != os.getuid():
+        os.close(_fd)
+        raise PermissionError(f"{path} is owned by another user")
+    return os.fdopen(_fd, mode)
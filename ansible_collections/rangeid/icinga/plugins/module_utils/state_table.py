@@ -0,0 +1,227 @@
+from array import array
+
+# Service states ordered by severity: OK, WARNING, UNKNOWN, CRITICAL
+SERVICE_SEVERITY = {0: 0, 1: 1, 3: 2, 2: 3}
+SEVERITY_SERVICE = {_severity: _state for _state, _severity in SERVICE_SEVERITY.items()}
+
+
+class IcingaStateTable():
+    """Columnar table of host and service states.
+
+    Every object is one row spread over typed arrays (host index, service
+    index, state, downtime flag, acknowledgement flag, last check time) instead
+    of one dict per object. Host and service names are stored once in name
+    tables and referenced by index, so 100k services of the same few hundred
+    hosts cost a few MB.
+
+    Host rows have service index -1. Keys are the usual host and host!service
+    names, as in the snapshot files. Rows are found by an int combining the
+    host and service indexes, see _row_key.
+    """
+
+    # Bits of the row key holding the service index, enough for 1M service names
+    SERVICE_BITS = 20
+
+    def __init__(self):
+        self.host_names = []
+        self.service_names = []
+        self._host_index = {}
+        self._service_index = {}
+        self._rows = {}
+        self.hosts = array("i")
+        self.services = array("i")
+        self.states = array("b")
+        self.downtimes = array("b")
+        self.acknowledgements = array("b")
+        self.last_checks = array("d")
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build a table from [key, kind, state, in_downtime] records, e.g. a snapshot.
+
+        Args:
+            records (iterable): The records.
+
+        Returns:
+            IcingaStateTable: The table.
+        """
+        _table = cls()
+        for _record in records:
+            _host, _, _service = _record[0].partition("!")
+            _table.append(host=_host, service=_service or None, state=_record[2], in_downtime=_record[3])
+        return _table
+
+    def __len__(self):
+        return len(self.states)
+
+    def _row_key(self, host: int, service: int):
+        # Host rows (service -1) take service slot 0
+        return (host << self.SERVICE_BITS) | (service + 1)
+
+    def _intern(self, name: str, names: list, index: dict):
+        _position = index.get(name)
+        if _position is None:
+            _position = len(names)
+            index[name] = _position
+            names.append(name)
+        return _position
+
+    def append(self, host: str, service: str = None, state: int = 0, in_downtime: bool = False,
+               last_check: float = 0.0, acknowledged: bool = False):
+        """
+        Add a row, or update it if the object is already in the table.
+
+        Args:
+            host (str): The host name.
+            service (str, optional): The service name, the row is a host row if omitted.
+            state (int, optional): The Icinga state. Default 0.
+            in_downtime (bool, optional): Whether the object is in downtime. Default False.
+            last_check (float, optional): The last check timestamp. Default 0.
+            acknowledged (bool, optional): Whether the problem is acknowledged. Default False.
+
+        Returns:
+            int: The row.
+        """
+        _host = self._intern(host, self.host_names, self._host_index)
+        _service = self._intern(service, self.service_names, self._service_index) if service else -1
+
+        if _service >= (1 << self.SERVICE_BITS) - 1:
+            raise ValueError(f"More than {(1 << self.SERVICE_BITS) - 2} service names")
+        _key = self._row_key(_host, _service)
+        _row = self._rows.get(_key)
+        if _row is not None:
+            self.states[_row] = int(state)
+            self.downtimes[_row] = 1 if in_downtime else 0
+            self.acknowledgements[_row] = 1 if acknowledged else 0
+            self.last_checks[_row] = last_check or 0.0
+            return _row
+
+        _row = len(self.states)
+        self._rows[_key] = _row
+        self.hosts.append(_host)
+        self.services.append(_service)
+        self.states.append(int(state))
+        self.downtimes.append(1 if in_downtime else 0)
+        self.acknowledgements.append(1 if acknowledged else 0)
+        self.last_checks.append(last_check or 0.0)
+        return _row
+
+    def find(self, key: str):
+        """
+        Return the row of a host or host!service key, None if missing.
+        """
+        _host, _, _service = key.partition("!")
+        _host = self._host_index.get(_host)
+        _service = self._service_index.get(_service) if _service else -1
+        if _host is None or _service is None:
+            return None
+        return self._rows.get(self._row_key(_host, _service))
+
+    def key(self, row: int):
+        _service = self.services[row]
+        if _service < 0:
+            return self.host_names[self.hosts[row]]
+        return f"{self.host_names[self.hosts[row]]}!{self.service_names[_service]}"
+
+    def kind(self, row: int):
+        return "h" if self.services[row] < 0 else "s"
+
+    def state(self, row: int):
+        """
+        Return a row as a dictionary with "state", "in_downtime", "last_check" and "acknowledged".
+        """
+        return {
+            "state": self.states[row],
+            "in_downtime": self.downtimes[row] == 1,
+            "last_check": self.last_checks[row],
+            "acknowledged": self.acknowledgements[row] == 1
+        }
+
+    def as_dicts(self):
+        """
+        Return the table as dictionaries, e.g. for a module result.
+
+        Returns:
+            dict: Dictionary with "hosts" (host name: state) and "services" (host!service: state),
+                states as returned by state().
+        """
+        _ret = {"hosts": {}, "services": {}}
+        for _row in range(len(self.states)):
+            _ret["hosts" if self.services[_row] < 0 else "services"][self.key(_row)] = self.state(_row)
+        return _ret
+
+    def records(self):
+        """
+        Iterate the table as [key, kind, state, in_downtime] records.
+
+        Yields:
+            list: The records, in insertion order.
+        """
+        for _row in range(len(self.states)):
+            yield [self.key(_row), self.kind(_row), self.states[_row], self.downtimes[_row] == 1]
+
+    def count_by_state(self, kind: str = "s"):
+        """
+        Count the rows of a kind by state.
+
+        Args:
+            kind (str, optional): "h" for hosts, "s" for services. Default "s".
+
+        Returns:
+            dict: Dictionary of state to number of rows.
+        """
+        _counts = [0] * 256
+        _is_host = kind == "h"
+        for _service, _state in zip(self.services, self.states):
+            if (_service < 0) == _is_host:
+                _counts[_state] += 1
+        return {_state: _count for _state, _count in enumerate(_counts) if _count > 0}
+
+    def worst_state_per_host(self, include_downtime: bool = True):
+        """
+        Return the worst service state of every host, by severity (OK < WARNING < UNKNOWN < CRITICAL).
+
+        Args:
+            include_downtime (bool, optional): Consider the services in downtime too. Default True.
+
+        Returns:
+            dict: Dictionary of host name to its worst service state.
+        """
+        _worst = {}
+        for _host, _service, _state, _downtime in zip(self.hosts, self.services, self.states, self.downtimes):
+            if _service < 0 or (_downtime and not include_downtime):
+                continue
+            _severity = SERVICE_SEVERITY.get(_state, 3)
+            if _severity > _worst.get(_host, -1):
+                _worst[_host] = _severity
+        return {self.host_names[_host]: SEVERITY_SERVICE[_severity] for _host, _severity in _worst.items()}
+
+    def filter(self, kind: str = None, states: list = None, in_downtime: bool = None, predicate=None):
+        """
+        Return the rows matching all the given conditions.
+
+        Args:
+            kind (str, optional): "h" for hosts, "s" for services.
+            states (list, optional): The accepted states.
+            in_downtime (bool, optional): The accepted downtime flag.
+            predicate (callable, optional): Called with key, kind, state, in_downtime and last_check
+                of the rows matching the other conditions, keeps the rows it returns True for.
+
+        Returns:
+            list: The matching row numbers, use key() or records() to read them.
+        """
+        _states = set(states) if states is not None else None
+        _ret = []
+        for _row, (_service, _state, _downtime) in enumerate(zip(self.services, self.states, self.downtimes)):
+            if kind is not None and (_service < 0) != (kind == "h"):
+                continue
+            if _states is not None and _state not in _states:
+                continue
+            if in_downtime is not None and (_downtime == 1) != in_downtime:
+                continue
+            if predicate is not None and not predicate(self.key(_row), self.kind(_row), _state, _downtime == 1,
+                                                       self.last_checks[_row]):
+                continue
+            _ret.append(_row)
+        return _ret
@@ -0,0 +1,188 @@
+import json
+import os
+import tempfile
+import time
+from ansible_collections.rangeid.icinga.plugins.module_utils.state_files import private_path, open_private
+
+CACHE_VERSION = 1
+
+
+class IcingaTopologyCache():
+    """Local copy of the Icinga hosts and services, refreshed incrementally.
+
+    The first sync loads all the objects with the requested attributes. The
+    following ones only fetch the signature of every object (name, version,
+    last_state_change, downtime_depth and the cached volatile attributes, see
+    VOLATILE_ATTRS), compare it with the cached one and re-read the changed and
+    new objects by name; objects not returned anymore are dropped. A full load
+    only happens when a gap is detected: no usable cache, a different endpoint
+    or attribute set, a cache older than max_age, or objects vanishing between
+    the signature fetch and the re-read.
+
+    The /v1/events stream is not used: its queue only lives as long as the HTTP
+    connection, which a playbook run does not keep between two syncs, so every
+    sync would start with a gap anyway.
+    """
+
+    SIGNATURE_ATTRS = ["version", "last_state_change", "downtime_depth"]
+    # Attributes changing without version nor last_state_change, part of the
+    # signature when they are cached
+    VOLATILE_ATTRS = ["last_check", "acknowledgement", "groups"]
+    HOST_ATTRS = ["name", "address", "groups", "state", "downtime_depth"]
+    SERVICE_ATTRS = ["name", "host_name", "state", "downtime_depth"]
+
+    def __init__(self, client, path: str = None, host_attrs: list = None, service_attrs: list = None,
+                 max_age: int = 86400, chunk_size: int = 500):
+        """
+        Args:
+            client (IcingaMiniClass): The client used to reach the Icinga API.
+            path (str, optional): Path of the cache file, defaults to a file in the private temporary
+                directory of the user. A cache file owned by another user is ignored.
+            host_attrs (list, optional): Cached host attributes. Default HOST_ATTRS.
+            service_attrs (list, optional): Cached service attributes. Default SERVICE_ATTRS.
+            max_age (int, optional): Seconds after which a full load is forced. Default 86400.
+            chunk_size (int, optional): Maximum number of objects re-read by a request. Default 500.
+        """
+        self.client = client
+        self.host_attrs = self._with_signature(host_attrs or self.HOST_ATTRS)
+        self.service_attrs = self._with_signature(service_attrs or self.SERVICE_ATTRS)
+        self.max_age = max_age
+        self.chunk_size = chunk_size
+        self.path = path or private_path("topology.json")
+        self.hosts = {}
+        self.services = {}
+
+    def _with_signature(self, attrs: list):
+        return list(attrs) + [_attr for _attr in ["name"] + self.SIGNATURE_ATTRS if _attr not in attrs]
+
+    def _signature_attrs(self, attrs: list):
+        return self.SIGNATURE_ATTRS + [_attr for _attr in self.VOLATILE_ATTRS if _attr in attrs]
+
+    @staticmethod
+    def _signature(attrs: dict, names: list):
+        return [attrs.get(_name) for _name in names]
+
+    @staticmethod
+    def _service_key(attrs: dict):
+        return f"{attrs['host_name']}!{attrs['name']}"
+
+    def _load(self):
+        try:
+            with open_private(self.path, "r") as _fd:
+                _cache = json.load(_fd)
+        except (OSError, ValueError):
+            return None
+
+        if _cache.get("version") != CACHE_VERSION \
+                or _cache.get("endpoint") != self.client.url \
+                or _cache.get("host_attrs") != self.host_attrs \
+                or _cache.get("service_attrs") != self.service_attrs \
+                or time.time() - _cache.get("synced", 0) > self.max_age:
+            return None
+        return _cache
+
+    def _save(self):
+        # Written aside (mkstemp creates it 0600) and renamed, a concurrent reader never
+        # sees a partial cache
+        _fd, _tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)), suffix=".tmp")
+        with os.fdopen(_fd, "w") as _file:
+            json.dump({
+                "version": CACHE_VERSION,
+                "endpoint": self.client.url,
+                "synced": time.time(),
+                "host_attrs": self.host_attrs,
+                "service_attrs": self.service_attrs,
+                "hosts": self.hosts,
+                "services": self.services
+            }, _file, separators=(",", ":"))
+        os.replace(_tmp, self.path)
+
+    def _fetch(self, object_type: str, attrs: list, names: list = None):
+        _data = {"type": object_type, "attrs": attrs}
+        if names is not None:
+            # Objects selected by full name, e.g. {"services": ["host!service"]}
+            _data[f"{object_type.lower()}s"] = names
+        _response = self.client._send_request(
+            url=f"/v1/objects/{object_type.lower()}s",
+            method="GET",
+            data=_data,
+        )
+        return [_object["attrs"] for _object in _response["results"]]
+
+    def _fetch_changed(self, object_type: str, attrs: list, names: list):
+        _ret = []
+        for _index in range(0, len(names), self.chunk_size):
+            _ret.extend(self._fetch(object_type, attrs, names[_index:_index + self.chunk_size]))
+        return _ret
+
+    def _full_load(self):
+        self.hosts = {_attrs["name"]: _attrs for _attrs in self._fetch("Host", self.host_attrs)}
+        self.services = {self._service_key(_attrs): _attrs for _attrs in self._fetch("Service", self.service_attrs)}
+
+    def _refresh(self, object_type: str, cached: dict, attrs: list, key):
+        """
+        Bring one object type up to date, returns the changed keys or None on a gap.
+        """
+        _names = self._signature_attrs(attrs)
+        _signature_attrs = ["name"] + _names + (["host_name"] if object_type == "Service" else [])
+        _current = {key(_attrs): self._signature(_attrs, _names)
+                    for _attrs in self._fetch(object_type, _signature_attrs)}
+
+        _removed = [_key for _key in cached if _key not in _current]
+        for _key in _removed:
+            del cached[_key]
+
+        _changed = [_key for _key, _signature in _current.items()
+                    if _key not in cached or self._signature(cached[_key], _names) != _signature]
+        if len(_changed) == 0:
+            return {"changed": 0, "removed": len(_removed)}
+
+        _objects = self._fetch_changed(object_type, attrs, _changed)
+        if len(_objects) != len(_changed):
+            return None
+        for _attrs in _objects:
+            cached[key(_attrs)] = _attrs
+        return {"changed": len(_changed), "removed": len(_removed)}
+
+    def sync(self, force_full: bool = False):
+        """
+        Bring the cache up to date with the Icinga API and save it.
+
+        Args:
+            force_full (bool, optional): Ignore the cache and load everything. Default False.
+
+        Returns:
+            dict: The sync "mode" ("full" or "incremental"), the number of "hosts" and "services",
+                the changed and removed objects and the "elapsed_seconds".
+        """
+        _start = time.time()
+        _ret = {"mode": "incremental"}
+
+        _cache = None if force_full else self._load()
+        if _cache is not None:
+            self.hosts = _cache["hosts"]
+            self.services = _cache["services"]
+            _hosts = self._refresh("Host", self.hosts, self.host_attrs, lambda _attrs: _attrs["name"])
+            _services = None
+            if _hosts is not None:
+                _services = self._refresh("Service", self.services, self.service_attrs, self._service_key)
+
+            if _hosts is not None and _services is not None:
+                _ret.update({
+                    "hosts_changed": _hosts["changed"],
+                    "hosts_removed": _hosts["removed"],
+                    "services_changed": _services["changed"],
+                    "services_removed": _services["removed"]
+                })
+            else:
+                _cache = None
+
+        if _cache is None:
+            self._full_load()
+            _ret["mode"] = "full"
+
+        self._save()
+        _ret["hosts"] = len(self.hosts)
+        _ret["services"] = len(self.services)
+        _ret["elapsed_seconds"] = round(time.time() - _start, 3)
+        return _ret
@@ -0,0 +1,197 @@
+import collections
+import json
+import os
+import threading
+import time
+
+
+class IcingaResponse():
+    """Minimal HTTP response returned by the transports."""
+
+    def __init__(self, status_code: int, content: bytes, elapsed: float = 0.0):
+        self.status_code = status_code
+        self.content = content
+        self.elapsed = elapsed
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class IcingaRequestsTransport():
+    """Send the requests to the Icinga API through a requests session."""
+
+    # Seconds to connect and to wait for the reply, a request never hangs forever
+    TIMEOUT = (10, 60)
+
+    def __init__(self, session, validate_certs: bool = True, timeout: tuple = None):
+        self.session = session
+        self.validate_certs = validate_certs
+        self.timeout = timeout or self.TIMEOUT
+
+    def send(self, endpoint: str, path: str, method: str, body: str, headers: dict):
+        """
+        Send a request, connection errors are raised as they are.
+
+        Args:
+            endpoint (str): Base URL of the Icinga endpoint.
+            path (str): API path, e.g. /v1/objects/hosts.
+            method (str): The HTTP method, sent as X-HTTP-Method-Override.
+            body (str): The JSON encoded body.
+            headers (dict): The request headers.
+
+        Returns:
+            IcingaResponse: The response.
+        """
+        _start = time.time()
+        _response = self.session.post(
+            url=f"{endpoint}{path}",
+            data=body,
+            headers=headers,
+            verify=self.validate_certs,
+            timeout=self.timeout
+        )
+        return IcingaResponse(status_code=_response.status_code,
+                              content=_response.content,
+                              elapsed=time.time() - _start)
+
+
+class IcingaRecordingTransport():
+    """Record every request and response of another transport to a cassette file.
+
+    The cassette is a JSON lines file with one interaction per line, including
+    its offset from the first request and the time spent waiting for it.
+    Credentials are never recorded, only method, path and bodies.
+    """
+
+    def __init__(self, transport, cassette: str):
+        self.transport = transport
+        self.cassette = cassette
+        self._start = None
+        self._lock = threading.Lock()
+
+    def send(self, endpoint: str, path: str, method: str, body: str, headers: dict):
+        with self._lock:
+            if self._start is None:
+                self._start = time.time()
+        _offset = time.time() - self._start
+
+        _interaction = {
+            "offset": round(_offset, 6),
+            "endpoint": endpoint,
+            "method": method,
+            "path": path,
+            "request": body
+        }
+        try:
+            _response = self.transport.send(endpoint=endpoint, path=path, method=method, body=body, headers=headers)
+        except OSError as e:
+            _interaction["error"] = f"{e}"
+            self._write(_interaction)
+            raise
+
+        _interaction.update({
+            "elapsed": round(_response.elapsed, 6),
+            "status": _response.status_code,
+            "response": _response.content.decode("utf-8")
+        })
+        self._write(_interaction)
+        return _response
+
+    def _write(self, interaction: dict):
+        with self._lock:
+            with open(self.cassette, "a") as _fd:
+                _fd.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+
+
+class IcingaReplayTransport():
+    """Answer the requests from a cassette file, without any network.
+
+    Requests are matched on method, path and body first, then on method and
+    path only (bodies carrying timestamps never match exactly), in recording
+    order. With timing="original" the responses are returned at the recorded
+    offsets and latencies, with timing="fast" as fast as possible.
+    """
+
+    TIMINGS = ["fast", "original"]
+
+    def __init__(self, cassette: str, timing: str = "fast"):
+        if timing not in self.TIMINGS:
+            raise ValueError(f"Unknown replay timing {timing}")
+
+        self.timing = timing
+        self._interactions = []
+        self._by_body = collections.defaultdict(collections.deque)
+        self._by_path = collections.defaultdict(collections.deque)
+        self._used = set()
+        self._start = None
+        self._lock = threading.Lock()
+
+        with open(cassette, "r") as _fd:
+            for _line in _fd:
+                if not _line.strip():
+                    continue
+                _interaction = json.loads(_line)
+                _index = len(self._interactions)
+                self._interactions.append(_interaction)
+                self._by_body[(_interaction["method"], _interaction["path"], _interaction["request"])].append(_index)
+                self._by_path[(_interaction["method"], _interaction["path"])].append(_index)
+
+    def _pop(self, queue):
+        while len(queue) > 0:
+            _index = queue.popleft()
+            if _index not in self._used:
+                self._used.add(_index)
+                return _index
+        return None
+
+    def send(self, endpoint: str, path: str, method: str, body: str, headers: dict):
+        with self._lock:
+            if self._start is None:
+                self._start = time.time()
+            _index = self._pop(self._by_body[(method, path, body)])
+            if _index is None:
+                _index = self._pop(self._by_path[(method, path)])
+
+        if _index is None:
+            raise ConnectionError(f"No recorded response for {method} {path}")
+        _interaction = self._interactions[_index]
+
+        if self.timing == "original":
+            _wait = self._start + _interaction["offset"] + _interaction.get("elapsed", 0) - time.time()
+            if _wait > 0:
+                time.sleep(_wait)
+
+        if "error" in _interaction:
+            raise ConnectionError(_interaction["error"])
+
+        return IcingaResponse(status_code=_interaction["status"],
+                              content=_interaction["response"].encode("utf-8"),
+                              elapsed=_interaction.get("elapsed", 0.0))
+
+
+def transport_from_environment(session, validate_certs: bool = True, timeout: tuple = None):
+    """
+    Build the transport, honouring the cassette environment variables.
+
+    ICINGA_CASSETTE is the cassette file, ICINGA_CASSETTE_MODE is "record",
+    "replay" (as fast as possible) or "replay_timed" (original timing).
+
+    Args:
+        session: The requests session used to reach the real server.
+        validate_certs (bool, optional): Whether to validate the SSL certificates. Default True.
+        timeout (tuple, optional): Connect and read timeouts in seconds, see IcingaRequestsTransport.TIMEOUT.
+
+    Returns:
+        The transport to use.
+    """
+    _transport = IcingaRequestsTransport(session=session, validate_certs=validate_certs, timeout=timeout)
+    _cassette = os.environ.get("ICINGA_CASSETTE")
+    if not _cassette:
+        return _transport
+
+    _mode = os.environ.get("ICINGA_CASSETTE_MODE", "replay")
+    if _mode == "record":
+        return IcingaRecordingTransport(transport=_transport, cassette=_cassette)
+    if _mode == "replay_timed":
+        return IcingaReplayTransport(cassette=_cassette, timing="original")
+    return IcingaReplayTransport(cassette=_cassette, timing="fast")
@@ -0,0 +1,330 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+
+from __future__ import absolute_import, division, print_function
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.rangeid.icinga.plugins.module_utils.time_utils import time_utils
+from ansible_collections.rangeid.icinga.plugins.module_utils.profiling import profiled, enable_profiling, \
+    attach_profile
+from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, \
+    IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaFailedService, IcingaConnectionException
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+module: acknowledge
+author:
+- "Angelo Conforti (@angeloxx)"
+description: Acknowledge or remove the acknowledgement of host and service problems with a single request
+options:
+    icinga_server:
+        description:
+        - The Icinga URL in the format https://<server> or
+          https://<server>:<port>/<context>, or a list
+          of URLs of the HA endpoints. Reads are spread across the healthy endpoints, writes go
+          to the first healthy one and fail over to the next
+        type: list
+        elements: str
+        required: true
+    read_strategy:
+        description:
+        - how reads are spread when more endpoints are configured
+        type: choices
+        choices:
+        - round_robin
+        - latency
+        default: round_robin
+        required: false
+    icinga_username:
+        description:
+        - The Icinga username
+        type: str
+        required: true
+    icinga_password:
+        description:
+        - The Icinga user's password
+        type: str
+        required: true
+    validate_certs:
+        description:
+        - If set to False, SSL certificates will not be validated
+        type: bool
+        required: false
+        default: true
+    hostname:
+        description:
+        - Icinga host object name or list of names
+        type: list
+        required: false
+    hostgroup:
+        description:
+        - Icinga hostgroup name, all its hosts are involved
+        type: str
+        required: false
+    acknowledgement:
+        description:
+        - The state of the acknowledgement
+        type: choices
+        choices:
+        - enabled
+        - disabled
+        default: enabled
+        required: false
+    service:
+        description:
+        - glob pattern of involved services of the selected hosts. If omitted, only the hosts
+          will be acknowledged
+        type: str
+        required: false
+    services:
+        description:
+        - list of involved services of the selected hosts
+        type: list
+        required: false
+    only_problems:
+        description:
+        - acknowledge only objects that are not in an OK/UP state
+        type: bool
+        default: true
+        required: false
+    message:
+        description:
+        - the acknowledgement comment
+        type: str
+        required: false
+    sticky:
+        description:
+        - keep the acknowledgement until the object fully recovers
+        type: bool
+        default: false
+        required: false
+    notify:
+        description:
+        - send an acknowledgement notification
+        type: bool
+        default: false
+        required: false
+    persistent:
+        description:
+        - keep the comment after the acknowledgement is removed
+        type: bool
+        default: false
+        required: false
+    expiry:
+        description:
+        - remove the acknowledgement after this time, in dhms format, eg. 1d, 30m 40s, 1h 30m
+        type: str
+        required: false
+    chunk_size:
+        description:
+        - maximum number of targets sent in a single request, larger target lists are
+          split in chunks sent in parallel
+        type: int
+        default: 500
+        required: false
+    chunk_concurrency:
+        description:
+        - maximum number of chunks in flight at the same time
+        type: int
+        default: 4
+        required: false
+    profile:
+        description:
+        - profile the module run, the wall-clock time of startup, request build, network wait,
+          decode and post processing phases, the time spent in every client method and the
+          most expensive functions are written to this file, or returned in the profile result
+          key if set to result. The ICINGA_PROFILE environment variable does the same for every
+          module
+        type: str
+        required: false
+    rate_limit:
+        description:
+        - Client side token bucket limiting the requests sent to the Icinga API. The
+          bucket is shared by all the Ansible workers running on the same machine
+        type: dict
+        required: false
+        suboptions:
+            rate:
+                description:
+                - sustained number of requests per second
+                type: float
+                required: true
+            burst:
+                description:
+                - number of requests that can be sent back to back
+                type: int
+                default: 1
+                required: false
+            state_file:
+                description:
+                - path of the file holding the shared bucket state
+                type: str
+                required: false
+"""
+
+
+@profiled
+def main():
+    argument_spec = dict(
+        icinga_server=dict(required=True, type="list", elements="str"),
+        read_strategy=dict(default="round_robin", type="str",
+                           choices=["round_robin", "latency"]),
+        icinga_username=dict(required=True, type="str"),
+        icinga_password=dict(required=True, type="str", no_log=True),
+        acknowledgement=dict(default="enabled", type="str",
+                             choices=['enabled', 'disabled']),
+        author=dict(default="Ansible", required=False, type="str"),
+        hostname=dict(required=False, type="list", elements="str", aliases=["name"]),
+        hostgroup=dict(required=False, type="str"),
+        service=dict(required=False, type="str"),
+        services=dict(required=False, type="list", elements="str"),
+        only_problems=dict(default=True, type="bool"),
+        message=dict(default="Acknowledged", required=False, type="str"),
+        sticky=dict(default=False, type="bool"),
+        notify=dict(default=False, type="bool"),
+        persistent=dict(default=False, type="bool"),
+        expiry=dict(required=False, type="str"),
+        validate_certs=dict(default=True, type="bool"),
+        chunk_size=dict(default=500, type="int"),
+        chunk_concurrency=dict(default=4, type="int"),
+        profile=dict(required=False, type="str"),
+        rate_limit=dict(required=False, type="dict", options=dict(
+            rate=dict(required=True, type="float"),
+            burst=dict(required=False, default=1, type="int"),
+            state_file=dict(required=False, type="str"),
+        )),
+    )
+
+    result = dict(
+        changed=False,
+        original_message='',
+        message='',
+        objects=[],
+        failed_objects=[]
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        supports_check_mode=True
+    )
+    enable_profiling(module.params.get("profile"))
+
+    icinga_server = module.params.get("icinga_server")
+    read_strategy = module.params.get("read_strategy")
+    icinga_username = module.params.get("icinga_username")
+    icinga_password = module.params.get("icinga_password")
+    validate_certs = module.params.get("validate_certs")
+    rate_limit = module.params.get("rate_limit") or {}
+    acknowledgement = module.params.get("acknowledgement")
+    author = module.params.get("author")
+    hostname = module.params.get("hostname")
+    hostgroup = module.params.get("hostgroup")
+    service = module.params.get("service")
+    services = module.params.get("services")
+    message = module.params.get("message")
+    expiry = module.params.get("expiry")
+
+    if service and services:
+        module.fail_json(
+            "Specify service or services, both are not supported")
+
+    if not hostname and not hostgroup:
+        module.fail_json(
+            "Specify hostname/name or hostgroup, service and services only narrow the hosts")
+
+    expiry_seconds = 0
+    if expiry:
+        expiry_seconds = time_utils.convert_duration(expiry)
+        if expiry_seconds == 0:
+            module.fail_json(f"Can't convert expiry='{expiry}'")
+
+    if hostname is not None and len(hostname) == 1:
+        hostname = hostname[0]
+
+    if not all(_server.startswith("https://") for _server in icinga_server):
+        module.fail_json('Server must be https://<servername>')
+
+    icinga_client = IcingaMiniClass(module=module,
+                                    url=icinga_server,
+                                    read_strategy=read_strategy,
+                                    username=icinga_username,
+                                    password=icinga_password,
+                                    validate_certs=validate_certs,
+                                    rate_limit=rate_limit.get("rate", 0),
+                                    rate_burst=rate_limit.get("burst", 1),
+                                    rate_limit_file=rate_limit.get("state_file"),
+                                    chunk_size=module.params.get("chunk_size"),
+                                    chunk_concurrency=module.params.get("chunk_concurrency"))
+    icinga_client.report_stats_on_failure()
+
+    if module.check_mode:
+        # Only the reads are sent, the actions are returned in the plan
+        icinga_client.start_plan()
+
+    try:
+        if acknowledgement == "enabled":
+            status = icinga_client.acknowledge_problems(
+                host=hostname,
+                hostgroup=hostgroup,
+                service=service,
+                services=services,
+                only_problems=module.params.get("only_problems"),
+                author=author,
+                comment=message,
+                sticky=module.params.get("sticky"),
+                notify=module.params.get("notify"),
+                persistent=module.params.get("persistent"),
+                expiry_seconds=expiry_seconds
+            )
+        else:
+            status = icinga_client.remove_acknowledgements(
+                host=hostname,
+                hostgroup=hostgroup,
+                service=service,
+                services=services
+            )
+
+        if status["changes"] > 0:
+            result['changed'] = True
+        result["objects"] = status["success"]
+        result["failed_objects"] = status["failed"]
+        result["chunks"] = status["chunks"]
+        result["message"] = ", ".join([_object["status"] for _object in status["success"]])
+
+    except IcingaConnectionException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"Unable to connect to or find the Icinga URL {', '.join(icinga_server)}")
+
+    except IcingaAuthenticationException:
+        module.fail_json(
+            msg=f"Authentication error, please double check the '{icinga_username}' user")
+
+    except IcingaNoSuchObjectException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg="Unable to find any object matching the selection")
+
+    except IcingaFailedService as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"One or more services are down ({e.message})")
+
+    if module.check_mode:
+        result["plan"] = icinga_client.get_plan()
+    result["throttled_seconds"] = icinga_client.get_throttled_seconds()
+    result["icinga_stats"] = icinga_client.get_stats()
+    attach_profile(result)
+    module.exit_json(**result)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@
 
 from __future__ import absolute_import, division, print_function
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.rangeid.icinga.plugins.module_utils.profiling import profiled, enable_profiling, \
+    attach_profile
 from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaFailedService, IcingaConnectionException
 
 __metaclass__ = type
@@ -20,9 +22,21 @@ options:
   icinga_server:
     description:
     - The Icinga URL in the format https://<server> or
-      https://<server>/<context>
-    type: url
+      https://<server>/<context>, or a list
+      of URLs of the HA endpoints. Reads are spread across the healthy endpoints, writes go
+      to the first healthy one and fail over to the next
+    type: list
+    elements: str
     required: true
+  read_strategy:
+    description:
+    - how reads are spread when more endpoints are configured
+    type: choices
+    choices:
+    - round_robin
+    - latency
+    default: round_robin
+    required: false
   icinga_username:
     description:
     - The Icinga user with branch creation and deletion rights
@@ -51,18 +65,61 @@ options:
       be checked during this time and the module fails if the service is failed
     type: int
     required: false
+  profile:
+    description:
+    - profile the module run, the wall-clock time of startup, request build, network wait,
+      decode and post processing phases, the time spent in every client method and the
+      most expensive functions are written to this file, or returned in the profile result
+      key if set to result. The ICINGA_PROFILE environment variable does the same for every
+      module
+    type: str
+    required: false
+  rate_limit:
+    description:
+    - Client side token bucket limiting the requests sent to the Icinga API. The
+      bucket is shared by all the Ansible workers running on the same machine,
+      polling loops are slowed down instead of failing when throttled
+    type: dict
+    required: false
+    suboptions:
+      rate:
+        description:
+        - sustained number of requests per second
+        type: float
+        required: true
+      burst:
+        description:
+        - number of requests that can be sent back to back
+        type: int
+        default: 1
+        required: false
+      state_file:
+        description:
+        - path of the file holding the shared bucket state, defaults to a file
+          in the temporary directory named after the Icinga URL
+        type: str
+        required: false
 """
 
 
+@profiled
 def main():
     argument_spec = dict(
-        icinga_server=dict(required=True, type="str"),
+        icinga_server=dict(required=True, type="list", elements="str"),
+        read_strategy=dict(default="round_robin", type="str",
+                           choices=["round_robin", "latency"]),
         icinga_username=dict(required=True, type="str"),
         icinga_password=dict(required=True, type="str", no_log=True),
         service=dict(required=True, type="str"),
         hostname=dict(required=True, aliases=["name"]),
         timeout=dict(default=0, type="int", aliases=["timeout_seconds"]),
         validate_certs=dict(default=True, type="bool"),
+        profile=dict(required=False, type="str"),
+        rate_limit=dict(required=False, type="dict", options=dict(
+            rate=dict(required=True, type="float"),
+            burst=dict(required=False, default=1, type="int"),
+            state_file=dict(required=False, type="str"),
+        )),
     )
 
     result = dict(
@@ -74,31 +131,43 @@ def main():
 
     module = AnsibleModule(
         argument_spec=argument_spec,
-        supports_check_mode=False
+        supports_check_mode=True
     )
+    enable_profiling(module.params.get("profile"))
 
     hostname = module.params.get("hostname")
 
     icinga_server = module.params.get("icinga_server")
+    read_strategy = module.params.get("read_strategy")
     icinga_username = module.params.get("icinga_username")
     icinga_password = module.params.get("icinga_password")
     service = module.params.get("service")
     timeout = module.params.get("timeout")
     validate_certs = module.params.get("validate_certs")
+    rate_limit = module.params.get("rate_limit") or {}
 
     module.run_command_environ_update = dict(
         LANG="C.UTF-8", LC_ALL="C.UTF-8",
         LC_MESSAGES="C.UTF-8", LC_CTYPE="C.UTF-8"
     )
 
-    if not icinga_server.startswith("https://"):
+    if not all(_server.startswith("https://") for _server in icinga_server):
         module.fail_json('Server must be https://<servername>')
 
     icinga_client = IcingaMiniClass(module=module,
                                     url=icinga_server,
+                                    read_strategy=read_strategy,
                                     username=icinga_username,
                                     password=icinga_password,
-                                    validate_certs=validate_certs)
+                                    validate_certs=validate_certs,
+                                    rate_limit=rate_limit.get("rate", 0),
+                                    rate_burst=rate_limit.get("burst", 1),
+                                    rate_limit_file=rate_limit.get("state_file"))
+    icinga_client.report_stats_on_failure()
+
+    if module.check_mode:
+        # Only the reads are sent, the actions are returned in the plan
+        icinga_client.start_plan()
 
     try:
         status = icinga_client.check_service(
@@ -118,15 +187,18 @@ def main():
             module.fail_json(msg=e.message)
         else:
             module.fail_json(
-                msg=f"Unable to connect to or find the Icinga URL {icinga_server}")
+                msg=f"Unable to connect to or find the Icinga URL {', '.join(icinga_server)}")
 
     except IcingaAuthenticationException:
         module.fail_json(
             msg=f"Authentication error, please double check the '{icinga_username}' user")
 
-    except IcingaNoSuchObjectException:
-        module.fail_json(
-            msg=f"Unable to find the host {hostname} or service {service}")
+    except IcingaNoSuchObjectException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"Unable to find the host {hostname} or service {service}")
         
     except IcingaFailedService as e:
         module.fail_json(
@@ -134,6 +206,11 @@ def main():
             service_status=icinga_client.get_last_service_status()
             )
 
+    if module.check_mode:
+        result["plan"] = icinga_client.get_plan()
+    result["throttled_seconds"] = icinga_client.get_throttled_seconds()
+    result["icinga_stats"] = icinga_client.get_stats()
+    attach_profile(result)
     module.exit_json(**result)
 
 
@@ -0,0 +1,283 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+
+from __future__ import absolute_import, division, print_function
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.rangeid.icinga.plugins.module_utils.time_utils import time_utils
+from ansible_collections.rangeid.icinga.plugins.module_utils.profiling import profiled, enable_profiling, \
+    attach_profile
+from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, \
+    IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaFailedService, IcingaConnectionException
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+module: downtime_purge
+author:
+- "Angelo Conforti (@angeloxx)"
+description: Remove all the downtimes matching author, comment, host, hostgroup or age criteria
+options:
+    icinga_server:
+        description:
+        - The Icinga URL in the format https://<server> or
+          https://<server>:<port>/<context>, or a list
+          of URLs of the HA endpoints. Reads are spread across the healthy endpoints, writes go
+          to the first healthy one and fail over to the next
+        type: list
+        elements: str
+        required: true
+    read_strategy:
+        description:
+        - how reads are spread when more endpoints are configured
+        type: choices
+        choices:
+        - round_robin
+        - latency
+        default: round_robin
+        required: false
+    icinga_username:
+        description:
+        - The Icinga username
+        type: str
+        required: true
+    icinga_password:
+        description:
+        - The Icinga user's password
+        type: str
+        required: true
+    validate_certs:
+        description:
+        - If set to False, SSL certificates will not be validated
+        type: bool
+        required: false
+        default: true
+    author:
+        description:
+        - only downtimes created by this author
+        type: str
+        required: false
+    comment:
+        description:
+        - only downtimes whose comment matches this regular expression
+        type: str
+        required: false
+    hostname:
+        description:
+        - only downtimes of this Icinga host object name or list of names
+        type: list
+        required: false
+    hostgroup:
+        description:
+        - only downtimes of the hosts of this hostgroup
+        type: str
+        required: false
+    older_than:
+        description:
+        - only downtimes created more than this time ago, in dhms format, eg. 1d, 30m 40s, 1h 30m
+        type: str
+        required: false
+    end_before:
+        description:
+        - only downtimes ending before this UNIX timestamp
+        type: float
+        required: false
+    end_after:
+        description:
+        - only downtimes ending after this UNIX timestamp
+        type: float
+        required: false
+    dry_run:
+        description:
+        - only return the matching downtimes without removing them, implied by check mode
+        type: bool
+        default: false
+        required: false
+    chunk_size:
+        description:
+        - maximum number of downtimes removed by a single request
+        type: int
+        default: 500
+        required: false
+    chunk_concurrency:
+        description:
+        - maximum number of chunks in flight at the same time
+        type: int
+        default: 4
+        required: false
+    profile:
+        description:
+        - profile the module run, the wall-clock time of startup, request build, network wait,
+          decode and post processing phases, the time spent in every client method and the
+          most expensive functions are written to this file, or returned in the profile result
+          key if set to result. The ICINGA_PROFILE environment variable does the same for every
+          module
+        type: str
+        required: false
+    rate_limit:
+        description:
+        - Client side token bucket limiting the requests sent to the Icinga API. The
+          bucket is shared by all the Ansible workers running on the same machine
+        type: dict
+        required: false
+        suboptions:
+            rate:
+                description:
+                - sustained number of requests per second
+                type: float
+                required: true
+            burst:
+                description:
+                - number of requests that can be sent back to back
+                type: int
+                default: 1
+                required: false
+            state_file:
+                description:
+                - path of the file holding the shared bucket state
+                type: str
+                required: false
+"""
+
+
+@profiled
+def main():
+    argument_spec = dict(
+        icinga_server=dict(required=True, type="list", elements="str"),
+        read_strategy=dict(default="round_robin", type="str",
+                           choices=["round_robin", "latency"]),
+        icinga_username=dict(required=True, type="str"),
+        icinga_password=dict(required=True, type="str", no_log=True),
+        author=dict(required=False, type="str"),
+        comment=dict(required=False, type="str"),
+        hostname=dict(required=False, type="list", elements="str", aliases=["name"]),
+        hostgroup=dict(required=False, type="str"),
+        older_than=dict(required=False, type="str"),
+        end_before=dict(required=False, type="float"),
+        end_after=dict(required=False, type="float"),
+        dry_run=dict(default=False, type="bool"),
+        chunk_size=dict(default=500, type="int"),
+        chunk_concurrency=dict(default=4, type="int"),
+        validate_certs=dict(default=True, type="bool"),
+        profile=dict(required=False, type="str"),
+        rate_limit=dict(required=False, type="dict", options=dict(
+            rate=dict(required=True, type="float"),
+            burst=dict(required=False, default=1, type="int"),
+            state_file=dict(required=False, type="str"),
+        )),
+    )
+
+    result = dict(
+        changed=False,
+        original_message='',
+        message='',
+        downtimes=[],
+        failed_objects=[]
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        supports_check_mode=True
+    )
+    enable_profiling(module.params.get("profile"))
+
+    icinga_server = module.params.get("icinga_server")
+    read_strategy = module.params.get("read_strategy")
+    icinga_username = module.params.get("icinga_username")
+    icinga_password = module.params.get("icinga_password")
+    validate_certs = module.params.get("validate_certs")
+    rate_limit = module.params.get("rate_limit") or {}
+    hostname = module.params.get("hostname")
+    older_than = module.params.get("older_than")
+    chunk_size = module.params.get("chunk_size")
+    dry_run = module.params.get("dry_run") or module.check_mode
+
+    if chunk_size < 1:
+        module.fail_json(f"Chunk size must be at least 1, got {chunk_size}")
+
+    older_than_seconds = 0
+    if older_than:
+        older_than_seconds = time_utils.convert_duration(older_than)
+        if older_than_seconds == 0:
+            module.fail_json(f"Can't convert older_than='{older_than}'")
+
+    if hostname is not None and len(hostname) == 1:
+        hostname = hostname[0]
+
+    if not all(_server.startswith("https://") for _server in icinga_server):
+        module.fail_json('Server must be https://<servername>')
+
+    icinga_client = IcingaMiniClass(module=module,
+                                    url=icinga_server,
+                                    read_strategy=read_strategy,
+                                    username=icinga_username,
+                                    password=icinga_password,
+                                    validate_certs=validate_certs,
+                                    rate_limit=rate_limit.get("rate", 0),
+                                    rate_burst=rate_limit.get("burst", 1),
+                                    rate_limit_file=rate_limit.get("state_file"),
+                                    chunk_size=chunk_size,
+                                    chunk_concurrency=module.params.get("chunk_concurrency"))
+    icinga_client.report_stats_on_failure()
+
+    try:
+        status = icinga_client.purge_downtimes(
+            dry_run=dry_run,
+            author=module.params.get("author"),
+            comment=module.params.get("comment"),
+            host=hostname,
+            hostgroup=module.params.get("hostgroup"),
+            end_before=module.params.get("end_before"),
+            end_after=module.params.get("end_after"),
+            older_than_seconds=older_than_seconds
+        )
+
+        result["downtimes"] = status["downtimes"]
+        result["failed_objects"] = status["failed"]
+        result["chunks"] = status["chunks"]
+        if dry_run:
+            result["changed"] = len(status["downtimes"]) > 0
+            result["message"] = f"{len(status['downtimes'])} downtimes would be removed"
+        else:
+            result["changed"] = status["changes"] > 0
+            result["message"] = f"Removed {status['changes']} of {len(status['downtimes'])} downtimes"
+
+        if len(status["failed"]) > 0:
+            _failed_list = ", ".join([_object["object"] for _object in status["failed"]])
+            module.fail_json(msg=f"Unable to remove one or more downtimes: {_failed_list}",
+                             **result)
+
+    except IcingaConnectionException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"Unable to connect to or find the Icinga URL {', '.join(icinga_server)}")
+
+    except IcingaAuthenticationException:
+        module.fail_json(
+            msg=f"Authentication error, please double check the '{icinga_username}' user")
+
+    except IcingaNoSuchObjectException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg="Unable to find any downtime matching the selection")
+
+    except IcingaFailedService as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"One or more services are down ({e.message})")
+
+    result["throttled_seconds"] = icinga_client.get_throttled_seconds()
+    result["icinga_stats"] = icinga_client.get_stats()
+    attach_profile(result)
+    module.exit_json(**result)
+
+
+if __name__ == "__main__":
+    main()
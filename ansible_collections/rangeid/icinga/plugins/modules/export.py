@@ -0,0 +1,280 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+
+from __future__ import absolute_import, division, print_function
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.rangeid.icinga.plugins.module_utils.profiling import profiled, enable_profiling, \
+    attach_profile
+from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, \
+    IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaConnectionException
+from ansible_collections.rangeid.icinga.plugins.module_utils.exporter import IcingaExporter
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+module: export
+author:
+- "Angelo Conforti (@angeloxx)"
+description: Stream hosts, services or downtimes to a JSONL or CSV file, e.g. for auditing
+options:
+    icinga_server:
+        description:
+        - The Icinga URL in the format https://<server> or
+          https://<server>:<port>/<context>, or a list
+          of URLs of the HA endpoints. Reads are spread across the healthy endpoints, writes go
+          to the first healthy one and fail over to the next
+        type: list
+        elements: str
+        required: true
+    read_strategy:
+        description:
+        - how reads are spread when more endpoints are configured
+        type: choices
+        choices:
+        - round_robin
+        - latency
+        default: round_robin
+        required: false
+    icinga_username:
+        description:
+        - The Icinga username
+        type: str
+        required: true
+    icinga_password:
+        description:
+        - The Icinga user's password
+        type: str
+        required: true
+    validate_certs:
+        description:
+        - If set to False, SSL certificates will not be validated
+        type: bool
+        required: false
+        default: true
+    object:
+        description:
+        - the objects to export
+        type: choices
+        choices:
+        - hosts
+        - services
+        - downtimes
+        default: services
+        required: false
+    hostname:
+        description:
+        - only the objects of this Icinga host object name or list of names
+        type: list
+        required: false
+    hostgroup:
+        description:
+        - only the objects of the hosts of this hostgroup
+        type: str
+        required: false
+    service:
+        description:
+        - only the services, or the downtimes of the services, matching this glob pattern
+        type: str
+        required: false
+    attrs:
+        description:
+        - exported attributes, only these are requested to Icinga. Defaults to a set of
+          state attributes for hosts and services and to the downtime details
+        type: list
+        required: false
+    path:
+        description:
+        - path of the export file, written on the machine running the module
+        type: path
+        required: true
+    format:
+        description:
+        - the file format, one JSON object per line or CSV with a header. In CSV lists and
+          dictionaries are written as JSON
+        type: choices
+        choices:
+        - jsonl
+        - csv
+        default: jsonl
+        required: false
+    compress:
+        description:
+        - write a gzip file
+        type: bool
+        default: false
+        required: false
+    checkpoint:
+        description:
+        - path of a checkpoint file, saved after every page. An interrupted export run again
+          with the same parameters appends the missing objects instead of starting over
+        type: path
+        required: false
+    page_size:
+        description:
+        - number of objects read by a request and written at once
+        type: int
+        default: 500
+        required: false
+    profile:
+        description:
+        - profile the module run, the wall-clock time of startup, request build, network wait,
+          decode and post processing phases, the time spent in every client method and the
+          most expensive functions are written to this file, or returned in the profile result
+          key if set to result. The ICINGA_PROFILE environment variable does the same for every
+          module
+        type: str
+        required: false
+    rate_limit:
+        description:
+        - Client side token bucket limiting the requests sent to the Icinga API. The
+          bucket is shared by all the Ansible workers running on the same machine
+        type: dict
+        required: false
+        suboptions:
+            rate:
+                description:
+                - sustained number of requests per second
+                type: float
+                required: true
+            burst:
+                description:
+                - number of requests that can be sent back to back
+                type: int
+                default: 1
+                required: false
+            state_file:
+                description:
+                - path of the file holding the shared bucket state
+                type: str
+                required: false
+"""
+
+
+@profiled
+def main():
+    argument_spec = dict(
+        icinga_server=dict(required=True, type="list", elements="str"),
+        read_strategy=dict(default="round_robin", type="str",
+                           choices=["round_robin", "latency"]),
+        icinga_username=dict(required=True, type="str"),
+        icinga_password=dict(required=True, type="str", no_log=True),
+        object=dict(default="services", type="str",
+                    choices=["hosts", "services", "downtimes"]),
+        hostname=dict(required=False, type="list", elements="str", aliases=["name"]),
+        hostgroup=dict(required=False, type="str"),
+        service=dict(required=False, type="str"),
+        attrs=dict(required=False, type="list", elements="str"),
+        path=dict(required=True, type="path"),
+        format=dict(default="jsonl", type="str", choices=["jsonl", "csv"]),
+        compress=dict(default=False, type="bool"),
+        checkpoint=dict(required=False, type="path"),
+        page_size=dict(default=500, type="int"),
+        validate_certs=dict(default=True, type="bool"),
+        profile=dict(required=False, type="str"),
+        rate_limit=dict(required=False, type="dict", options=dict(
+            rate=dict(required=True, type="float"),
+            burst=dict(required=False, default=1, type="int"),
+            state_file=dict(required=False, type="str"),
+        )),
+    )
+
+    result = dict(
+        changed=False,
+        original_message='',
+        message=''
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        supports_check_mode=True
+    )
+    enable_profiling(module.params.get("profile"))
+
+    icinga_server = module.params.get("icinga_server")
+    read_strategy = module.params.get("read_strategy")
+    icinga_username = module.params.get("icinga_username")
+    icinga_password = module.params.get("icinga_password")
+    validate_certs = module.params.get("validate_certs")
+    rate_limit = module.params.get("rate_limit") or {}
+    hostname = module.params.get("hostname")
+    path = module.params.get("path")
+    page_size = module.params.get("page_size")
+
+    if page_size < 1:
+        module.fail_json(f"Page size must be at least 1, got {page_size}")
+
+    if hostname is not None and len(hostname) == 1:
+        hostname = hostname[0]
+
+    if not all(_server.startswith("https://") for _server in icinga_server):
+        module.fail_json('Server must be https://<servername>')
+
+    icinga_client = IcingaMiniClass(module=module,
+                                    url=icinga_server,
+                                    read_strategy=read_strategy,
+                                    username=icinga_username,
+                                    password=icinga_password,
+                                    validate_certs=validate_certs,
+                                    rate_limit=rate_limit.get("rate", 0),
+                                    rate_burst=rate_limit.get("burst", 1),
+                                    rate_limit_file=rate_limit.get("state_file"))
+    icinga_client.report_stats_on_failure()
+
+    exporter = IcingaExporter(client=icinga_client,
+                              path=path,
+                              object_kind=module.params.get("object"),
+                              attrs=module.params.get("attrs"),
+                              output_format=module.params.get("format"),
+                              compress=module.params.get("compress"),
+                              checkpoint=module.params.get("checkpoint"),
+                              page_size=page_size)
+
+    try:
+        if module.check_mode:
+            # Only count the objects in scope
+            result["rows"] = exporter.count(host=hostname,
+                                            hostgroup=module.params.get("hostgroup"),
+                                            service=module.params.get("service"))
+            result["changed"] = True
+            result["message"] = f"{result['rows']} {module.params.get('object')} would be exported to {path}"
+        else:
+            status = exporter.export(host=hostname,
+                                     hostgroup=module.params.get("hostgroup"),
+                                     service=module.params.get("service"))
+            result.update(status)
+            result["changed"] = True
+            result["path"] = path
+            result["message"] = f"Exported {status['rows']} {module.params.get('object')} to {path}" + \
+                (f", resumed after {status['rows'] - status['written']}" if status["resumed"] else "")
+
+    except IcingaConnectionException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"Unable to connect to or find the Icinga URL {', '.join(icinga_server)}")
+
+    except IcingaAuthenticationException:
+        module.fail_json(
+            msg=f"Authentication error, please double check the '{icinga_username}' user")
+
+    except IcingaNoSuchObjectException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg="Unable to read the objects to export")
+
+    except OSError as e:
+        module.fail_json(msg=f"Unable to write {path}: {e}")
+
+    result["throttled_seconds"] = icinga_client.get_throttled_seconds()
+    result["icinga_stats"] = icinga_client.get_stats()
+    attach_profile(result)
+    module.exit_json(**result)
+
+
+if __name__ == "__main__":
+    main()
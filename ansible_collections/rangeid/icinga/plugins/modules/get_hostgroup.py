@@ -4,19 +4,30 @@ from __future__ import absolute_import, division, print_function
 from ansible.module_utils._text import to_text
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.urls import fetch_url, basic_auth_header
+from ansible_collections.rangeid.icinga.plugins.module_utils.profiling import profiled, enable_profiling, \
+    attach_profile
 from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, \
     IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaFailedService, IcingaConnectionException
 
 __metaclass__ = type
 
 
+@profiled
 def main():
     argument_spec = dict(
-        icinga_server=dict(type='str', required=True),
+        icinga_server=dict(type='list', elements='str', required=True),
+        read_strategy=dict(type='str', default='round_robin',
+                           choices=['round_robin', 'latency']),
         icinga_username=dict(type='str', required=True),
         icinga_password=dict(type='str', required=True, no_log=True),
         hostgroup=dict(type='str', required=True),
         validate_certs=dict(type='bool', default=True),
+        profile=dict(type='str', required=False),
+        rate_limit=dict(type='dict', required=False, options=dict(
+            rate=dict(type='float', required=True),
+            burst=dict(type='int', required=False, default=1),
+            state_file=dict(type='str', required=False),
+        )),
     )
 
     result = dict(
@@ -26,21 +37,29 @@ def main():
 
     module = AnsibleModule(
         argument_spec=argument_spec,
-        supports_check_mode=False
+        supports_check_mode=True
     )
+    enable_profiling(module.params.get("profile"))
 
     icinga_server = module.params.get("icinga_server")
+    read_strategy = module.params.get("read_strategy")
     icinga_username = module.params.get("icinga_username")
     icinga_password = module.params.get("icinga_password")
     hostgroup = module.params.get("hostgroup")
     validate_certs = module.params.get("validate_certs")
+    rate_limit = module.params.get("rate_limit") or {}
 
     try:
         icinga_client = IcingaMiniClass(module=module,
                                         url=icinga_server,
+                                        read_strategy=read_strategy,
                                         username=icinga_username,
                                         password=icinga_password,
-                                        validate_certs=validate_certs)
+                                        validate_certs=validate_certs,
+                                        rate_limit=rate_limit.get("rate", 0),
+                                        rate_burst=rate_limit.get("burst", 1),
+                                        rate_limit_file=rate_limit.get("state_file"))
+        icinga_client.report_stats_on_failure()
 
         result['hosts'] = icinga_client.get_hosts_by_group(hostgroup)
 
@@ -50,7 +69,7 @@ def main():
         else:
             module.fail_json(
                 msg=("Unable to connect to or find the Icinga URL "
-                     f"{icinga_server}")
+                     f"{', '.join(icinga_server)}")
             )
             
     except IcingaAuthenticationException:
@@ -72,6 +91,9 @@ def main():
             module.fail_json(
                 msg=f"One or more services are down ({e.message})")
 
+    result["throttled_seconds"] = icinga_client.get_throttled_seconds()
+    result["icinga_stats"] = icinga_client.get_stats()
+    attach_profile(result)
     module.exit_json(**result)
 
 
@@ -7,6 +7,8 @@ from ansible.module_utils._text import to_text
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.urls import fetch_url, basic_auth_header
 from ansible_collections.rangeid.icinga.plugins.module_utils.time_utils import time_utils
+from ansible_collections.rangeid.icinga.plugins.module_utils.profiling import profiled, enable_profiling, \
+    attach_profile
 from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaFailedService, IcingaConnectionException
 
 __metaclass__ = type
@@ -22,9 +24,21 @@ options:
   icinga_server:
     description:
     - The Icinga URL in the format https://<server> or
-      https://<server>:<port>/<context>
-    type: url
+      https://<server>:<port>/<context>, or a list
+      of URLs of the HA endpoints. Reads are spread across the healthy endpoints, writes go
+      to the first healthy one and fail over to the next
+    type: list
+    elements: str
     required: true
+  read_strategy:
+    description:
+    - how reads are spread when more endpoints are configured
+    type: choices
+    choices:
+    - round_robin
+    - latency
+    default: round_robin
+    required: false
   icinga_username:
     description:
     - The Icinga username
@@ -41,6 +55,17 @@ options:
     type: bool
     required: false
     default: true
+  hostname:
+    description:
+    - Icinga host object name, required if hostgroup is not set
+    type: str
+    required: false
+  hostgroup:
+    description:
+    - Icinga hostgroup name, the states of its hosts and of their services (all of them if
+      service is omitted) are returned in hosts and services
+    type: str
+    required: false
   service:
     description:
     - regexp or name of involved services. If omitted, only the host will be checked. If all or "*", all services 
@@ -48,13 +73,55 @@ options:
       be 
     type: str
     required: false
-
+  services:
+    description:
+    - list of names of involved services. The host and the services states are read with a
+      single request, the worst service state is returned in status
+    type: list
+    required: false
+  profile:
+    description:
+    - profile the module run, the wall-clock time of startup, request build, network wait,
+      decode and post processing phases, the time spent in every client method and the
+      most expensive functions are written to this file, or returned in the profile result
+      key if set to result. The ICINGA_PROFILE environment variable does the same for every
+      module
+    type: str
+    required: false
+  rate_limit:
+    description:
+    - Client side token bucket limiting the requests sent to the Icinga API. The
+      bucket is shared by all the Ansible workers running on the same machine,
+      polling loops are slowed down instead of failing when throttled
+    type: dict
+    required: false
+    suboptions:
+      rate:
+        description:
+        - sustained number of requests per second
+        type: float
+        required: true
+      burst:
+        description:
+        - number of requests that can be sent back to back
+        type: int
+        default: 1
+        required: false
+      state_file:
+        description:
+        - path of the file holding the shared bucket state, defaults to a file
+          in the temporary directory named after the Icinga URL
+        type: str
+        required: false
 """
 
 
+@profiled
 def main():
     argument_spec = dict(
-        icinga_server=dict(required=True, type="str"),
+        icinga_server=dict(required=True, type="list", elements="str"),
+        read_strategy=dict(default="round_robin", type="str",
+                           choices=["round_robin", "latency"]),
         icinga_username=dict(required=True, type="str"),
         icinga_password=dict(required=True, type="str", no_log=True),
         hostname=dict(required=False, aliases=["name"]),
@@ -62,6 +129,12 @@ def main():
         service=dict(required=False, type="str"),
         services=dict(required=False, type="list", elements="str"),
         validate_certs=dict(default=True, type="bool"),
+        profile=dict(required=False, type="str"),
+        rate_limit=dict(required=False, type="dict", options=dict(
+            rate=dict(required=True, type="float"),
+            burst=dict(required=False, default=1, type="int"),
+            state_file=dict(required=False, type="str"),
+        )),
     )
 
     result = dict(
@@ -74,10 +147,12 @@ def main():
 
     module = AnsibleModule(
         argument_spec=argument_spec,
-        supports_check_mode=False
+        supports_check_mode=True
     )
+    enable_profiling(module.params.get("profile"))
 
     icinga_server = module.params.get("icinga_server")
+    read_strategy = module.params.get("read_strategy")
     icinga_username = module.params.get("icinga_username")
     icinga_password = module.params.get("icinga_password")
     hostname = module.params.get("hostname")
@@ -85,12 +160,17 @@ def main():
     service = module.params.get("service")
     services = module.params.get("services")
     validate_certs = module.params.get("validate_certs")
+    rate_limit = module.params.get("rate_limit") or {}
 
     # validate_certs = module.params.get("validate_certs")
     if hostname and hostgroup:
         module.fail_json(
             "Specify hostname/name or hostgroup")
 
+    if not hostname and not hostgroup:
+        module.fail_json(
+            "Specify hostname/name or hostgroup")
+
     if service and services:
         module.fail_json(
             "Specify service or services, both are not supported")
@@ -103,33 +183,51 @@ def main():
         LC_MESSAGES="C.UTF-8", LC_CTYPE="C.UTF-8"
     )
 
-    if not icinga_server.startswith("https://"):
+    if not all(_server.startswith("https://") for _server in icinga_server):
         module.fail_json('Server must be https://<servername>')
 
     icinga_client = IcingaMiniClass(module=module,
                                     url=icinga_server,
+                                    read_strategy=read_strategy,
                                     username=icinga_username,
-                                    password=icinga_password)
+                                    password=icinga_password,
+                                    validate_certs=validate_certs,
+                                    rate_limit=rate_limit.get("rate", 0),
+                                    rate_burst=rate_limit.get("burst", 1),
+                                    rate_limit_file=rate_limit.get("state_file"))
+    icinga_client.report_stats_on_failure()
 
     try:
-        status = icinga_client.get_host_status(
-            host=hostname,
-            service=service,
-        )
-
-        if status["changes"] > 0:
-            result['changed'] = True
-        result["message"] = status["changes_details"]
-        result["host_maintenance"] = status["host_maintenance"]
-        result["host_status"] = status["host_status"]
-        # result["services"] = status["services"]
+        if hostgroup:
+            # Hosts and services of the whole group with one request
+            status = icinga_client.get_host_service_states(
+                hostgroup=hostgroup,
+                service=service or "*",
+            )
+            result["hosts"] = status["hosts"]
+            result["services"] = status["services"]
+            result["message"] = f"{len(status['hosts'])} hosts, {len(status['services'])} services"
+        else:
+            status = icinga_client.get_host_status(
+                host=hostname,
+                service=service,
+            )
+
+            if status["changes"] > 0:
+                result['changed'] = True
+            result["message"] = status["changes_details"]
+            result["host_maintenance"] = status["host_maintenance"]
+            result["host_status"] = status["host_status"]
+            if service:
+                result["services"] = status["services"]
+                result["status"] = status["status"]
 
     except IcingaConnectionException as e:
         if e.customMessage:
             module.fail_json(msg=e.message)
         else:
             module.fail_json(
-                msg=f"Unable to connect to or find the Icinga URL {icinga_server}")
+                msg=f"Unable to connect to or find the Icinga URL {', '.join(icinga_server)}")
 
     except IcingaAuthenticationException:
         module.fail_json(
@@ -140,7 +238,7 @@ def main():
             module.fail_json(msg=e.message)
         else:
             module.fail_json(
-                msg=f"Unable to find the host {hostname}")
+                msg=f"Unable to find the host {hostname or hostgroup}")
         
     except IcingaFailedService as e:
         if e.customMessage:
@@ -150,6 +248,9 @@ def main():
                 msg=f"One or more services are down ({e.message})")
 
 
+    result["throttled_seconds"] = icinga_client.get_throttled_seconds()
+    result["icinga_stats"] = icinga_client.get_stats()
+    attach_profile(result)
     module.exit_json(**result)
 
 
@@ -7,6 +7,8 @@ from ansible.module_utils._text import to_text
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.urls import fetch_url, basic_auth_header
 from ansible_collections.rangeid.icinga.plugins.module_utils.time_utils import time_utils
+from ansible_collections.rangeid.icinga.plugins.module_utils.profiling import profiled, enable_profiling, \
+    attach_profile
 from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, \
     IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaFailedService, IcingaConnectionException
 
@@ -22,9 +24,21 @@ options:
     icinga_server:
         description:
         - The Icinga URL in the format https://<server> or
-          https://<server>:<port>/<context>
-        type: url
+          https://<server>:<port>/<context>, or a list
+          of URLs of the HA endpoints. Reads are spread across the healthy endpoints, writes go
+          to the first healthy one and fail over to the next
+        type: list
+        elements: str
         required: true
+    read_strategy:
+        description:
+        - how reads are spread when more endpoints are configured
+        type: choices
+        choices:
+        - round_robin
+        - latency
+        default: round_robin
+        required: false
     icinga_username:
         description:
         - The Icinga username
@@ -43,9 +57,71 @@ options:
         default: true
     hostname:
         description:
-        - Icinga host object name
+        - Icinga host object name, required if hostgroup or hosts are not set
         type: str
-        required: true
+        required: false
+    hosts:
+        description:
+        - list of per-host maintenance specs, the omitted values are taken from the
+          module options. Specs selecting only the host or all its services with the
+          same duration, message and child_hosts are scheduled with one request, the
+          other ones run in parallel. Only supported with maintenance enabled
+        type: list
+        elements: dict
+        required: false
+        suboptions:
+            hostname:
+                description:
+                - Icinga host object name
+                type: str
+                required: true
+            service:
+                description:
+                - glob, regexp (prefixed with ~) or name of involved services, all or '*' for
+                  all the services
+                type: str
+                required: false
+            services:
+                description:
+                - list of involved services, names, globs or regexps (prefixed with ~)
+                type: list
+                required: false
+            exclude_services:
+                description:
+                - list of names, globs or regexps (prefixed with ~) of services to leave out
+                type: list
+                required: false
+            message:
+                description:
+                - the maintenance message
+                type: str
+                required: false
+            duration:
+                description:
+                - the maintenance window in dhms format, eg. 1d, 30m 40s, 1h 30m
+                type: str
+                required: false
+            child_hosts:
+                description:
+                - schedule the downtime for the child hosts too
+                type: choices
+                choices:
+                - none
+                - triggered
+                - non_triggered
+                required: false
+    concurrency:
+        description:
+        - with hosts, maximum number of requests in flight at the same time
+        type: int
+        default: 4
+        required: false
+    hostgroup:
+        description:
+        - Icinga hostgroup name, all its hosts and their services are involved with a
+          single request. Services selections and check_before are not supported
+        type: str
+        required: false
     maintenance:
         description:
         - The state of the maintenance mode
@@ -57,13 +133,18 @@ options:
         required: false
     service:
         description:
-        - regexp or name of involved services. If omitted, only the host will be configured. If all or '*', all services will 
-          be set in maintenance mode
+        - glob, regexp (prefixed with ~) or name of involved services. If omitted, only the host will be configured.
+          If all or '*', all services will be set in maintenance mode
         type: str
         required: false
     services:
         description:
-        - list of involved services
+        - list of involved services, names, globs or regexps (prefixed with ~)
+        type: list
+        required: false
+    exclude_services:
+        description:
+        - list of names, globs or regexps (prefixed with ~) of services to leave out of the selection
         type: list
         required: false
     message:
@@ -76,6 +157,18 @@ options:
         - the maintenance window in dhms format, eg. 1d, 30m 40s, 1h 30m
         type: str
         required: false
+    child_hosts:
+        description:
+        - schedule the downtime for the child hosts too, so Icinga covers the whole
+          dependency subtree with a single request. With triggered the child downtimes
+          start when the parent one starts
+        type: choices
+        choices:
+        - none
+        - triggered
+        - non_triggered
+        default: none
+        required: false
     check_before:
         description:
         - all about checking the services before operations
@@ -104,12 +197,98 @@ options:
                 type: int
                 default: 10
                 required: false
+    wait_active:
+        description:
+        - with maintenance enabled, return only when the downtimes are active on the
+          host and on the involved services, e.g. after the config sync across zones
+        suboptions:
+            enabled:
+                description:
+                - wait for the downtimes to be active
+                type: bool
+                default: false
+                required: false
+            timeout:
+                description:
+                - maximum seconds to wait, a warning is emitted if the downtimes are still
+                  not active
+                type: int
+                default: 30
+                required: false
+    verify_after:
+        description:
+        - with maintenance disabled, check all the services of the hosts again after the
+          downtimes are removed and wait for them to be OK
+        suboptions:
+            enabled:
+                description:
+                - verify the services after unsetting maintenance
+                type: bool
+                default: false
+                required: false
+            timeout:
+                description:
+                - seconds to wait for all the services to recover, the module fails if
+                  one or more are still not OK
+                type: int
+                default: 60
+                required: false
+    chunk_size:
+        description:
+        - maximum number of targets sent in a single request, larger target lists are
+          split in chunks sent in parallel
+        type: int
+        default: 500
+        required: false
+    chunk_concurrency:
+        description:
+        - maximum number of chunks in flight at the same time
+        type: int
+        default: 4
+        required: false
+    profile:
+        description:
+        - profile the module run, the wall-clock time of startup, request build, network wait,
+          decode and post processing phases, the time spent in every client method and the
+          most expensive functions are written to this file, or returned in the profile result
+          key if set to result. The ICINGA_PROFILE environment variable does the same for every
+          module
+        type: str
+        required: false
+    rate_limit:
+        description:
+        - Client side token bucket limiting the requests sent to the Icinga API. The
+          bucket is shared by all the Ansible workers running on the same machine,
+          polling loops are slowed down instead of failing when throttled
+        type: dict
+        required: false
+        suboptions:
+            rate:
+                description:
+                - sustained number of requests per second
+                type: float
+                required: true
+            burst:
+                description:
+                - number of requests that can be sent back to back
+                type: int
+                default: 1
+                required: false
+            state_file:
+                description:
+                - path of the file holding the shared bucket state, defaults to a file
+                  in the temporary directory named after the Icinga URL
+                type: str
+                required: false
 """
 
 
+@profiled
 def main():
     argument_spec = dict(
-        icinga_server=dict(required=True, type="str"),
+        icinga_server=dict(required=True, type="list", elements="str"),
+        read_strategy=dict(default="round_robin", type="str",
+                           choices=["round_robin", "latency"]),
         icinga_username=dict(required=True, type="str"),
         icinga_password=dict(required=True, type="str", no_log=True),
         maintenance=dict(default="enabled", type="str",
@@ -117,16 +296,46 @@ def main():
         author=dict(default="Ansible", required=False, type="str"),
         service=dict(required=False, type="str"),
         services=dict(required=False, type="list", elements="str"),
+        exclude_services=dict(required=False, type="list", elements="str"),
         message=dict(required=False, type="str"),
         duration=dict(required=False, type="str"),
+        child_hosts=dict(default="none", type="str",
+                         choices=['none', 'triggered', 'non_triggered']),
         hostname=dict(required=False, aliases=["name"]),
+        hosts=dict(required=False, type="list", elements="dict", options=dict(
+            hostname=dict(required=True, type="str", aliases=["name"]),
+            service=dict(required=False, type="str"),
+            services=dict(required=False, type="list", elements="str"),
+            exclude_services=dict(required=False, type="list", elements="str"),
+            message=dict(required=False, type="str"),
+            duration=dict(required=False, type="str"),
+            child_hosts=dict(required=False, type="str",
+                             choices=['none', 'triggered', 'non_triggered']),
+        )),
+        concurrency=dict(default=4, type="int"),
         validate_certs=dict(default=True, type="bool"),
-        # hostgroup=dict(required=False),
+        chunk_size=dict(default=500, type="int"),
+        chunk_concurrency=dict(default=4, type="int"),
+        profile=dict(required=False, type="str"),
+        rate_limit=dict(required=False, type="dict", options=dict(
+            rate=dict(required=True, type="float"),
+            burst=dict(required=False, default=1, type="int"),
+            state_file=dict(required=False, type="str"),
+        )),
+        hostgroup=dict(required=False, type="str"),
         check_before=dict(required=False, type="dict", options=dict(
             enabled=dict(required=False, default=False, type="bool"),
             stop_on_failed_service=dict(required=False, default=False, type="bool"),
             retries=dict(required=False, default=0, type="int"),
             timeout=dict(required=False, default=10, type="int"),
+        )),
+        wait_active=dict(required=False, type="dict", options=dict(
+            enabled=dict(required=False, default=False, type="bool"),
+            timeout=dict(required=False, default=30, type="int"),
+        )),
+        verify_after=dict(required=False, type="dict", options=dict(
+            enabled=dict(required=False, default=False, type="bool"),
+            timeout=dict(required=False, default=60, type="int"),
         ))
 
         # validate_certs=dict(default=True, type="bool"),
@@ -141,22 +350,28 @@ def main():
 
     module = AnsibleModule(
         argument_spec=argument_spec,
-        supports_check_mode=False
+        supports_check_mode=True
     )
+    enable_profiling(module.params.get("profile"))
 
     hostname = module.params.get("hostname")
-    # hostgroup = module.params.get("hostgroup")
+    hostgroup = module.params.get("hostgroup")
+    hosts = module.params.get("hosts")
 
     icinga_server = module.params.get("icinga_server")
+    read_strategy = module.params.get("read_strategy")
     icinga_username = module.params.get("icinga_username")
     icinga_password = module.params.get("icinga_password")
     validate_certs = module.params.get("validate_certs")
+    rate_limit = module.params.get("rate_limit") or {}
     maintenance = module.params.get("maintenance")
     author = module.params.get("author")
     service = module.params.get("service")
     services = module.params.get("services")
+    exclude_services = module.params.get("exclude_services")
     message = module.params.get("message")
     duration = module.params.get("duration")
+    child_hosts = module.params.get("child_hosts")
     check_before_root = module.params.get("check_before", {})
     if check_before_root:
         check_before = check_before_root.get("enabled")
@@ -169,10 +384,33 @@ def main():
         check_retries = 0
         check_timeout = 10
 
-    # validate_certs = module.params.get("validate_certs")
-    # if hostname and hostgroup:
-    #     module.fail_json(
-    #         "Specify hostname/name or hostgroup")
+    wait_active_root = module.params.get("wait_active") or {}
+    wait_active = wait_active_root.get("enabled", False)
+    wait_timeout = wait_active_root.get("timeout", 30)
+
+    verify_after_root = module.params.get("verify_after") or {}
+    verify_after = verify_after_root.get("enabled", False)
+    verify_timeout = verify_after_root.get("timeout", 60)
+
+    if len([_option for _option in [hostname, hostgroup, hosts] if _option]) != 1:
+        module.fail_json(
+            "Specify hostname/name, hostgroup or hosts")
+
+    if hosts and maintenance == "disabled":
+        module.fail_json(
+            "hosts is only supported with maintenance=enabled")
+
+    if hostgroup and (service or services or exclude_services or check_before):
+        module.fail_json(
+            "Services selections and check_before are not supported with hostgroup")
+
+    if verify_after and maintenance == "enabled":
+        module.fail_json(
+            "verify_after is only supported with maintenance=disabled")
+
+    if wait_active and maintenance == "disabled":
+        module.fail_json(
+            "wait_active is only supported with maintenance=enabled")
         
     if service and services:
         module.fail_json(
@@ -183,26 +421,65 @@ def main():
         LC_MESSAGES="C.UTF-8", LC_CTYPE="C.UTF-8"
     )
     if maintenance == "enabled":
-        if not duration:
+        if not duration and not (hosts and all(_spec.get("duration") for _spec in hosts)):
             module.fail_json(
                 f"Duration is needed if maintainance={maintenance}")
 
+    duration_seconds = 0
     if duration:
         duration_seconds = time_utils.convert_duration(duration)
         if duration_seconds == 0:
             module.fail_json(f"Can't convert duration='{duration}'")
 
-    if not icinga_server.startswith("https://"):
+    if not all(_server.startswith("https://") for _server in icinga_server):
         module.fail_json('Server must be https://<servername>')
 
     icinga_client = IcingaMiniClass(module=module,
                                     url=icinga_server,
+                                    read_strategy=read_strategy,
                                     username=icinga_username,
                                     password=icinga_password,
-                                    validate_certs=validate_certs)
+                                    validate_certs=validate_certs,
+                                    rate_limit=rate_limit.get("rate", 0),
+                                    rate_burst=rate_limit.get("burst", 1),
+                                    rate_limit_file=rate_limit.get("state_file"),
+                                    chunk_size=module.params.get("chunk_size"),
+                                    chunk_concurrency=module.params.get("chunk_concurrency"))
+    icinga_client.report_stats_on_failure()
 
     if services is not None:
         service = services
+
+    # Per-host specs, the omitted values are taken from the module options
+    specs = []
+    for _spec in hosts or []:
+        _duration = _spec.get("duration") or duration
+        _duration_seconds = time_utils.convert_duration(_duration)
+        if _duration_seconds == 0:
+            module.fail_json(f"Can't convert duration='{_duration}' of host {_spec['hostname']}")
+        if _spec.get("service") and _spec.get("services"):
+            module.fail_json(f"Specify service or services for host {_spec['hostname']}, both are not supported")
+        _services = _spec.get("services") or _spec.get("service")
+        specs.append({
+            'host': _spec["hostname"],
+            'duration_seconds': _duration_seconds,
+            'services': _services if _services is not None else service,
+            'author': author,
+            'comment': _spec.get("message") or message,
+            'check_before': check_before,
+            'stop_on_failed_service': stop_on_failed_service,
+            'check_retries': check_retries,
+            'check_timeout': check_timeout,
+            'child_hosts': _spec.get("child_hosts") or child_hosts,
+            'exclude_services': _spec.get("exclude_services") or exclude_services,
+            'wait_active': wait_active,
+            'wait_timeout': wait_timeout
+        })
+
+    if module.check_mode:
+        # Only the reads are sent, the actions are returned in the plan
+        icinga_client.start_plan()
+
     try:
         params = {
             'host': hostname,
@@ -212,18 +489,71 @@ def main():
             'comment': message,
             'check_before': check_before,
             'stop_on_failed_service': stop_on_failed_service,
-            'check_retries': check_retries
+            'check_retries': check_retries,
+            'child_hosts': child_hosts,
+            'exclude_services': exclude_services,
+            'wait_active': wait_active,
+            'wait_timeout': wait_timeout
         }
 
-        if maintenance == "enabled":
+        if hostgroup and maintenance == "enabled":
+            status = icinga_client.schedule_hosts_downtime(
+                hostgroup=hostgroup,
+                duration_seconds=duration_seconds,
+                author=author,
+                comment=message or "Downtime",
+                child_hosts=child_hosts
+            )
+            if status["changes"] > 0:
+                result['changed'] = True
+            result["message"] = ", ".join([_object["status"] for _object in status["success"]])
+            result["objects"] = status["success"]
+            result["failed_objects"] = status["failed"]
+            if wait_active:
+                status["activation"] = icinga_client.wait_downtime_active(hostgroup=hostgroup,
+                                                                          timeout=wait_timeout)
+
+        if hosts:
+            status = icinga_client.set_maintenance_mode_many(
+                specs=specs,
+                concurrency=module.params.get("concurrency")
+            )
+            if status["changes"] > 0:
+                result['changed'] = True
+            result["hosts"] = status["hosts"]
+            result["message"] = f"{len(specs) - len(status['failed'])} of {len(specs)} hosts in maintenance, " \
+                                f"{status['groups']} grouped requests, {status['pooled']} hosts run in parallel"
+            for _name, _host in status["hosts"].items():
+                if _host.get("activation") and _host["activation"]["active"] is False:
+                    module.warn(f"Downtimes of {_name} still not active after {wait_timeout} seconds")
+            if len(status["failed"]) > 0:
+                _failed_list = ", ".join([f"{_name} ({status['hosts'][_name]['error']})"
+                                          for _name in status["failed"]])
+                module.fail_json(msg=f"Unable to set the maintenance of one or more hosts: {_failed_list}",
+                                 **result)
+
+        if hostgroup and maintenance == "disabled":
+            status = icinga_client.clear_hostgroup_maintenance_mode(
+                hostgroup=hostgroup,
+                verify_after=verify_after,
+                verify_timeout=verify_timeout
+            )
+            if status["changes"] > 0:
+                result['changed'] = True
+            result["message"] = ", ".join([_object["status"] for _object in status["success"]])
+            result["objects"] = status["success"]
+            result["failed_objects"] = status["failed"]
+
+        if hostname and maintenance == "enabled":
             status = icinga_client.set_maintenance_mode(**params)
 
             if status["changes"] > 0:
                 result['changed'] = True
             result["message"] = status["changes_details"]
             result["services"] = status["services"]
+            result["child_hosts"] = status["child_hosts"]
 
-        if maintenance == "disabled":
+        if hostname and maintenance == "disabled":
             # Currently services are not supported, all services will be disabled
             if service is not None:
                 module.fail_json('The module currently doesn\'t support services disabling maintenance')
@@ -233,7 +563,9 @@ def main():
                 services=service,
                 check_before=check_before,
                 check_timeout=check_timeout,
-                check_retries=check_retries
+                check_retries=check_retries,
+                verify_after=verify_after,
+                verify_timeout=verify_timeout
             )
 
             if status["changes"] > 0:
@@ -241,13 +573,27 @@ def main():
             result["message"] = status["changes_details"]
             result["services"] = status["services"]
 
+        if wait_active and maintenance == "enabled" and not hosts:
+            result["activation"] = status["activation"]
+            if status["activation"]["active"] is False:
+                module.warn(f"Downtimes still not active after {wait_timeout} seconds: "
+                            f"{', '.join(status['activation']['pending'])}")
+
+        if verify_after:
+            result["verify"] = status["verify"]
+            if status["verify"] and len(status["verify"]["failed"]) > 0:
+                _failed_list = ", ".join(status["verify"]["failed"])
+                module.fail_json(
+                    msg=f"One or more services are not OK after timeout of {verify_timeout} seconds: {_failed_list}",
+                    **result)
+
 
     except IcingaConnectionException as e:
         if e.customMessage:
             module.fail_json(msg=e.message)
         else:
             module.fail_json(
-                msg=f"Unable to connect to or find the Icinga URL {icinga_server}")
+                msg=f"Unable to connect to or find the Icinga URL {', '.join(icinga_server)}")
             
     except IcingaAuthenticationException:
         module.fail_json(
@@ -258,7 +604,7 @@ def main():
             module.fail_json(msg=e.message)
         else:
             module.fail_json(
-                msg=f"Unable to find the host {hostname}")
+                msg=f"Unable to find the host {hostname or hostgroup}")
 
     except IcingaFailedService as e:
         if e.customMessage:
@@ -267,6 +613,11 @@ def main():
             module.fail_json(
                 msg=f"One or more services are down ({e.message})")
 
+    if module.check_mode:
+        result["plan"] = icinga_client.get_plan()
+    result["throttled_seconds"] = icinga_client.get_throttled_seconds()
+    result["icinga_stats"] = icinga_client.get_stats()
+    attach_profile(result)
     module.exit_json(**result)
 
 
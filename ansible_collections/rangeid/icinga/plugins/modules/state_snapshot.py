@@ -0,0 +1,277 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+
+from __future__ import absolute_import, division, print_function
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.rangeid.icinga.plugins.module_utils.snapshot import IcingaSnapshot
+from ansible_collections.rangeid.icinga.plugins.module_utils.profiling import profiled, enable_profiling, \
+    attach_profile
+from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, \
+    IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaFailedService, IcingaConnectionException
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+module: state_snapshot
+author:
+- "Angelo Conforti (@angeloxx)"
+description: Capture host and service states to a snapshot file and compare them with a previous snapshot
+options:
+    icinga_server:
+        description:
+        - The Icinga URL in the format https://<server> or
+          https://<server>:<port>/<context>, or a list
+          of URLs of the HA endpoints. Reads are spread across the healthy endpoints, writes go
+          to the first healthy one and fail over to the next
+        type: list
+        elements: str
+        required: true
+    read_strategy:
+        description:
+        - how reads are spread when more endpoints are configured
+        type: choices
+        choices:
+        - round_robin
+        - latency
+        default: round_robin
+        required: false
+    icinga_username:
+        description:
+        - The Icinga username
+        type: str
+        required: true
+    icinga_password:
+        description:
+        - The Icinga user's password
+        type: str
+        required: true
+    validate_certs:
+        description:
+        - If set to False, SSL certificates will not be validated
+        type: bool
+        required: false
+        default: true
+    hostname:
+        description:
+        - Icinga host object name or list of names
+        type: list
+        required: false
+    hostgroup:
+        description:
+        - Icinga hostgroup name, all its hosts are involved
+        type: str
+        required: false
+    service:
+        description:
+        - glob pattern of involved services, all services by default
+        type: str
+        default: "*"
+        required: false
+    mode:
+        description:
+        - with snapshot the states are written to path, with diff the current states
+          are compared with the baseline snapshot (and written to path, if set)
+        type: choices
+        choices:
+        - snapshot
+        - diff
+        default: snapshot
+        required: false
+    path:
+        description:
+        - path of the snapshot file to write, required with mode=snapshot
+        type: path
+        required: false
+    baseline:
+        description:
+        - path of the snapshot to compare with, required with mode=diff
+        type: path
+        required: false
+    profile:
+        description:
+        - profile the module run, the wall-clock time of startup, request build, network wait,
+          decode and post processing phases, the time spent in every client method and the
+          most expensive functions are written to this file, or returned in the profile result
+          key if set to result. The ICINGA_PROFILE environment variable does the same for every
+          module
+        type: str
+        required: false
+    rate_limit:
+        description:
+        - Client side token bucket limiting the requests sent to the Icinga API. The
+          bucket is shared by all the Ansible workers running on the same machine
+        type: dict
+        required: false
+        suboptions:
+            rate:
+                description:
+                - sustained number of requests per second
+                type: float
+                required: true
+            burst:
+                description:
+                - number of requests that can be sent back to back
+                type: int
+                default: 1
+                required: false
+            state_file:
+                description:
+                - path of the file holding the shared bucket state
+                type: str
+                required: false
+"""
+
+
+@profiled
+def main():
+    argument_spec = dict(
+        icinga_server=dict(required=True, type="list", elements="str"),
+        read_strategy=dict(default="round_robin", type="str",
+                           choices=["round_robin", "latency"]),
+        icinga_username=dict(required=True, type="str"),
+        icinga_password=dict(required=True, type="str", no_log=True),
+        hostname=dict(required=False, type="list", elements="str", aliases=["name"]),
+        hostgroup=dict(required=False, type="str"),
+        service=dict(default="*", type="str"),
+        mode=dict(default="snapshot", type="str",
+                  choices=['snapshot', 'diff']),
+        path=dict(required=False, type="path"),
+        baseline=dict(required=False, type="path"),
+        validate_certs=dict(default=True, type="bool"),
+        profile=dict(required=False, type="str"),
+        rate_limit=dict(required=False, type="dict", options=dict(
+            rate=dict(required=True, type="float"),
+            burst=dict(required=False, default=1, type="int"),
+            state_file=dict(required=False, type="str"),
+        )),
+    )
+
+    result = dict(
+        changed=False,
+        original_message='',
+        message=''
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        supports_check_mode=False
+    )
+    enable_profiling(module.params.get("profile"))
+
+    icinga_server = module.params.get("icinga_server")
+    read_strategy = module.params.get("read_strategy")
+    icinga_username = module.params.get("icinga_username")
+    icinga_password = module.params.get("icinga_password")
+    validate_certs = module.params.get("validate_certs")
+    rate_limit = module.params.get("rate_limit") or {}
+    hostname = module.params.get("hostname")
+    hostgroup = module.params.get("hostgroup")
+    service = module.params.get("service")
+    mode = module.params.get("mode")
+    path = module.params.get("path")
+    baseline = module.params.get("baseline")
+
+    if hostname and hostgroup:
+        module.fail_json(
+            "Specify hostname/name or hostgroup")
+
+    if not hostname and not hostgroup:
+        module.fail_json(
+            "Specify hostname/name or hostgroup")
+
+    if mode == "snapshot" and not path:
+        module.fail_json(
+            f"Path is needed if mode={mode}")
+
+    if mode == "diff" and not baseline:
+        module.fail_json(
+            f"Baseline is needed if mode={mode}")
+
+    if hostname is not None and len(hostname) == 1:
+        hostname = hostname[0]
+
+    if not all(_server.startswith("https://") for _server in icinga_server):
+        module.fail_json('Server must be https://<servername>')
+
+    icinga_client = IcingaMiniClass(module=module,
+                                    url=icinga_server,
+                                    read_strategy=read_strategy,
+                                    username=icinga_username,
+                                    password=icinga_password,
+                                    validate_certs=validate_certs,
+                                    rate_limit=rate_limit.get("rate", 0),
+                                    rate_burst=rate_limit.get("burst", 1),
+                                    rate_limit_file=rate_limit.get("state_file"))
+    icinga_client.report_stats_on_failure()
+
+    try:
+        table = icinga_client.get_state_table(
+            host=hostname,
+            hostgroup=hostgroup,
+            service=service
+        )
+        result["host_states"] = table.count_by_state(kind="h")
+        result["service_states"] = table.count_by_state(kind="s")
+        records = table.records()
+        scope = dict(
+            hostname=hostname,
+            hostgroup=hostgroup,
+            service=service
+        )
+
+        if mode == "snapshot":
+            status = IcingaSnapshot.write(path=path, records=records, scope=scope)
+            result['changed'] = True
+            result["path"] = path
+            result["hosts"] = status["hosts"]
+            result["services"] = status["services"]
+            result["message"] = f"Snapshot of {status['hosts']} hosts and {status['services']} services written to {path}"
+
+        if mode == "diff":
+            # Compared before the current states are written, path may be the baseline itself
+            status = IcingaSnapshot.diff(baseline_path=baseline, records=records)
+            result.update(status)
+            if path:
+                IcingaSnapshot.write(path=path, records=table.records(), scope=scope)
+                result['changed'] = True
+            result["message"] = (f"{len(status['regressions'])} regressions, {len(status['recoveries'])} recoveries, "
+                                 f"{len(status['new'])} new and {len(status['removed'])} removed objects")
+
+    except (IOError, ValueError) as e:
+        module.fail_json(msg=f"Unable to use the snapshot file: {e}")
+
+    except IcingaConnectionException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"Unable to connect to or find the Icinga URL {', '.join(icinga_server)}")
+
+    except IcingaAuthenticationException:
+        module.fail_json(
+            msg=f"Authentication error, please double check the '{icinga_username}' user")
+
+    except IcingaNoSuchObjectException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"Unable to find the host {hostname or hostgroup}")
+
+    except IcingaFailedService as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"One or more services are down ({e.message})")
+
+    result["throttled_seconds"] = icinga_client.get_throttled_seconds()
+    result["icinga_stats"] = icinga_client.get_stats()
+    attach_profile(result)
+    module.exit_json(**result)
+
+
+if __name__ == "__main__":
+    main()
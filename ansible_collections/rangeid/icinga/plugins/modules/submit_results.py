@@ -0,0 +1,257 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+
+from __future__ import absolute_import, division, print_function
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.rangeid.icinga.plugins.module_utils.profiling import profiled, enable_profiling, \
+    attach_profile
+from ansible_collections.rangeid.icinga.plugins.module_utils.minicinga2 import IcingaMiniClass, \
+    IcingaAuthenticationException, IcingaNoSuchObjectException, IcingaFailedService, IcingaConnectionException
+
+__metaclass__ = type
+
+DOCUMENTATION = """
+---
+module: submit_results
+author:
+- "Angelo Conforti (@angeloxx)"
+description: Submit passive check results for many hosts and services
+options:
+    icinga_server:
+        description:
+        - The Icinga URL in the format https://<server> or
+          https://<server>:<port>/<context>, or a list
+          of URLs of the HA endpoints. Reads are spread across the healthy endpoints, writes go
+          to the first healthy one and fail over to the next
+        type: list
+        elements: str
+        required: true
+    read_strategy:
+        description:
+        - how reads are spread when more endpoints are configured
+        type: choices
+        choices:
+        - round_robin
+        - latency
+        default: round_robin
+        required: false
+    icinga_username:
+        description:
+        - The Icinga username
+        type: str
+        required: true
+    icinga_password:
+        description:
+        - The Icinga user's password
+        type: str
+        required: true
+    validate_certs:
+        description:
+        - If set to False, SSL certificates will not be validated
+        type: bool
+        required: false
+        default: true
+    results:
+        description:
+        - list of check results, identical entries are submitted once
+        type: list
+        elements: dict
+        required: true
+        suboptions:
+            host:
+                description:
+                - Icinga host object name
+                type: str
+                required: true
+            service:
+                description:
+                - Icinga service name, if omitted the result is submitted for the host
+                type: str
+                required: false
+            exit_status:
+                description:
+                - the check exit status, 0-3 for services and 0-1 for hosts
+                type: int
+                required: true
+            output:
+                description:
+                - the check plugin output
+                type: str
+                required: false
+            perfdata:
+                description:
+                - list of performance data strings
+                type: list
+                elements: str
+                required: false
+    concurrency:
+        description:
+        - maximum number of submissions in flight at the same time
+        type: int
+        default: 4
+        required: false
+    profile:
+        description:
+        - profile the module run, the wall-clock time of startup, request build, network wait,
+          decode and post processing phases, the time spent in every client method and the
+          most expensive functions are written to this file, or returned in the profile result
+          key if set to result. The ICINGA_PROFILE environment variable does the same for every
+          module
+        type: str
+        required: false
+    rate_limit:
+        description:
+        - Client side token bucket limiting the requests sent to the Icinga API. The
+          bucket is shared by all the Ansible workers running on the same machine
+        type: dict
+        required: false
+        suboptions:
+            rate:
+                description:
+                - sustained number of requests per second
+                type: float
+                required: true
+            burst:
+                description:
+                - number of requests that can be sent back to back
+                type: int
+                default: 1
+                required: false
+            state_file:
+                description:
+                - path of the file holding the shared bucket state
+                type: str
+                required: false
+"""
+
+
+@profiled
+def main():
+    argument_spec = dict(
+        icinga_server=dict(required=True, type="list", elements="str"),
+        read_strategy=dict(default="round_robin", type="str",
+                           choices=["round_robin", "latency"]),
+        icinga_username=dict(required=True, type="str"),
+        icinga_password=dict(required=True, type="str", no_log=True),
+        results=dict(required=True, type="list", elements="dict", options=dict(
+            host=dict(required=True, type="str"),
+            service=dict(required=False, type="str"),
+            exit_status=dict(required=True, type="int"),
+            output=dict(required=False, default="", type="str"),
+            perfdata=dict(required=False, default=[], type="list", elements="str"),
+        )),
+        concurrency=dict(default=4, type="int"),
+        validate_certs=dict(default=True, type="bool"),
+        profile=dict(required=False, type="str"),
+        rate_limit=dict(required=False, type="dict", options=dict(
+            rate=dict(required=True, type="float"),
+            burst=dict(required=False, default=1, type="int"),
+            state_file=dict(required=False, type="str"),
+        )),
+    )
+
+    result = dict(
+        changed=False,
+        original_message='',
+        message='',
+        objects=[],
+        failed_objects=[]
+    )
+
+    module = AnsibleModule(
+        argument_spec=argument_spec,
+        supports_check_mode=True
+    )
+    enable_profiling(module.params.get("profile"))
+
+    icinga_server = module.params.get("icinga_server")
+    read_strategy = module.params.get("read_strategy")
+    icinga_username = module.params.get("icinga_username")
+    icinga_password = module.params.get("icinga_password")
+    validate_certs = module.params.get("validate_certs")
+    rate_limit = module.params.get("rate_limit") or {}
+    results = module.params.get("results")
+    concurrency = module.params.get("concurrency")
+
+    if concurrency < 1:
+        module.fail_json(f"Concurrency must be at least 1, got {concurrency}")
+
+    if not all(_server.startswith("https://") for _server in icinga_server):
+        module.fail_json('Server must be https://<servername>')
+
+    icinga_client = IcingaMiniClass(module=module,
+                                    url=icinga_server,
+                                    read_strategy=read_strategy,
+                                    username=icinga_username,
+                                    password=icinga_password,
+                                    validate_certs=validate_certs,
+                                    rate_limit=rate_limit.get("rate", 0),
+                                    rate_burst=rate_limit.get("burst", 1),
+                                    rate_limit_file=rate_limit.get("state_file"),
+                                    pool_size=concurrency)
+    icinga_client.report_stats_on_failure()
+
+    if module.check_mode:
+        # Only the reads are sent, the actions are returned in the plan
+        icinga_client.start_plan()
+
+    try:
+        status = icinga_client.submit_check_results(
+            results=results,
+            concurrency=concurrency
+        )
+
+        if len(status["success"]) > 0:
+            result['changed'] = True
+        result["objects"] = status["success"]
+        result["failed_objects"] = status["failed"]
+        result["submitted"] = status["submitted"]
+        result["collapsed"] = status["collapsed"]
+        result["elapsed_seconds"] = status["elapsed_seconds"]
+        result["throughput"] = status["throughput"]
+        result["message"] = (f"Submitted {status['submitted']} results "
+                             f"({status['collapsed']} duplicates collapsed) "
+                             f"at {status['throughput']} results/s")
+
+        if len(status["failed"]) > 0:
+            _failed_list = ", ".join(
+                [f"{_object['host']}!{_object['service']}".rstrip("!") for _object in status["failed"]])
+            module.fail_json(msg=f"Unable to submit one or more results: {_failed_list}",
+                             **result)
+
+    except IcingaConnectionException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"Unable to connect to or find the Icinga URL {', '.join(icinga_server)}")
+
+    except IcingaAuthenticationException:
+        module.fail_json(
+            msg=f"Authentication error, please double check the '{icinga_username}' user")
+
+    except IcingaNoSuchObjectException as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg="Unable to find one or more objects")
+
+    except IcingaFailedService as e:
+        if e.customMessage:
+            module.fail_json(msg=e.message)
+        else:
+            module.fail_json(
+                msg=f"One or more services are down ({e.message})")
+
+    if module.check_mode:
+        result["plan"] = icinga_client.get_plan()
+    result["throttled_seconds"] = icinga_client.get_throttled_seconds()
+    result["icinga_stats"] = icinga_client.get_stats()
+    attach_profile(result)
+    module.exit_json(**result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+"""Compare the JSON codecs on the responses of the fake Icinga server.
+
+A services query with all the attributes is read once from the fake server,
+then, for every installed backend selected through ICINGA_JSON_CODEC as the
+modules do, the response is decoded and the request body encoded repeats
+times. Backends that are not installed are reported and skipped.
+
+    python3 test/benchmark_json_codec.py --hosts 2000 --services 20 --repeats 5
+"""
+
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..")))
+
+from ansible_collections.rangeid.icinga.plugins.module_utils import json_codec  # noqa: E402
+from ansible_collections.rangeid.icinga.test import fake_icinga_server  # noqa: E402
+
+
+def fetch(url: str, path: str, data: dict):
+    _request = urllib.request.Request(
+        url=f"{url}{path}",
+        data=json.dumps(data).encode("utf-8"),
+        headers={
+            "Authorization": "Basic " + base64.b64encode(b"bench:bench").decode("ascii"),
+            "Accept": "application/json",
+            "X-HTTP-Method-Override": "GET"
+        },
+        method="POST"
+    )
+    with urllib.request.urlopen(_request) as _response:
+        return _response.read()
+
+
+def measure(backend: str, content: bytes, body: dict, repeats: int):
+    os.environ["ICINGA_JSON_CODEC"] = backend
+    _codec = json_codec.codec_from_environment()
+    if _codec.name != backend:
+        return None
+
+    _decode = []
+    _encode = []
+    for _ in range(repeats):
+        _start = time.perf_counter()
+        _decoded = _codec.loads(content)
+        _decode.append(time.perf_counter() - _start)
+        _start = time.perf_counter()
+        _codec.dumps(body)
+        _encode.append(time.perf_counter() - _start)
+    return {
+        "backend": backend,
+        "objects": len(_decoded["results"]),
+        "decode_ms": round(min(_decode) * 1000, 2),
+        "encode_ms": round(min(_encode) * 1000, 3)
+    }
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    _parser.add_argument("--hosts", type=int, default=1000)
+    _parser.add_argument("--services", type=int, default=20)
+    _parser.add_argument("--repeats", type=int, default=5)
+    _args = _parser.parse_args()
+
+    _server, _url, _icinga = fake_icinga_server.start(hosts=_args.hosts, services=_args.services)
+    _body = {
+        "type": "Service",
+        "filter": "host.name in t_hosts",
+        "filter_vars": {"t_hosts": list(_icinga.hosts)}
+    }
+    _content = fetch(_url, "/v1/objects/services", _body)
+    _server.shutdown()
+    print(f"Response of {len(_content) / 1048576:.1f} MB, best of {_args.repeats} runs")
+
+    _results = []
+    for _backend in [_backend for _backend in json_codec.IcingaJsonCodec.BACKENDS if _backend != "auto"]:
+        _result = measure(_backend, _content, _body, _args.repeats)
+        if _result is None:
+            print(f"{_backend:8} not installed")
+            continue
+        _results.append(_result)
+        print(f"{_backend:8} decode {_result['decode_ms']:>9} ms  encode {_result['encode_ms']:>8} ms  "
+              f"({_result['objects']} objects)")
+
+    if len(_results) > 1:
+        _baseline = [_result for _result in _results if _result["backend"] == "json"][0]
+        for _result in _results:
+            if _result["backend"] != "json":
+                print(f"{_result['backend']} decodes {_baseline['decode_ms'] / max(_result['decode_ms'], 0.001):.1f}x "
+                      f"faster than json")
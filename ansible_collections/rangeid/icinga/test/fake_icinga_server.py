@@ -0,0 +1,474 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright: (c) 2023, Angelo Conforti (angeloxx@angeloxx.it)
+"""Minimal in-memory Icinga API used to exercise the clients without a real master.
+
+Only the subset of the API used by the collection is implemented: the objects
+queries of hosts, services and downtimes (by name, plural names or filter, with
+attrs projection and host joins) and the reschedule-check, schedule-downtime,
+remove-downtime, acknowledge-problem, remove-acknowledgement and
+process-check-result actions. Filters are evaluated, with their filter_vars, by
+a small interpreter of the Icinga DSL subset the clients send: ==, !=, <, <=,
+>, >=, in, !, &&, ||, parentheses, match() and regex().
+
+    python3 test/fake_icinga_server.py --port 5665 --hosts 500 --services 20
+
+then point the clients to http://127.0.0.1:5665.
+"""
+
+import argparse
+import collections
+import fnmatch
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class FakeFilter():
+    """Parse and evaluate an Icinga filter expression."""
+
+    TOKENS = re.compile(r'\s*(?:(\d+(?:\.\d+)?)|"((?:[^"\\]|\\.)*)"|(&&|\|\||==|!=|<=|>=|[<>!(),])|([A-Za-z_][\w.]*))')
+    # Binary operators by increasing precedence
+    LEVELS = [["||"], ["&&"], ["==", "!=", "<", "<=", ">", ">=", "in"]]
+
+    def __init__(self, expression: str):
+        self.tokens = []
+        _position = 0
+        _expression = expression.strip()
+        while _position < len(_expression):
+            _match = self.TOKENS.match(_expression, _position)
+            if _match is None or _match.end() == _position:
+                raise ValueError(f"Invalid filter at {_expression[_position:]}")
+            _number, _string, _operator, _name = _match.groups()
+            if _number is not None:
+                self.tokens.append(("value", float(_number) if "." in _number else int(_number)))
+            elif _string is not None:
+                self.tokens.append(("value", _string.replace('\\"', '"')))
+            elif _operator is not None:
+                self.tokens.append(("op", _operator))
+            elif _name == "in":
+                self.tokens.append(("op", "in"))
+            elif _name in ["true", "false"]:
+                self.tokens.append(("value", _name == "true"))
+            else:
+                self.tokens.append(("name", _name))
+            _position = _match.end()
+        self._index = 0
+        self.tree = self._parse(0)
+        if self._index != len(self.tokens):
+            raise ValueError(f"Unexpected {self.tokens[self._index][1]} in filter")
+
+    def _peek(self):
+        return self.tokens[self._index] if self._index < len(self.tokens) else (None, None)
+
+    def _next(self):
+        _token = self._peek()
+        self._index = self._index + 1
+        return _token
+
+    def _expect(self, operator: str):
+        if self._next() != ("op", operator):
+            raise ValueError(f"Expected {operator} in filter")
+
+    def _parse(self, level: int):
+        if level == len(self.LEVELS):
+            return self._unary()
+        _left = self._parse(level + 1)
+        while self._peek()[0] == "op" and self._peek()[1] in self.LEVELS[level]:
+            _operator = self._next()[1]
+            _left = ("binary", _operator, _left, self._parse(level + 1))
+        return _left
+
+    def _unary(self):
+        _kind, _value = self._next()
+        if (_kind, _value) == ("op", "!"):
+            return ("not", self._unary())
+        if (_kind, _value) == ("op", "("):
+            _node = self._parse(0)
+            self._expect(")")
+            return _node
+        if _kind == "value":
+            return ("value", _value)
+        if _kind == "name" and self._peek() == ("op", "("):
+            self._next()
+            _arguments = []
+            while self._peek() != ("op", ")"):
+                _arguments.append(self._parse(0))
+                if self._peek() == ("op", ","):
+                    self._next()
+            self._expect(")")
+            return ("call", _value, _arguments)
+        if _kind == "name":
+            return ("name", _value)
+        raise ValueError(f"Unexpected {_value} in filter")
+
+    def evaluate(self, context: dict, filter_vars: dict):
+        """
+        Evaluate the filter on one object.
+
+        Args:
+            context (dict): The objects reachable by the filter, e.g. {"host": attrs, "service": attrs}.
+            filter_vars (dict): The filter_vars of the request.
+
+        Returns:
+            bool: Whether the object matches.
+        """
+        return bool(self._evaluate(self.tree, context, filter_vars))
+
+    def _evaluate(self, node, context: dict, filter_vars: dict):
+        _kind = node[0]
+        if _kind == "value":
+            return node[1]
+        if _kind == "name":
+            if node[1] in filter_vars:
+                return filter_vars[node[1]]
+            _object, _, _attr = node[1].partition(".")
+            return context.get(_object, {}).get(_attr)
+        if _kind == "not":
+            return not self._evaluate(node[1], context, filter_vars)
+        if _kind == "call":
+            _arguments = [self._evaluate(_argument, context, filter_vars) for _argument in node[2]]
+            if node[1] == "match":
+                return fnmatch.fnmatchcase(str(_arguments[1]), str(_arguments[0]))
+            if node[1] == "regex":
+                return re.search(str(_arguments[0]), str(_arguments[1])) is not None
+            raise ValueError(f"Unknown function {node[1]}")
+
+        _operator = node[1]
+        if _operator == "&&":
+            return self._evaluate(node[2], context, filter_vars) and self._evaluate(node[3], context, filter_vars)
+        if _operator == "||":
+            return self._evaluate(node[2], context, filter_vars) or self._evaluate(node[3], context, filter_vars)
+        _left = self._evaluate(node[2], context, filter_vars)
+        _right = self._evaluate(node[3], context, filter_vars)
+        if _operator == "in":
+            return _left in (_right or [])
+        if _operator == "==":
+            return _left == _right
+        if _operator == "!=":
+            return _left != _right
+        if _left is None or _right is None:
+            return False
+        return {"<": _left < _right, "<=": _left <= _right, ">": _left > _right, ">=": _left >= _right}[_operator]
+
+
+class FakeIcinga():
+    TYPES = {"hosts": "Host", "services": "Service", "downtimes": "Downtime"}
+
+    def __init__(self, hosts: int = 10, services: int = 5, latency: float = 0.0):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.hosts = {}
+        self.services = {}
+        self.downtimes = {}
+        _now = time.time()
+        for _index in range(hosts):
+            _host = f"host{_index:05d}"
+            self.hosts[_host] = self._checkable(_host, _now, {
+                "display_name": _host,
+                "address": f"10.0.{_index // 250}.{_index % 250 + 1}",
+                "groups": ["all", f"group{_index % 10}"]
+            })
+            for _service in range(services):
+                _name = f"service{_service:03d}"
+                self.services[f"{_host}!{_name}"] = self._checkable(_name, _now, {
+                    "display_name": _name,
+                    "host_name": _host,
+                    "groups": []
+                })
+
+    @staticmethod
+    def _checkable(name: str, now: float, attrs: dict):
+        _attrs = {
+            "__name": name if "host_name" not in attrs else f"{attrs['host_name']}!{name}",
+            "name": name,
+            "state": 0,
+            "last_state": 0,
+            "last_check": now,
+            "last_state_change": now,
+            "downtime_depth": 0,
+            "acknowledgement": 0,
+            "enable_active_checks": True,
+            "version": 0
+        }
+        _attrs.update(attrs)
+        return _attrs
+
+    def _context(self, object_type: str, attrs: dict):
+        # What a filter can reach from an object: itself and its host and service
+        if object_type == "Host":
+            return {"host": attrs}
+        if object_type == "Service":
+            return {"service": attrs, "host": self.hosts.get(attrs["host_name"], {})}
+        _service = self.services.get(f"{attrs['host_name']}!{attrs['service_name']}", {})
+        return {"downtime": attrs, "host": self.hosts.get(attrs["host_name"], {}), "service": _service}
+
+    def _collection(self, object_type: str):
+        return {"Host": self.hosts, "Service": self.services, "Downtime": self.downtimes}[object_type]
+
+    def _select(self, object_type: str, data: dict):
+        """
+        Return the full names of the objects selected by a request body.
+
+        Returns:
+            tuple: The names, and an error message if a named object does not exist.
+        """
+        _objects = self._collection(object_type)
+        _key = object_type.lower()
+        if data.get(_key) or data.get(f"{_key}s"):
+            _names = [data[_key]] if data.get(_key) else list(data[f"{_key}s"])
+            _missing = [_name for _name in _names if _name not in _objects]
+            if len(_missing) > 0:
+                return [], f"Object '{_missing[0]}' of type '{object_type}' does not exist."
+            return _names, None
+
+        if not data.get("filter"):
+            return list(_objects), None
+
+        try:
+            _filter = FakeFilter(data["filter"])
+        except ValueError as e:
+            return [], f"Invalid filter: {e}"
+        _vars = data.get("filter_vars", {})
+        return [_name for _name, _attrs in list(_objects.items())
+                if _filter.evaluate(self._context(object_type, _attrs), _vars)], None
+
+    def _refresh_depths(self):
+        _depths = collections.Counter(
+            "!".join([_part for _part in [_downtime["host_name"], _downtime["service_name"]] if _part])
+            for _downtime in self.downtimes.values())
+        for _objects in [self.hosts, self.services]:
+            for _name, _attrs in _objects.items():
+                _attrs["downtime_depth"] = _depths.get(_name, 0)
+
+    def _objects(self, object_type: str, data: dict):
+        _names, _error = self._select(object_type, data)
+        if _error is not None:
+            return 404, {"error": 404, "status": _error}
+
+        # Unlike the actions, a query whose filter matches nothing is not an error
+        _objects = self._collection(object_type)
+        _attrs = data.get("attrs")
+        _joins = data.get("joins") or []
+        _results = []
+        for _name in _names:
+            _object = _objects[_name]
+            _result = {
+                "name": _name,
+                "type": object_type,
+                "attrs": {_attr: _object.get(_attr) for _attr in _attrs} if _attrs else dict(_object)
+            }
+            if len(_joins) > 0:
+                _context = self._context(object_type, _object)
+                _result["joins"] = {}
+                for _join in _joins:
+                    _target, _, _attr = _join.partition(".")
+                    _joined = _result["joins"].setdefault(_target, {})
+                    if _attr:
+                        _joined[_attr] = _context.get(_target, {}).get(_attr)
+                    else:
+                        _joined.update(_context.get(_target, {}))
+            _results.append(_result)
+        return 200, {"results": _results}
+
+    def handle(self, path: str, method: str, data: dict):
+        _url = urlparse(path)
+        _parts = [unquote(_part) for _part in _url.path.split("/") if _part]
+        with self.lock:
+            self._refresh_depths()
+
+            if len(_parts) >= 3 and _parts[:2] == ["v1", "objects"] and _parts[2] in self.TYPES:
+                _type = self.TYPES[_parts[2]]
+                if len(_parts) > 3:
+                    # /v1/objects/hosts/<name>?attrs=..., as sent by get_host_status
+                    data = dict(data, **{_type.lower(): "!".join(_parts[3:])})
+                    _query = parse_qs(_url.query).get("attrs")
+                    if _query:
+                        data["attrs"] = _query
+                return self._objects(_type, data)
+
+            if _url.path == "/v1/actions/reschedule-check":
+                return self._reschedule_check(data)
+            if _url.path == "/v1/actions/schedule-downtime":
+                return self._schedule_downtime(data)
+            if _url.path == "/v1/actions/remove-downtime":
+                return self._remove_downtime(data)
+            if _url.path == "/v1/actions/acknowledge-problem":
+                return self._acknowledge(data, 1 if not data.get("sticky") else 2,
+                                         "Successfully acknowledged problem for object '{}'.")
+            if _url.path == "/v1/actions/remove-acknowledgement":
+                return self._acknowledge(data, 0, "Successfully removed acknowledgement for object '{}'.")
+            if _url.path == "/v1/actions/process-check-result":
+                return self._process_check_result(data)
+
+        return 404, {"error": 404, "status": f"No such path {path}"}
+
+    def _targets(self, data: dict):
+        _type = data.get("type", "Host")
+        if _type not in ["Host", "Service"]:
+            return [], f"Invalid type {_type}"
+        return self._select(_type, data)
+
+    def _reschedule_check(self, data: dict):
+        # Checks run at once: a forced reschedule refreshes last_check
+        _names, _error = self._targets(data)
+        if _error is not None:
+            return 404, {"error": 404, "status": _error}
+        _objects = self._collection(data.get("type", "Host"))
+        _now = time.time()
+        for _name in _names:
+            if _objects[_name]["enable_active_checks"] or data.get("force"):
+                _objects[_name]["last_check"] = _now
+        return self._action_results(_names, "Successfully rescheduled check for object '{}'.")
+
+    def _add_downtime(self, host: str, service: str, data: dict):
+        _id = f"{uuid.uuid4()}"
+        _name = "!".join([_part for _part in [host, service, _id] if _part])
+        _now = time.time()
+        self.downtimes[_name] = {
+            "__name": _name,
+            "name": _id,
+            "host_name": host,
+            "service_name": service,
+            "author": data.get("author", ""),
+            "comment": data.get("comment", ""),
+            "entry_time": _now,
+            "start_time": data.get("start_time", _now),
+            "end_time": data.get("end_time", 0),
+            "duration": data.get("duration", 0),
+            "fixed": data.get("fixed", True),
+            "was_cancelled": False
+        }
+        return _name
+
+    def _schedule_downtime(self, data: dict):
+        _names, _error = self._targets(data)
+        if _error is not None:
+            return 404, {"error": 404, "status": _error}
+        if len(_names) == 0:
+            return 404, {"error": 404, "status": "No objects found."}
+
+        _results = []
+        for _name in _names:
+            _host, _, _service = _name.partition("!")
+            _result = {
+                "code": 200,
+                "name": self._add_downtime(_host, _service, data),
+                "status": f"Successfully scheduled downtime for object '{_name}'."
+            }
+            if data.get("type", "Host") == "Host" and str(data.get("all_services")) in ["1", "True", "true"]:
+                _result["service_downtimes"] = [
+                    self._add_downtime(_host, _attrs["name"], data)
+                    for _attrs in self.services.values() if _attrs["host_name"] == _host]
+            _results.append(_result)
+        return 200, {"results": _results}
+
+    def _remove_downtime(self, data: dict):
+        _type = data.get("type", "Downtime")
+        if _type == "Downtime":
+            _removed, _error = self._select("Downtime", data)
+        else:
+            # The downtimes of the selected hosts or services
+            _names, _error = self._targets(data)
+            _selected = set(_names)
+            _removed = [_name for _name, _downtime in self.downtimes.items()
+                        if (_downtime["host_name"] if _type == "Host" else
+                            f"{_downtime['host_name']}!{_downtime['service_name']}") in _selected]
+        if _error is not None:
+            return 404, {"error": 404, "status": _error}
+        for _name in _removed:
+            del self.downtimes[_name]
+        return self._action_results(_removed, "Successfully removed downtime '{}'.")
+
+    def _acknowledge(self, data: dict, value: int, status: str):
+        _names, _error = self._targets(data)
+        if _error is not None:
+            return 404, {"error": 404, "status": _error}
+        _objects = self._collection(data.get("type", "Host"))
+        for _name in _names:
+            _objects[_name]["acknowledgement"] = value
+        return self._action_results(_names, status)
+
+    def _process_check_result(self, data: dict):
+        _names, _error = self._targets(data)
+        if _error is not None:
+            return 404, {"error": 404, "status": _error}
+        _objects = self._collection(data.get("type", "Host"))
+        _now = time.time()
+        for _name in _names:
+            _state = int(data.get("exit_status", 0))
+            if _state != _objects[_name]["state"]:
+                _objects[_name]["last_state_change"] = _now
+            _objects[_name].update({"last_state": _objects[_name]["state"], "state": _state, "last_check": _now})
+        return self._action_results(_names, "Successfully processed check result for object '{}'.")
+
+    def _action_results(self, objects: list, status: str):
+        if len(objects) == 0:
+            return 404, {"error": 404, "status": "No objects found."}
+        return 200, {"results": [{"code": 200, "name": _object, "status": status.format(_object)}
+                                 for _object in objects]}
+
+
+def make_handler(icinga: FakeIcinga):
+    class FakeIcingaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            _length = int(self.headers.get("Content-Length") or 0)
+            _body = self.rfile.read(_length) if _length else b""
+            _data = json.loads(_body) if _body else {}
+            if icinga.latency:
+                time.sleep(icinga.latency)
+
+            if not self.headers.get("Authorization"):
+                _status, _response = 401, {"error": 401, "status": "Unauthorized"}
+            else:
+                _status, _response = icinga.handle(self.path, self.headers.get("X-HTTP-Method-Override", "POST"),
+                                                   _data)
+
+            _content = json.dumps(_response).encode("utf-8")
+            self.send_response(_status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(_content)))
+            self.end_headers()
+            self.wfile.write(_content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeIcingaHandler
+
+
+def start(port: int = 0, **kwargs):
+    """
+    Start the fake server in a background thread.
+
+    Args:
+        port (int, optional): Listening port, a free one if 0. Default 0.
+        **kwargs: The FakeIcinga arguments.
+
+    Returns:
+        tuple: The server, its URL and the FakeIcinga instance holding the objects.
+    """
+    _icinga = FakeIcinga(**kwargs)
+    _server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(_icinga))
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server, f"http://127.0.0.1:{_server.server_address[1]}", _icinga
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    _parser.add_argument("--port", type=int, default=5665)
+    _parser.add_argument("--hosts", type=int, default=10)
+    _parser.add_argument("--services", type=int, default=5)
+    _parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    _args = _parser.parse_args()
+
+    _server = ThreadingHTTPServer(("127.0.0.1", _args.port), make_handler(
+        FakeIcinga(hosts=_args.hosts, services=_args.services, latency=_args.latency)))
+    print(f"Fake Icinga API listening on http://127.0.0.1:{_args.port}")
+    _server.serve_forever()